@@ -4,11 +4,16 @@ Example usage:
     python data_gen.py --distribution uniform --obj_type point --num_obj 1000 --map_edge_len 10000.0 --out_file_dir ../generated_data --seed 123 --file_id 0
 """
 import os
+import sys
 import numpy as np
 import argparse 
 
 from typing import Optional
 
+# chunked text and binary writers: spatial-join-baseline/python/Index/Dataset_writer.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../python'))
+from Index.Dataset_writer import OUTPUT_FORMATS, TEXT_FORMATS, write_formats
+
 parser = argparse.ArgumentParser()
 parser.add_argument('--distribution', type=str, default='uniform', help="uniform or gaussian")
 parser.add_argument('--obj_type', type=str, default='polygon', help="polygon or points")
@@ -19,6 +24,8 @@ parser.add_argument('--out_file_dir', type=str, default='../generated_data/', he
 parser.add_argument('--seed', type=int, default=123, help="the seed of random generation")
 parser.add_argument('--file_id', type=int, default=0, help="the file suffix")
 parser.add_argument('--set', type=int, default=0, help="ratio between obj_edge_len and map_edge_len (0 = 1:10000, 1 = 1:1000, 2 = 1:100), only used when obj_type == polygon")
+parser.add_argument('--formats', type=str, nargs='+', default=list(TEXT_FORMATS.keys()), choices=OUTPUT_FORMATS, help="output formats, the text formats (C, spatialspark, postgis, cuspatial) by default, bin and columnar are the binary formats")
+parser.add_argument('--num_processes', type=int, default=None, help="worker processes writing the formats, one per format by default")
 
 args = parser.parse_args()
 distribution = args.distribution
@@ -30,6 +37,8 @@ out_file_dir = args.out_file_dir
 seed = args.seed
 file_id = args.file_id
 set = args.set
+formats = args.formats
+num_processes = args.num_processes
 
 class RandomPointGenerator:
 
@@ -61,26 +70,8 @@ class RandomPointGenerator:
             raise NotImplementedError
 
         file_suffix = f"{self.distribution}_{num_obj}_polygon_file_{file_id}_set_{set}"
-        with open(os.path.join(out_file_dir, "C_" + file_suffix + ".txt"), "w+") as f_C,\
-                open(os.path.join(out_file_dir, "spatialspark_" + file_suffix + ".txt"), "w+") as f_spatialspark,\
-                open(os.path.join(out_file_dir, "postgis_" + file_suffix + ".csv"), "w+") as f_postgis,\
-                open(os.path.join(out_file_dir, "cuspatial_" + file_suffix + ".csv"), "w+") as f_cuspatial:
-            
-            f_C.write(f"{num_obj}\n")
-            f_postgis.write(f"gid;geom\n")
-            f_cuspatial.write(f"gid,geometry\n")
-
-            for obj_id in range(num_obj):
-                
-                f_C.write("{obj_id} {x_low:.2f} {x_high:.2f} {y_low:.2f} {y_high:.2f}\n".format(
-                    obj_id=obj_id, x_low=x_low_array[obj_id], y_low=y_low_array[obj_id], x_high=x_high_array[obj_id], y_high=y_high_array[obj_id]))
-                # Well-known text representation of geometry: https://en.wikipedia.org/wiki/Well-known_text_representation_of_geometry
-                f_spatialspark.write("POLYGON(({x_low:.2f} {y_low:.2f}, {x_low:.2f} {y_high:.2f}, {x_high:.2f} {y_high:.2f}, {x_high:.2f} {y_low:.2f}, {x_low:.2f} {y_low:.2f}))\n".format(
-                    x_low=x_low_array[obj_id], y_low=y_low_array[obj_id], x_high=x_high_array[obj_id], y_high=y_high_array[obj_id]))
-                f_postgis.write("{obj_id};POLYGON(({x_low:.2f} {y_low:.2f}, {x_low:.2f} {y_high:.2f}, {x_high:.2f} {y_high:.2f}, {x_high:.2f} {y_low:.2f}, {x_low:.2f} {y_low:.2f}))\n".format(
-                    obj_id=obj_id, x_low=x_low_array[obj_id], y_low=y_low_array[obj_id], x_high=x_high_array[obj_id], y_high=y_high_array[obj_id]))
-                f_cuspatial.write('{obj_id},"POLYGON(({x_low:.2f} {y_low:.2f}, {x_low:.2f} {y_high:.2f}, {x_high:.2f} {y_high:.2f}, {x_high:.2f} {y_low:.2f}, {x_low:.2f} {y_low:.2f}))"\n'.format(
-                    obj_id=obj_id, x_low=x_low_array[obj_id], y_low=y_low_array[obj_id], x_high=x_high_array[obj_id], y_high=y_high_array[obj_id]))
+        columns = {'obj_id': np.arange(num_obj), 'x_low': x_low_array, 'x_high': x_high_array, 'y_low': y_low_array, 'y_high': y_high_array}
+        write_formats(out_file_dir, file_suffix, 'polygon', columns, formats, num_processes)
 
     def generate_points(self, num_obj : int, out_file_dir : str, seed : Optional[int] = 123, file_id : Optional[int] = 0):
 
@@ -101,26 +92,8 @@ class RandomPointGenerator:
             raise NotImplementedError
 
         file_suffix = f"{self.distribution}_{num_obj}_point_file_{file_id}"
-        with open(os.path.join(out_file_dir, "C_" + file_suffix + ".txt"), "w+") as f_C,\
-                open(os.path.join(out_file_dir, "spatialspark_" + file_suffix + ".txt"), "w+") as f_spatialspark,\
-                open(os.path.join(out_file_dir, "postgis_" + file_suffix + ".csv"), "w+") as f_postgis,\
-                open(os.path.join(out_file_dir, "cuspatial_" + file_suffix + ".csv"), "w+") as f_cuspatial:
-            
-            f_C.write(f"{num_obj}\n")
-            f_postgis.write(f"gid;geom\n")
-            f_cuspatial.write(f"gid,geometry\n")
-
-            for obj_id in range(num_obj):
-                
-                f_C.write("{obj_id} {x_low:.2f} {x_high:.2f} {y_low:.2f} {y_high:.2f}\n".format(
-                    obj_id=obj_id, x_low=x_array[obj_id], x_high=x_array[obj_id], y_low=y_array[obj_id], y_high=y_array[obj_id]))
-                # Well-known text representation of geometry: https://en.wikipedia.org/wiki/Well-known_text_representation_of_geometry
-                f_spatialspark.write("POINT({x:.2f} {y:.2f})\n".format(
-                    obj_id=obj_id, x=x_array[obj_id], y=y_array[obj_id]))
-                f_postgis.write("{obj_id};POINT({x:.2f} {y:.2f})\n".format(
-                    obj_id=obj_id, x=x_array[obj_id], y=y_array[obj_id]))
-                f_cuspatial.write('{obj_id},"POINT({x:.2f} {y:.2f})"\n'.format(
-                    obj_id=obj_id, x=x_array[obj_id], y=y_array[obj_id]))
+        columns = {'obj_id': np.arange(num_obj), 'x': x_array, 'y': y_array}
+        write_formats(out_file_dir, file_suffix, 'point', columns, formats, num_processes)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,64 @@
+"""
+Predict the kernel time of FPGA_BFS/BFS_multi_PE_v3.x for a pair of datasets (or of
+    serialized trees) with the page/cycle-level cost model in Index/FPGA_cost_model.py,
+    without building and running a bitstream.
+
+Per level, it prints the node pairs, page reads, MBR comparisons, writes, the cycles
+    and the bottleneck stage of the design.
+
+Example Usage:
+
+python FPGA_performance_model.py \
+--file_A ../generated_data/C_uniform_1000000_polygon_file_0_set_0.txt \
+--file_B ../generated_data/C_uniform_1000000_polygon_file_1_set_0.txt \
+--max_entry_size 16 --num_PEs 16
+
+python FPGA_performance_model.py \
+--tree_A_bin tree_A.bin --tree_B_bin tree_B.bin --node_bytes 448 --max_entry_size 16 --num_PEs 16
+"""
+import argparse
+
+from Index.Bulk_loading import BULK_LOADERS, get_node_bytes, read_dataset
+from Index.FPGA_cost_model import FPGA_FREQ_MHZ, MICRO_DIR, DEFAULT_COSTS, \
+    load_micro_costs, simulate_BFS, estimate_time_ms
+from Index.Tree_generation import load_mapped_index
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--file_A', type=str, default='../generated_data/C_uniform_100000_polygon_file_0_set_0.txt', help="C_*.txt or PBSM .bin dataset")
+parser.add_argument('--file_B', type=str, default='../generated_data/C_uniform_100000_polygon_file_1_set_0.txt', help="C_*.txt or PBSM .bin dataset")
+parser.add_argument('--tree_A_bin', type=str, default=None, help="serialized tree A, used instead of file_A if specified")
+parser.add_argument('--tree_B_bin', type=str, default=None, help="serialized tree B, used instead of file_B if specified")
+parser.add_argument('--node_bytes', type=int, default=0, help="bytes per node of the serialized trees, 0 = the C++ constructor page size")
+parser.add_argument('--max_entry_size', type=int, default=16, help="the max entry numbers in an R tree node")
+parser.add_argument('--bulk_loader', type=str, default='str', choices=list(BULK_LOADERS.keys()), help="packing order of the objects")
+parser.add_argument('--num_PEs', type=int, default=16, help="number of join PEs of the design")
+parser.add_argument('--freq_MHz', type=float, default=FPGA_FREQ_MHZ, help="kernel frequency")
+parser.add_argument('--micro_dir', type=str, default=MICRO_DIR, help="folder of micro_read.json and micro_join.json, empty = default costs")
+args = parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    if args.tree_A_bin is not None:
+        node_bytes = args.node_bytes if args.node_bytes > 0 else get_node_bytes(args.max_entry_size)
+        tree_A = load_mapped_index(args.tree_A_bin, node_bytes)
+        tree_B = load_mapped_index(args.tree_B_bin, node_bytes)
+    else:
+        tree_A = BULK_LOADERS[args.bulk_loader](*read_dataset(args.file_A), max_entry=args.max_entry_size)
+        tree_B = BULK_LOADERS[args.bulk_loader](*read_dataset(args.file_B), max_entry=args.max_entry_size)
+
+    costs = load_micro_costs(args.micro_dir) if args.micro_dir else DEFAULT_COSTS
+    print("Costs: {}".format(costs))
+
+    stats = simulate_BFS(tree_A, tree_B, args.num_PEs, args.max_entry_size, costs)
+    print("level\tnode pairs\tpage reads A\tpage reads B\tMBR comparisons\tresults\tlayer cache pairs\tcycles\tbottleneck")
+    for level, level_stats in enumerate(stats):
+        print("{}\t{}\t{}\t{}\t{}\t{}\t{}\t{:.0f}\t{}".format(
+            level, level_stats['node_pairs'], level_stats['page_reads_A'], level_stats['page_reads_B'],
+            level_stats['mbr_comparisons'], level_stats['results'], level_stats['layer_cache_pairs'],
+            level_stats['cycles'], level_stats['bottleneck']))
+
+    cycles, time_ms = estimate_time_ms(stats, args.freq_MHz)
+    print("Number of results: {}".format(sum(level_stats['results'] for level_stats in stats)))
+    print("Estimated cycles: {:.0f}".format(cycles))
+    print("Estimated kernel time ({} PEs): {:.2f} ms".format(args.num_PEs, time_ms))
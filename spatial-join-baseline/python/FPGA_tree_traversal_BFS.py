@@ -3,6 +3,7 @@ import numpy as np
 from Index.Region import MBR
 from Index.RTree import Node, sync_traversal, join_data_nodes
 from Index.Tree_generation import generate_rtree
+from Index.Join_kernels import join_nodes, join_mbr_node
 
 class FPGA_tree_traversal_BFS:
 
@@ -82,28 +83,20 @@ class FPGA_tree_traversal_BFS:
         Note: for FPGA implementation, may need two types of PEs to handle this...
             one for entire page join; the other for an mbr joins a page
         """
-        results = []
-
         if node_A.is_leaf and node_B.is_leaf: # result pairs: obj
-            for i in range(node_A.get_count()):
-                for j in range(node_B.get_count()):
-                    if node_A.mbrs[i].intersects(node_B.mbrs[j]):
-                        # here, we assume tree A and B has different object id spaces,
-                        #   so the IDs need not to be different
-                        results.append((node_A.obj_ids[i], node_B.obj_ids[j]))
+            idx_A, idx_B = join_nodes(node_A, node_B)
+            # here, we assume tree A and B has different object id spaces,
+            #   so the IDs need not to be different
+            results = [(node_A.obj_ids[i], node_B.obj_ids[j]) for i, j in zip(idx_A.tolist(), idx_B.tolist())]
         elif node_A.is_leaf and not node_B.is_leaf: # result pairs: A and B's children
-            for j in range(node_B.get_count()):
-                if node_A.mbr.intersects(node_B.mbrs[j]):
-                    results.append((node_A, node_B.child_ptrs[j]))
+            idx_B = join_mbr_node(node_A.mbr, node_B)
+            results = [(node_A, node_B.child_ptrs[j]) for j in idx_B.tolist()]
         elif not node_A.is_leaf and node_B.is_leaf: # result pairs: A's children and B
-            for i in range(node_A.get_count()):
-                if node_A.mbrs[i].intersects(node_B.mbr):
-                    results.append((node_A.child_ptrs[i], node_B))
+            idx_A = join_mbr_node(node_B.mbr, node_A)
+            results = [(node_A.child_ptrs[i], node_B) for i in idx_A.tolist()]
         else: # result pairs: A's children and B's children
-            for i in range(node_A.get_count()):
-                for j in range(node_B.get_count()):
-                    if node_A.mbrs[i].intersects(node_B.mbrs[j]):
-                        results.append((node_A.child_ptrs[i], node_B.child_ptrs[j]))
+            idx_A, idx_B = join_nodes(node_A, node_B)
+            results = [(node_A.child_ptrs[i], node_B.child_ptrs[j]) for i, j in zip(idx_A.tolist(), idx_B.tolist())]
 
         return results
 
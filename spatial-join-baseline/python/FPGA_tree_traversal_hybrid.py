@@ -0,0 +1,172 @@
+"""
+BFS/DFS hybrid scheduler with a bounded level cache, mirroring the C++ bfs_dfs_* variants.
+
+The scheduler runs BFS (as FPGA_tree_traversal_BFS) as long as the node pairs of the
+    next level fit in the on-chip level cache. When the children of a pair do not fit,
+    that subtree is joined in DFS order (as FPGA_tree_traversal_DFS) right away, and
+    the DFS stack shares the same cache. Pairs that do not fit in the cache at all are
+    counted as spilled to DRAM.
+
+Cache occupancy = unprocessed pairs of the current BFS level + pairs of the next BFS level
+    + pairs on the DFS stack, each pair takes pair_bytes (two node ids).
+
+Example Usage:
+
+python FPGA_tree_traversal_hybrid.py \
+--tree_A_bin tree_A.bin --tree_B_bin tree_B.bin --node_bytes 448 --cache_bytes 65536
+"""
+import argparse
+
+from Index.RTree import sync_traversal
+from Index.Tree_generation import generate_rtree, load_serialized_index, tree_max_depth
+from FPGA_tree_traversal_BFS import FPGA_tree_traversal_BFS
+
+class FPGA_tree_traversal_hybrid(FPGA_tree_traversal_BFS):
+    """
+    Same node join as FPGA_tree_traversal_BFS (join_nodes), with the level cache scheduler
+    """
+
+    # cache capacity in number of pairs
+    cache_bytes = None
+    pair_bytes = None
+    cache_capacity = None
+
+    # statistics
+    cache_occupancy = None # pairs currently in the cache
+    peak_cache_occupancy = None
+    num_spilled_pairs = None # pairs written to and read back from DRAM
+    num_dfs_switches = None # subtrees joined in DFS order
+    num_pairs_per_level = None # node pairs joined per level, level 1 joins the roots
+
+    def __init__(self, level_tree_A, level_tree_B, cache_bytes=64 * 1024, pair_bytes=8):
+        super().__init__(level_tree_A, level_tree_B)
+        self.cache_bytes = cache_bytes
+        self.pair_bytes = pair_bytes
+        self.cache_capacity = cache_bytes // pair_bytes
+
+    def cache_alloc(self, num_pairs):
+        """
+        Put num_pairs into the cache, return how many of them are spilled to DRAM
+        """
+        num_cached = min(num_pairs, self.cache_capacity - self.cache_occupancy)
+        self.cache_occupancy += num_cached
+        self.peak_cache_occupancy = max(self.peak_cache_occupancy, self.cache_occupancy)
+        num_spilled = num_pairs - num_cached
+        self.num_spilled_pairs += num_spilled
+        return num_spilled
+
+    def join_nodes_scheduler(self, root_A, root_B):
+        """
+        Join two R-trees, level by level until the level cache is full
+
+        Output: the result list, the statistics are stored in the instance
+        """
+        self.results = []
+        self.cache_occupancy = 0
+        self.peak_cache_occupancy = 0
+        self.num_spilled_pairs = 0
+        self.num_dfs_switches = 0
+        self.num_pairs_per_level = dict()
+        for i in range(1, self.max_level + 1):
+            self.num_pairs_per_level[i] = 0
+
+        # put root A and root B to level 0 cache
+        current_level_pairs = [(root_A, root_B)]
+        self.cache_alloc(1)
+
+        for current_level in range(1, self.max_level + 1):
+
+            next_level_pairs = []
+            for node_A, node_B in current_level_pairs:
+                # the input pair leaves the cache
+                self.cache_occupancy -= 1
+                self.num_pairs_per_level[current_level] += 1
+                temp_results = self.join_nodes(node_A, node_B)
+
+                if current_level == self.max_level:
+                    self.results += temp_results
+                elif self.cache_occupancy + len(temp_results) <= self.cache_capacity:
+                    self.cache_alloc(len(temp_results))
+                    next_level_pairs += temp_results
+                else: # the level cache overflows: finish this subtree in DFS order
+                    self.num_dfs_switches += 1
+                    self.join_subtree_DFS(temp_results, current_level + 1)
+
+            current_level_pairs = next_level_pairs
+
+        return self.results
+
+    def join_subtree_DFS(self, pairs, level):
+        """
+        Join the subtrees of the input pairs (of the input level) in DFS order,
+            the stack shares the level cache with the BFS levels
+
+        Output: None, results are appended in self.results
+        """
+        # stack elements: (node_A, node_B, level, in_cache)
+        stack = []
+        def push(pairs, level):
+            num_spilled = self.cache_alloc(len(pairs))
+            # the last pushed pairs are the spilled ones
+            in_cache = [True] * (len(pairs) - num_spilled) + [False] * num_spilled
+            # reversed, such that the first pair is popped first
+            stack.extend(reversed([(node_A, node_B, level, c) for (node_A, node_B), c in zip(pairs, in_cache)]))
+
+        push(pairs, level)
+        while len(stack) > 0:
+            node_A, node_B, level, in_cache = stack.pop()
+            if in_cache:
+                self.cache_occupancy -= 1
+            self.num_pairs_per_level[level] += 1
+            temp_results = self.join_nodes(node_A, node_B)
+            if level == self.max_level:
+                self.results += temp_results
+            else:
+                push(temp_results, level + 1)
+
+    def print_statistics(self):
+        print("Level cache capacity: {} bytes ({} pairs)".format(self.cache_bytes, self.cache_capacity))
+        print("Peak cache occupancy: {} bytes ({} pairs)".format(
+            self.peak_cache_occupancy * self.pair_bytes, self.peak_cache_occupancy))
+        print("Spilled pairs: {} ({} bytes written to and read from DRAM)".format(
+            self.num_spilled_pairs, self.num_spilled_pairs * self.pair_bytes))
+        print("DFS switches: {}".format(self.num_dfs_switches))
+        for level in self.num_pairs_per_level:
+            print("Level {} node pairs: {}".format(level, self.num_pairs_per_level[level]))
+        print("Result length: {}".format(len(self.results)))
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--tree_A_bin', type=str, default=None, help="serialized tree A, random trees are tested if not specified")
+parser.add_argument('--tree_B_bin', type=str, default=None, help="serialized tree B")
+parser.add_argument('--node_bytes', type=int, default=4096, help="bytes per node")
+parser.add_argument('--cache_bytes', type=int, default=64 * 1024, help="level cache capacity in bytes")
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+
+    if args.tree_A_bin is not None:
+        root_A = load_serialized_index(args.tree_A_bin, args.node_bytes)
+        root_B = load_serialized_index(args.tree_B_bin, args.node_bytes)
+        traversal_instance = FPGA_tree_traversal_hybrid(tree_max_depth(root_A), tree_max_depth(root_B), args.cache_bytes)
+        traversal_instance.join_nodes_scheduler(root_A, root_B)
+        traversal_instance.print_statistics()
+    else:
+        test_num = 100
+
+        for i in range(test_num):
+            level_tree_A = 4
+            level_tree_B = 2
+            root_A = generate_rtree(max_level=level_tree_A, directory_node_fanout=2, data_node_fanout=100, root_mbr=None)
+            root_B = generate_rtree(max_level=level_tree_B, directory_node_fanout=2, data_node_fanout=100, root_mbr=None)
+
+            print("A join B:")
+            results_sync = sync_traversal(root_A, root_B)
+            print("Result length: {}".format(len(results_sync)))
+
+            print("FPGA A join B:")
+            # a tiny cache such that the DFS part is also tested
+            traversal_instance = FPGA_tree_traversal_hybrid(level_tree_A, level_tree_B, cache_bytes=3 * 8)
+            results_FPGA = traversal_instance.join_nodes_scheduler(root_A, root_B)
+            print("Result length: {}".format(len(results_FPGA)))
+            assert len(results_FPGA) == len(results_sync)
@@ -0,0 +1,367 @@
+"""
+Array-backed (struct-of-arrays) R-tree.
+
+Instead of one Node object per node and one MBR object per entry, the whole tree
+    is kept in a handful of contiguous NumPy arrays whose types match the FPGA
+    obj_t / node_meta_t layout (int32 ids, float32 coordinates).
+
+Per node (indexed by node_id, nodes are in BFS order, root is node 0):
+    is_leaf, count                              int32
+    node_low0, node_high0, node_low1, node_high1  float32, the MBR of the node
+    entry_offset                                int64, entries of node i are
+                                                    [entry_offset[i], entry_offset[i] + count[i])
+
+Per entry (obj_t):
+    ids                                         int32, object id for data nodes,
+                                                    child node id for directory nodes
+    low0, high0, low1, high1                    float32
+"""
+import numpy as np
+
+from Index.Region import MBR
+from Index.Join_kernels import intersect_pairs, intersect_one
+from Index import Page_codec
+
+
+class ArrayNode:
+    """
+    A light-weight view of a single node in an ArrayRTree (or MappedRTree)
+    """
+    node_id = None
+    is_leaf = False
+    count = 0
+    mbr = None # MBR for the entire node
+
+    ids = None # obj ids for data nodes, children node ids for directory nodes
+    low0 = None
+    high0 = None
+    low1 = None
+    high1 = None
+
+    def __init__(self, tree, node_id : int):
+        self.node_id = node_id
+        self.is_leaf = bool(tree.is_leaf[node_id])
+        self.count = int(tree.count[node_id])
+        self.mbr = tree.get_node_mbr(node_id)
+        self.ids, self.low0, self.high0, self.low1, self.high1 = tree.get_entries(node_id)
+
+    def get_count(self):
+        return self.count
+
+    def print_contents(self):
+        print("Is leaf: ", self.is_leaf)
+        print("Number of items: ", self.count)
+        print("MBR of the node: ", self.mbr)
+        print("Entry IDs: ", self.ids)
+
+
+class ArrayRTree:
+    """
+    Refer to the module docstring for the layout
+    """
+    # per node
+    is_leaf = None
+    count = None
+    node_low0 = None
+    node_high0 = None
+    node_low1 = None
+    node_high1 = None
+    entry_offset = None
+
+    # per entry
+    ids = None
+    low0 = None
+    high0 = None
+    low1 = None
+    high1 = None
+
+    def __init__(self, is_leaf, count, node_low0, node_high0, node_low1, node_high1,
+                 ids, low0, high0, low1, high1):
+        self.is_leaf = np.ascontiguousarray(is_leaf, dtype=np.int32)
+        self.count = np.ascontiguousarray(count, dtype=np.int32)
+        self.node_low0 = np.ascontiguousarray(node_low0, dtype=np.float32)
+        self.node_high0 = np.ascontiguousarray(node_high0, dtype=np.float32)
+        self.node_low1 = np.ascontiguousarray(node_low1, dtype=np.float32)
+        self.node_high1 = np.ascontiguousarray(node_high1, dtype=np.float32)
+
+        self.ids = np.ascontiguousarray(ids, dtype=np.int32)
+        self.low0 = np.ascontiguousarray(low0, dtype=np.float32)
+        self.high0 = np.ascontiguousarray(high0, dtype=np.float32)
+        self.low1 = np.ascontiguousarray(low1, dtype=np.float32)
+        self.high1 = np.ascontiguousarray(high1, dtype=np.float32)
+
+        # entries are stored node after node
+        self.entry_offset = np.zeros(len(self.count), dtype=np.int64)
+        np.cumsum(self.count[:-1], out=self.entry_offset[1:])
+
+        assert len(self.ids) == np.sum(self.count, dtype=np.int64)
+
+    @property
+    def num_nodes(self):
+        return len(self.count)
+
+    @property
+    def num_entries(self):
+        return len(self.ids)
+
+    def get_node_mbr(self, node_id : int):
+        return MBR(self.node_low0[node_id], self.node_high0[node_id],
+                   self.node_low1[node_id], self.node_high1[node_id])
+
+    def get_entries(self, node_id : int):
+        """
+        Return the (ids, low0, high0, low1, high1) array views of a node's entries
+        """
+        start = self.entry_offset[node_id]
+        end = start + self.count[node_id]
+        return self.ids[start:end], self.low0[start:end], self.high0[start:end], \
+            self.low1[start:end], self.high1[start:end]
+
+    def get_node(self, node_id : int):
+        return ArrayNode(self, node_id)
+
+    def get_children(self, node_ids):
+        """
+        Gather the child node ids of an array of directory nodes
+
+        Output: an int64 array, children of node_ids[0] first
+        """
+        starts = self.entry_offset[node_ids]
+        counts = self.count[node_ids].astype(np.int64)
+        entry_idx = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(np.sum(counts))
+        return self.ids[entry_idx].astype(np.int64)
+
+
+class MappedRTree:
+    """
+    A serialized tree file (FPGA page format, see Index.Page_codec) opened with mmap.
+
+    Same per-node interface as ArrayRTree (is_leaf, count, node_low0 ... node_high1,
+        get_entries, get_node, get_children), so sync_traversal and tree_max_depth run
+        on it directly. The per-node arrays are strided views into the mapped file, and
+        the entries of a node are only decoded when the node is visited.
+    """
+    pages = None
+    objs = None # (num_nodes, blocks per page, 3) obj_t view
+
+    # per node, views of the page meta data
+    is_leaf = None
+    count = None
+    node_low0 = None
+    node_high0 = None
+    node_low1 = None
+    node_high1 = None
+
+    def __init__(self, in_dir, node_bytes=4096):
+        self.pages = Page_codec.open_pages(in_dir, node_bytes)
+        meta = self.pages['meta']
+        self.is_leaf = meta['is_leaf']
+        self.count = meta['count']
+        self.node_low0 = meta['low0']
+        self.node_high0 = meta['high0']
+        self.node_low1 = meta['low1']
+        self.node_high1 = meta['high1']
+        self.objs = self.pages['blocks']['objs']
+
+        # pages are stored by node ID, the root is the first page
+        assert self.num_nodes > 0 and meta['id'][0] == 0
+
+    @property
+    def num_nodes(self):
+        return len(self.pages)
+
+    def get_node_mbr(self, node_id : int):
+        return MBR(self.node_low0[node_id], self.node_high0[node_id],
+                   self.node_low1[node_id], self.node_high1[node_id])
+
+    def get_entries(self, node_id : int):
+        """
+        Return the (ids, low0, high0, low1, high1) arrays of a node's entries,
+            only the 64-byte blocks holding valid entries are read
+        """
+        count = int(self.count[node_id])
+        objs = self.objs[node_id, :(count + Page_codec.OBJS_PER_BLOCK - 1) // Page_codec.OBJS_PER_BLOCK]
+        objs = objs.reshape(-1)[:count]
+        return objs['id'], objs['low0'], objs['high0'], objs['low1'], objs['high1']
+
+    def get_node(self, node_id : int):
+        return ArrayNode(self, node_id)
+
+    def get_children(self, node_ids):
+        """
+        Gather the child node ids of an array of directory nodes
+
+        Output: an int64 array, children of node_ids[0] first
+        """
+        if len(node_ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+        _, ids, _, _, _, _ = Page_codec.decode_entries(self.pages[node_ids])
+        return ids.astype(np.int64)
+
+    def to_array_tree(self):
+        """
+        Decode the entire file into an ArrayRTree
+        """
+        count, ids, low0, high0, low1, high1 = Page_codec.decode_entries(self.pages)
+        return ArrayRTree(self.is_leaf, count, self.node_low0, self.node_high0, self.node_low1, self.node_high1,
+                          ids, low0, high0, low1, high1)
+
+
+ARRAY_TREE_TYPES = (ArrayRTree, MappedRTree)
+
+def join_node_pair(tree_A, node_A : int, tree_B, node_B : int, leaf_kernel=intersect_pairs):
+    """
+    Join two nodes in two array R-trees, same case split as
+        Index.RTree.join_nodes_recursive, but each node pair is tested with
+        a single broadcast comparison.
+
+    Input:
+        tree_A, tree_B: two ArrayRTree or MappedRTree
+        node_A, node_B: node ids in tree A and B
+        leaf_kernel: joins the entries of two leaf nodes, same interface as
+            intersect_pairs (e.g., Index.Plane_sweep.sweep_pairs)
+    Output: (is_leaf_pair, ids_A, ids_B)
+        both nodes are leaf: the intersected (obj id A, obj id B) pairs
+        otherwise: the (node id A, node id B) pairs to join next
+    """
+    ids_A, low0_A, high0_A, low1_A, high1_A = tree_A.get_entries(node_A)
+    ids_B, low0_B, high0_B, low1_B, high1_B = tree_B.get_entries(node_B)
+
+    # One of the nodes is leaf: descend into the directory node only
+    if tree_A.is_leaf[node_A] and not tree_B.is_leaf[node_B]:
+        idx_B = intersect_one(tree_A.node_low0[node_A], tree_A.node_high0[node_A],
+                              tree_A.node_low1[node_A], tree_A.node_high1[node_A],
+                              low0_B, high0_B, low1_B, high1_B)
+        return False, np.full(len(idx_B), node_A, dtype=np.int32), ids_B[idx_B]
+    elif not tree_A.is_leaf[node_A] and tree_B.is_leaf[node_B]:
+        idx_A = intersect_one(tree_B.node_low0[node_B], tree_B.node_high0[node_B],
+                              tree_B.node_low1[node_B], tree_B.node_high1[node_B],
+                              low0_A, high0_A, low1_A, high1_A)
+        return False, ids_A[idx_A], np.full(len(idx_A), node_B, dtype=np.int32)
+
+    # both leaf or both directory: all entries of A against all entries of B
+    is_leaf_pair = bool(tree_A.is_leaf[node_A])
+    kernel = leaf_kernel if is_leaf_pair else intersect_pairs
+    idx_A, idx_B = kernel(low0_A, high0_A, low1_A, high1_A, low0_B, high0_B, low1_B, high1_B)
+    return is_leaf_pair, ids_A[idx_A], ids_B[idx_B]
+
+def iter_result_chunks(tree_A, tree_B, chunk_size=65536, root_pair=(0, 0), leaf_kernel=intersect_pairs):
+    """
+    Synchronous traversal with an explicit node-pair stack instead of recursion.
+        The stack is popped depth-first, so it holds at most (depth x node pairs per
+        level) entries, and the results are produced in the same order as the recursion.
+        root_pair: the (node id A, node id B) pair to start from, the two roots by default
+        leaf_kernel: the leaf pair kernel of join_node_pair
+
+    Output: a generator of int32 arrays of shape (n, 2), n <= chunk_size except when
+        a single leaf pair has more results, each row is (obj id A, obj id B)
+    """
+    chunk = np.empty((chunk_size, 2), dtype=np.int32)
+    chunk_len = 0
+
+    stack = [root_pair]
+    while len(stack) > 0:
+        node_A, node_B = stack.pop()
+        is_leaf_pair, ids_A, ids_B = join_node_pair(tree_A, node_A, tree_B, node_B, leaf_kernel)
+
+        if not is_leaf_pair:
+            # reversed, such that the first pair is popped first
+            stack += zip(ids_A[::-1].tolist(), ids_B[::-1].tolist())
+            continue
+
+        num_results = len(ids_A)
+        if chunk_len + num_results > chunk_size and chunk_len > 0:
+            yield chunk[:chunk_len].copy()
+            chunk_len = 0
+        if num_results > chunk_size:
+            yield np.stack([ids_A, ids_B], axis=1)
+        else:
+            chunk[chunk_len: chunk_len + num_results, 0] = ids_A
+            chunk[chunk_len: chunk_len + num_results, 1] = ids_B
+            chunk_len += num_results
+
+    if chunk_len > 0:
+        yield chunk[:chunk_len].copy()
+
+def iter_results(tree_A, tree_B, chunk_size=65536):
+    """
+    Output: a generator of (obj id A, obj id B) tuples
+    """
+    for chunk in iter_result_chunks(tree_A, tree_B, chunk_size):
+        yield from zip(chunk[:, 0].tolist(), chunk[:, 1].tolist())
+
+def count_results(tree_A, tree_B, root_pair=(0, 0), leaf_kernel=intersect_pairs):
+    """
+    Output: the number of results, none of them is kept
+    """
+    num_results = 0
+    stack = [root_pair]
+    while len(stack) > 0:
+        node_A, node_B = stack.pop()
+        is_leaf_pair, ids_A, ids_B = join_node_pair(tree_A, node_A, tree_B, node_B, leaf_kernel)
+        if is_leaf_pair:
+            num_results += len(ids_A)
+        else:
+            stack += zip(ids_A.tolist(), ids_B.tolist())
+    return num_results
+
+def write_results(tree_A, tree_B, out_dir, chunk_size=65536):
+    """
+    Stream the results to a binary file as the FPGA pair_t {int id_A; int id_B;}
+
+    Output: the number of results
+    """
+    num_results = 0
+    with open(out_dir, 'wb') as f:
+        for chunk in iter_result_chunks(tree_A, tree_B, chunk_size):
+            chunk.astype('<i4', copy=False).tofile(f)
+            num_results += len(chunk)
+    return num_results
+
+def sync_traversal(tree_A, tree_B, leaf_kernel=intersect_pairs):
+    """
+    Synchronous traversal on two array R-trees (ArrayRTree or MappedRTree)
+        leaf_kernel: the leaf pair kernel of join_node_pair, intersect_pairs (nested
+            loop) or Index.Plane_sweep.sweep_pairs (plane sweep), same results
+
+    Output: an int32 array of shape (num_results, 2), each row is (obj id A, obj id B)
+    """
+    results = list(iter_result_chunks(tree_A, tree_B, leaf_kernel=leaf_kernel))
+
+    if len(results) == 0:
+        return np.zeros((0, 2), dtype=np.int32)
+    return np.concatenate(results)
+
+def join_nodes_recursive(tree_A, node_A : int, tree_B, node_B : int, results : list):
+    """
+    Recursively join two nodes in two array R-trees, refer to join_node_pair
+
+    Input:
+        results: list of (n, 2) int32 arrays of intersected object id pairs
+    Output:
+        None, the intersected pairs are appended in results
+    """
+    is_leaf_pair, ids_A, ids_B = join_node_pair(tree_A, node_A, tree_B, node_B)
+
+    if is_leaf_pair:
+        if len(ids_A) > 0:
+            results.append(np.stack([ids_A, ids_B], axis=1))
+    else:
+        for child_A, child_B in zip(ids_A, ids_B):
+            join_nodes_recursive(tree_A, child_A, tree_B, child_B, results)
+
+def tree_max_depth(tree):
+    """
+    Level-by-level (BFS) frontier expansion to get the maximum depth of an
+        ArrayRTree or MappedRTree, only directory nodes are decoded
+    """
+    depth = 0
+    frontier = np.zeros(1, dtype=np.int64) # root
+    while len(frontier) > 0:
+        depth += 1
+        directory_nodes = frontier[tree.is_leaf[frontier] == 0]
+        if len(directory_nodes) == 0:
+            break
+        frontier = tree.get_children(directory_nodes)
+
+    return depth
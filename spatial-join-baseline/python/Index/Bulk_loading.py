@@ -0,0 +1,264 @@
+"""
+Bulk-load R-trees from dataset files.
+
+Python counterpart of bulk_load / build / fix_tree in cpp/Tree_generation.hpp and
+    spatial-join-on-FPGA-PBSM/scripts/tree_gen/tree_gen.cpp: objects are sorted with
+    NumPy, packed into nodes of max_entry entries, and the nodes are numbered in BFS
+    order (root is 0), so the result can be written by index_serialization in the same
+    page format as the C++ constructors (see data/tree/*.bin).
+
+Two packing orders are supported:
+    str_bulk_load: Sort-Tile-Recursive, same as the C++ constructors
+    hilbert_bulk_load: objects sorted by the Hilbert value of their MBR centers
+
+The trees are not byte-identical to the C++ ones. The leaf entries carry the dataset object
+    ids, the C++ ones the positions in the sorted order: on data/tree/tree_uniform_1000_*.bin,
+    only the nodes and their MBRs match. The last leaf holds the remaining objects, whereas
+    tree_gen.cpp drops the last leaf when the number of objects is a multiple of max_entry,
+    and bulk_load of Tree_generation.hpp fills it with the last max_entry objects, some of
+    them also in the leaf before.
+"""
+import os
+
+import numpy as np
+
+from Index import Page_codec
+from Index.Array_RTree import ArrayRTree
+
+DEFAULT_CHUNK_BYTES = 1 << 24 # text read at once by iter_C_file_chunks
+
+
+def get_node_bytes(max_entry : int):
+    """
+    Page size used by the C++ index constructors:
+        one 64-byte meta block + ceil(max_entry / 3) 64-byte blocks of 3 objects
+    """
+    return 64 + int(np.ceil(max_entry / 3.0)) * 64
+
+def read_C_file(file_dir):
+    """
+    Read a C_*.txt dataset (first line: number of objects, then "id low0 high0 low1 high1" per line)
+
+    Output: ids (int32), low0, high0, low1, high1 (float32), rows as parse_C_lines
+    """
+    chunks = list(iter_C_file_chunks(file_dir))
+    if len(chunks) == 0:
+        return parse_C_lines(b'')
+    return tuple(np.concatenate(column) for column in zip(*chunks))
+
+def parse_C_lines(buffer):
+    """
+    Parse complete lines of a C_*.txt dataset at once (bytes, no header); as txt_to_bin.py,
+        only the rows of 5 fields are kept
+
+    Output: ids (int32), low0, high0, low1, high1 (float32)
+    """
+    chars = np.frombuffer(buffer, dtype=np.uint8)
+    # whitespace of str.split: ' ', and '\t', '\n', '\v', '\f', '\r' (9 to 13)
+    is_space = (chars == ord(' ')) | ((chars >= ord('\t')) & (chars <= ord('\r')))
+    # a field starts at a non-space character after a space (or at the start)
+    is_field_start = ~is_space
+    is_field_start[1:] &= is_space[:-1]
+    field_starts = np.flatnonzero(is_field_start)
+    line_ends = np.flatnonzero(chars == ord('\n'))
+    # fields before the end of every line, the last line may have no '\n'
+    fields_before = np.concatenate([[0], np.searchsorted(field_starts, line_ends), [len(field_starts)]])
+    fields_per_line = np.diff(fields_before)
+    # empty lines have no fields to parse, the other rows not of 5 fields are dropped
+    bad_lines = np.flatnonzero((fields_per_line != 0) & (fields_per_line != 5))
+    if len(bad_lines) > 0:
+        line_starts = np.concatenate([[0], line_ends + 1])
+        line_stops = np.concatenate([line_ends, [len(chars)]])
+        dropped = np.zeros(len(chars) + 1, dtype=np.int8)
+        np.add.at(dropped, line_starts[bad_lines], 1)
+        np.add.at(dropped, line_stops[bad_lines], -1)
+        buffer = chars[np.cumsum(dropped[:-1], dtype=np.int8) == 0].tobytes()
+
+    num_rows = int(np.sum(fields_per_line == 5))
+    data = np.fromstring(buffer, dtype=np.float64, sep=' ') if num_rows > 0 else np.zeros(0)
+    if len(data) != 5 * num_rows:
+        raise ValueError("Rows of a C_*.txt dataset must be 5 numbers")
+    data = data.reshape(-1, 5)
+    return data[:, 0].astype(np.int32), data[:, 1].astype(np.float32), data[:, 2].astype(np.float32), \
+        data[:, 3].astype(np.float32), data[:, 4].astype(np.float32)
+
+def iter_C_file_chunks(file_dir, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    Read a C_*.txt dataset chunk by chunk, each chunk ends at the last complete line of
+        chunk_bytes, so the memory does not grow with the file
+
+    Output: (ids, low0, high0, low1, high1) per chunk, see parse_C_lines
+    """
+    if chunk_bytes <= 0:
+        raise ValueError(f"chunk_bytes must be positive, got {chunk_bytes}")
+    with open(file_dir, 'rb') as f:
+        f.readline() # number of rows, the real count is taken from the data
+        rest = b''
+        while True:
+            data = f.read(chunk_bytes)
+            if len(data) == 0:
+                break
+            data = rest + data
+            last_line_end = data.rfind(b'\n') + 1
+            rest = data[last_line_end:]
+            if last_line_end > 0:
+                yield parse_C_lines(data[:last_line_end])
+        if len(rest) > 0:
+            yield parse_C_lines(rest)
+
+def read_PBSM_bin(file_dir):
+    """
+    Read a PBSM .bin dataset (64-byte header with the object count, then 3 obj_t per 64-byte page)
+
+    Output: ids (int32), low0, high0, low1, high1 (float32)
+    """
+    objs = Page_codec.read_data_objects(file_dir)
+    return objs['id'], objs['low0'], objs['high0'], objs['low1'], objs['high1']
+
+def read_columnar(file_dir):
+    """
+    Read a raw columnar .col dataset (Dataset_writer.write_columnar_file): int32 ids, then
+        float32 low0, high0, low1, high1, num_objects each
+
+    Output: ids (int32), low0, high0, low1, high1 (float32)
+    """
+    num_objects = os.path.getsize(file_dir) // 20
+    with open(file_dir, 'rb') as f:
+        ids = np.fromfile(f, dtype='<i4', count=num_objects)
+        low0, high0, low1, high1 = [np.fromfile(f, dtype='<f4', count=num_objects) for _ in range(4)]
+    return ids, low0, high0, low1, high1
+
+def read_dataset(file_dir):
+    """
+    Read either a C_*.txt, a PBSM .bin or a columnar .col dataset, chosen by the file extension
+    """
+    if file_dir.endswith('.bin'):
+        return read_PBSM_bin(file_dir)
+    elif file_dir.endswith('.col'):
+        return read_columnar(file_dir)
+    else:
+        return read_C_file(file_dir)
+
+def pack_levels(ids, low0, high0, low1, high1, max_entry=16, fill_factor=1.0):
+    """
+    Pack the objects, already in their final order, into leaf nodes of
+        (fill_factor * max_entry) entries, then pack the nodes of each level into
+        the level above until a single root is left.
+
+    Output: an ArrayRTree with the nodes numbered in BFS order
+    """
+    num_in_node = int(fill_factor * max_entry)
+    assert 1 < num_in_node <= max_entry
+    if len(ids) == 0:
+        raise ValueError("Cannot build an R-tree without objects")
+
+    # bottom-up: levels[0] holds the leaves
+    levels = []
+    entry_ids, entry_low0, entry_high0, entry_low1, entry_high1 = ids, low0, high0, low1, high1
+    while True:
+        num_entries = len(entry_ids)
+        starts = np.arange(0, num_entries, num_in_node)
+        counts = np.diff(np.append(starts, num_entries))
+        level = {
+            'count': counts,
+            'ids': entry_ids, # local node index of the level below for directory nodes
+            'low0': entry_low0, 'high0': entry_high0, 'low1': entry_low1, 'high1': entry_high1,
+            'node_low0': np.minimum.reduceat(entry_low0, starts),
+            'node_high0': np.maximum.reduceat(entry_high0, starts),
+            'node_low1': np.minimum.reduceat(entry_low1, starts),
+            'node_high1': np.maximum.reduceat(entry_high1, starts),
+        }
+        levels.append(level)
+        if len(starts) == 1:
+            break
+        entry_ids = np.arange(len(starts), dtype=np.int64)
+        entry_low0, entry_high0 = level['node_low0'], level['node_high0']
+        entry_low1, entry_high1 = level['node_low1'], level['node_high1']
+
+    # top-down: BFS node IDs are the level offset + the position in the level
+    levels.reverse()
+    level_offsets = np.cumsum([0] + [len(level['count']) for level in levels])
+    for l in range(len(levels) - 1):
+        levels[l]['ids'] = levels[l]['ids'] + level_offsets[l + 1]
+
+    return ArrayRTree(
+        is_leaf=np.concatenate([np.full(len(level['count']), l == len(levels) - 1, dtype=np.int32)
+                                for l, level in enumerate(levels)]),
+        **{key: np.concatenate([level[key] for level in levels]) for key in
+           ('count', 'node_low0', 'node_high0', 'node_low1', 'node_high1', 'ids', 'low0', 'high0', 'low1', 'high1')})
+
+def str_bulk_load(ids, low0, high0, low1, high1, max_entry=16, fill_factor=1.0):
+    """
+    Sort-Tile-Recursive bulk loading, same ordering as the C++ bulk_load:
+        sort all objects by low0, cut them into S = floor(sqrt(P)) vertical slices
+        of S * num_in_node objects (P = number of leaves), sort each slice by low1,
+        and pack consecutive objects into nodes.
+
+    Output: an ArrayRTree, leaf entries carry the dataset object ids
+    """
+    num_in_node = int(fill_factor * max_entry)
+    num_objects = len(ids)
+    P = int(np.ceil(num_objects / num_in_node))
+    S = max(int(np.sqrt(P)), 1)
+    slice_num = S * num_in_node
+
+    # sort by low0, then sort each slice (contiguous in the low0 order) by low1
+    order = np.argsort(low0, kind='stable')
+    sorted_low1 = low1[order]
+    for start in range(0, num_objects, slice_num):
+        end = min(start + slice_num, num_objects)
+        order[start:end] = order[start:end][np.argsort(sorted_low1[start:end], kind='stable')]
+
+    return pack_levels(ids[order], low0[order], high0[order], low1[order], high1[order], max_entry, fill_factor)
+
+def hilbert_values(x, y, order=16):
+    """
+    Hilbert curve index of points on a 2^order x 2^order grid, vectorized version of
+        the classic xy2d (https://en.wikipedia.org/wiki/Hilbert_curve)
+
+    Input: x, y, integer grid coordinates in [0, 2^order)
+    Output: int64 Hilbert values
+    """
+    n = 1 << order
+    x = np.array(x, dtype=np.int64)
+    y = np.array(y, dtype=np.int64)
+    d = np.zeros(len(x), dtype=np.int64)
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant
+        flip = ~ry & rx
+        x[flip] = n - 1 - x[flip]
+        y[flip] = n - 1 - y[flip]
+        swap = ~ry
+        x[swap], y[swap] = y[swap], x[swap].copy()
+        s >>= 1
+    return d
+
+def hilbert_bulk_load(ids, low0, high0, low1, high1, max_entry=16, fill_factor=1.0, order=16):
+    """
+    Hilbert packed R-tree: sort the objects by the Hilbert value of their MBR centers
+        (quantized to a 2^order grid over the dataset extent), then pack consecutive objects
+        into nodes, same as str_bulk_load.
+
+    Output: an ArrayRTree, leaf entries carry the dataset object ids
+    """
+    if len(ids) == 0:
+        raise ValueError("Cannot build an R-tree without objects")
+
+    # quantize the MBR centers to the Hilbert grid
+    grid_max = (1 << order) - 1
+    center0 = (low0.astype(np.float64) + high0) / 2
+    center1 = (low1.astype(np.float64) + high1) / 2
+    extent0 = max(np.amax(center0) - np.amin(center0), np.finfo(np.float64).tiny)
+    extent1 = max(np.amax(center1) - np.amin(center1), np.finfo(np.float64).tiny)
+    x = ((center0 - np.amin(center0)) / extent0 * grid_max).astype(np.int64)
+    y = ((center1 - np.amin(center1)) / extent1 * grid_max).astype(np.int64)
+
+    order_h = np.argsort(hilbert_values(x, y, order), kind='stable')
+
+    return pack_levels(ids[order_h], low0[order_h], high0[order_h], low1[order_h], high1[order_h], max_entry, fill_factor)
+
+BULK_LOADERS = {'str': str_bulk_load, 'hilbert': hilbert_bulk_load}
@@ -0,0 +1,291 @@
+"""
+Chunked, vectorized writers of the dataset files of the generators (data_gen/data_gen.py,
+    spatial-join-on-FPGA-PBSM/scripts/nontree_data_gen/data_gen.py).
+
+A text format is a str.format template of one line, e.g.,
+    "{obj_id} {x_low:.2f} {x_high:.2f} {y_low:.2f} {y_high:.2f}\n"
+
+Instead of formatting one object at a time, the template is applied to a chunk of
+    objects at once: every field is turned into a (num_objects, width) array of ASCII
+    characters with a mask of the characters to keep (the leading zeros of the narrower
+    numbers are dropped), the literals are constant columns, and the masked characters
+    of the concatenated columns, read row by row, are the lines of the chunk.
+
+A float field ({name:.Nf}) is rounded to an integer of 10^-N units. The product by 10^N
+    is not exact, so the values close to a tie are rounded again by '%.Nf' itself: the
+    output is identical to str.format.
+
+The binary formats are written from the arrays, without a text file to convert:
+    bin         PBSM data file (Page_codec.write_data_file), 3 obj_t per 64-byte page
+    columnar    raw columns: int32 ids, then float32 low0, high0, low1, high1
+Their coordinates go through text_rounded first, so they hold the same float32 as the
+    conversion of the text file (txt_to_bin.py, read_C_file) and the join results do not change.
+
+write_formats writes several formats of the same objects, one worker process per format.
+    The columns are inherited by the workers (fork), only file names are sent.
+"""
+import multiprocessing
+import os
+import string
+
+import numpy as np
+
+from Index import Page_codec
+
+DEFAULT_CHUNK_SIZE = 1 << 18 # objects formatted at once
+
+# file name (of the file suffix), header and line of a polygon / point per format
+TEXT_FORMATS = {
+    'C': {
+        'file': 'C_{}.txt',
+        'header': '{num_obj}\n',
+        'polygon': '{obj_id} {x_low:.2f} {x_high:.2f} {y_low:.2f} {y_high:.2f}\n',
+        'point': '{obj_id} {x:.2f} {x:.2f} {y:.2f} {y:.2f}\n',
+    },
+    # Well-known text representation of geometry: https://en.wikipedia.org/wiki/Well-known_text_representation_of_geometry
+    'spatialspark': {
+        'file': 'spatialspark_{}.txt',
+        'header': '',
+        'polygon': 'POLYGON(({x_low:.2f} {y_low:.2f}, {x_low:.2f} {y_high:.2f}, {x_high:.2f} {y_high:.2f}, '
+                   '{x_high:.2f} {y_low:.2f}, {x_low:.2f} {y_low:.2f}))\n',
+        'point': 'POINT({x:.2f} {y:.2f})\n',
+    },
+    'postgis': {
+        'file': 'postgis_{}.csv',
+        'header': 'gid;geom\n',
+        'polygon': '{obj_id};POLYGON(({x_low:.2f} {y_low:.2f}, {x_low:.2f} {y_high:.2f}, {x_high:.2f} {y_high:.2f}, '
+                   '{x_high:.2f} {y_low:.2f}, {x_low:.2f} {y_low:.2f}))\n',
+        'point': '{obj_id};POINT({x:.2f} {y:.2f})\n',
+    },
+    'cuspatial': {
+        'file': 'cuspatial_{}.csv',
+        'header': 'gid,geometry\n',
+        'polygon': '{obj_id},"POLYGON(({x_low:.2f} {y_low:.2f}, {x_low:.2f} {y_high:.2f}, {x_high:.2f} {y_high:.2f}, '
+                   '{x_high:.2f} {y_low:.2f}, {x_low:.2f} {y_low:.2f}))"\n',
+        'point': '{obj_id},"POINT({x:.2f} {y:.2f})"\n',
+    },
+}
+
+# per worker process, set by init_worker
+worker_columns = None
+
+
+def init_worker(columns):
+    global worker_columns
+    worker_columns = columns
+
+def parse_template(template):
+    """
+    Output: a list of pieces, either a literal (str) or a field (name, decimals),
+        decimals is None for an integer field
+    """
+    pieces = []
+    for literal, name, spec, conversion in string.Formatter().parse(template):
+        if literal:
+            pieces.append(literal)
+        if name is None:
+            continue
+        if conversion is not None:
+            raise ValueError(f"Unsupported conversion !{conversion} of field {name}")
+        if spec in ('', 'd'):
+            pieces.append((name, None))
+        elif spec.startswith('.') and spec.endswith('f') and spec[1:-1].isdigit():
+            pieces.append((name, int(spec[1:-1])))
+        else:
+            raise ValueError(f"Unsupported format spec '{spec}' of field {name}")
+    return pieces
+
+def fixed_point(values, decimals):
+    """
+    Round |values| to integers of 10^-decimals units, as '%.{decimals}f'
+
+    Output: (units (int64), negative (bool)), negative includes -0.0 ('-0.00')
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaled = np.abs(values) * 10 ** decimals
+    if not np.all(np.isfinite(scaled)) or np.any(scaled >= 2 ** 53):
+        raise ValueError("Values must be finite and below 2^53 units")
+    units = np.floor(scaled + 0.5)
+    # the product has a relative error of 2^-53, the ties are rounded by printf
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < scaled * 1e-12 + 1e-9
+    units = units.astype(np.int64)
+    if np.any(near_tie):
+        units[near_tie] = [int(('%.*f' % (decimals, v)).replace('.', ''))
+                           for v in np.abs(values[near_tie]).tolist()]
+    return units, np.signbit(values)
+
+def digit_columns(units):
+    """
+    Output: (chars, keep) of the decimal digits of non-negative integers, right-aligned
+        in max digits columns, keep drops the leading zeros (a zero keeps its last digit)
+    """
+    max_unit = int(np.max(units)) if len(units) > 0 else 0
+    width = len(str(max_unit))
+    # division by a scalar 10, one column at a time, in the narrowest unsigned type
+    remaining = units.astype(np.uint32 if max_unit < 2 ** 32 else np.uint64)
+    chars = np.empty((len(units), width), dtype=np.uint8)
+    keep = np.empty((len(units), width), dtype=bool)
+    keep[:, -1] = True
+    for column in range(width - 1, -1, -1):
+        remaining, digit = np.divmod(remaining, 10)
+        chars[:, column] = digit
+        if column > 0:
+            keep[:, column - 1] = remaining > 0
+    chars += ord('0')
+    return chars, keep
+
+def format_field(values, decimals):
+    """
+    Output: the (chars, keep) column groups of the field in every line, (num_objects, width) arrays
+    """
+    if decimals is None:
+        values = np.asarray(values)
+        if values.dtype.kind not in 'iu':
+            raise ValueError("Integer fields must be integer arrays")
+        negative = values < 0
+        columns = [digit_columns(np.abs(values.astype(np.int64)))]
+    else:
+        units, negative = fixed_point(values, decimals)
+        scale = 10 ** decimals
+        columns = [digit_columns(units // scale)]
+        if decimals > 0:
+            frac_chars, _ = digit_columns(units % scale + scale) # leading 1 keeps the zeros
+            columns += [literal_column('.', len(units)), literal_column(frac_chars[:, 1:])]
+    sign = (np.full((len(negative), 1), ord('-'), dtype=np.uint8), negative.reshape(-1, 1))
+    return [sign] + columns
+
+def literal_column(literal, num_lines=None):
+    """
+    Output: (chars, keep) of a column group kept in full, a str repeated on every line or
+        an array of characters
+    """
+    if isinstance(literal, str):
+        chars = np.frombuffer(literal.encode(), dtype=np.uint8)
+        literal = np.broadcast_to(chars, (num_lines, len(chars)))
+    return literal, np.broadcast_to(True, literal.shape)
+
+def format_lines(pieces, columns, start=0, end=None):
+    """
+    Format the objects [start, end) of the columns with a parsed template
+
+    Input: pieces: parse_template of the line; columns: a dict of arrays per field name
+    Output: the lines as bytes
+    """
+    num_lines = len(next(iter(columns.values())))
+    end = num_lines if end is None else min(end, num_lines)
+    num_lines = max(end - start, 0)
+    if num_lines == 0:
+        return b''
+    fields = {}
+    parts = []
+    for piece in pieces:
+        if isinstance(piece, str):
+            parts.append(literal_column(piece, num_lines))
+        else:
+            # a field used several times (WKT polygons) is formatted once
+            if piece not in fields:
+                fields[piece] = format_field(columns[piece[0]][start:end], piece[1])
+            parts += fields[piece]
+    chars = np.concatenate([chars for chars, _ in parts], axis=1)
+    keep = np.concatenate([keep for _, keep in parts], axis=1)
+    return chars[keep].tobytes()
+
+def write_text_file(file_path, line, columns, header='', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write a header (str) and one line (str.format template) per object of the columns
+    """
+    pieces = parse_template(line)
+    num_obj = len(next(iter(columns.values())))
+    with open(file_path, 'wb') as f:
+        f.write(header.encode())
+        for start in range(0, num_obj, chunk_size):
+            f.write(format_lines(pieces, columns, start, start + chunk_size))
+    return file_path
+
+def text_rounded(values, decimals=2):
+    """
+    The values as read back from their '%.{decimals}f' text (float64): units / 10^decimals
+        is correctly rounded, as the parser of the text
+    """
+    units, negative = fixed_point(values, decimals)
+    rounded = units / 10 ** decimals
+    return np.where(negative, -rounded, rounded)
+
+def write_columnar_file(file_path, ids, low0, high0, low1, high1):
+    """
+    Write objects as a raw columnar file (little-endian, no header): num_objects int32 ids,
+        then num_objects float32 of each of low0, high0, low1, high1
+    """
+    with open(file_path, 'wb') as f:
+        np.asarray(ids, dtype='<i4').tofile(f)
+        for values in (low0, high0, low1, high1):
+            np.asarray(values, dtype='<f4').tofile(f)
+    return file_path
+
+def write_binary_file(file_path, file_format, ids, low0, high0, low1, high1, decimals=2):
+    """
+    Write objects in one of BINARY_FORMATS, the coordinates are rounded to float32 the same
+        way as through their text file ('%.{decimals}f', then parsed), not rounded if decimals
+        is None
+    """
+    coordinates = [np.asarray(values, dtype=np.float64) for values in (low0, high0, low1, high1)]
+    if decimals is not None:
+        coordinates = [text_rounded(values, decimals) for values in coordinates]
+    coordinates = [values.astype(np.float32) for values in coordinates]
+    BINARY_FORMATS[file_format]['write'](file_path, np.asarray(ids, dtype=np.int32), *coordinates)
+    return file_path
+
+# file name (of the file suffix) and writer per binary format
+BINARY_FORMATS = {
+    'bin': {'file': 'C_{}.bin', 'write': Page_codec.write_data_file},
+    'columnar': {'file': 'C_{}.col', 'write': write_columnar_file},
+}
+OUTPUT_FORMATS = list(TEXT_FORMATS.keys()) + list(BINARY_FORMATS.keys())
+
+def write_format_task(task):
+    name, file_path, obj_type, chunk_size = task
+    if name in BINARY_FORMATS:
+        if obj_type == 'polygon':
+            coordinates = [worker_columns[c] for c in ('x_low', 'x_high', 'y_low', 'y_high')]
+        else:
+            coordinates = [worker_columns[c] for c in ('x', 'x', 'y', 'y')]
+        return write_binary_file(file_path, name, worker_columns['obj_id'], *coordinates)
+    num_obj = len(worker_columns['obj_id'])
+    return write_text_file(file_path, TEXT_FORMATS[name][obj_type], worker_columns,
+                           TEXT_FORMATS[name]['header'].format(num_obj=num_obj), chunk_size)
+
+def write_formats(out_file_dir, file_suffix, obj_type, columns, formats=None, num_processes=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write the objects in several OUTPUT_FORMATS, one file per format
+
+    Input:
+        obj_type: 'polygon' (columns obj_id, x_low, x_high, y_low, y_high) or 'point'
+            (columns obj_id, x, y)
+        formats: names of OUTPUT_FORMATS, the TEXT_FORMATS by default
+        num_processes: worker processes, one per format by default, 1 writes in this process
+    Output: the paths of the written files
+    """
+    if formats is None:
+        formats = list(TEXT_FORMATS.keys())
+    for name in formats:
+        if name not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown format {name}, must be one of {OUTPUT_FORMATS}")
+    file_names = {**{name: f['file'] for name, f in TEXT_FORMATS.items()},
+                  **{name: f['file'] for name, f in BINARY_FORMATS.items()}}
+    tasks = [(name, os.path.join(out_file_dir, file_names[name].format(file_suffix)), obj_type, chunk_size)
+             for name in formats]
+    if num_processes is None:
+        num_processes = len(tasks)
+    num_processes = min(num_processes, len(tasks))
+
+    if num_processes <= 1:
+        init_worker(columns)
+        return [write_format_task(task) for task in tasks]
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    with context.Pool(num_processes, initializer=init_worker, initargs=(columns,)) as pool:
+        return pool.map(write_format_task, tasks, chunksize=1)
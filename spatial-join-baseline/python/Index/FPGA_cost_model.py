@@ -0,0 +1,160 @@
+"""
+Page/cycle-level cost model of the FPGA BFS tree traversal
+    (spatial-join-on-FPGA-R-Tree/FPGA_BFS/BFS_multi_PE_v3.x), on array R-trees.
+
+The model replays the BFS traversal of the scheduler level by level and counts, per level:
+    node pairs:         page pairs joined (leaf pairs produce results, the others
+                            produce the node pairs of the next level)
+    page reads:         one page of each tree per node pair, 1 + ceil(max_entry / 3)
+                            64-byte blocks each, whatever the node count is
+    MBR comparisons:    count_A x count_B for leaf/leaf and dir/dir pairs,
+                            count of the directory node for leaf/dir pairs
+    writes:             result pairs to out_intersect, node pairs to the layer cache
+
+and turns them into cycles following the structure of the executor kernel:
+    read_nodes:         a single read unit for all join PEs, A and B on separate
+                            channels, cycles_per_page cycles per 64-byte block, and
+                            read_request_latency cycles per round of prefetch_requests
+                            node pairs (read requests are issued in rounds of 16)
+    parse_page:         per PE, II=3 per 64-byte block of each page pair
+    join_page:          per PE, max(count_A, count_B) cycles to load the pages, then
+                            cycles_per_pair cycles per MBR comparison
+    write:              shared out_intersect and layer_cache ports, cycles_per_write
+                            cycles per 8-byte pair
+The units are dataflow stages, so a level takes as long as its slowest stage, plus
+    level_latency cycles, as the scheduler waits for the pair count of a level before
+    starting the next one. Node pairs are sent to the PEs round-robin, restarting from
+    PE 0 for every pair_cache_size pairs (same as scheduler.cpp).
+
+cycles_per_page and cycles_per_pair are measured by the read and join microbenchmarks
+    (spatial-join-on-FPGA-PBSM/experiments/micro/read.py and join.py), see load_micro_costs.
+"""
+import json
+import os
+
+import numpy as np
+
+from Index.Array_RTree import join_node_pair
+from Index.Page_codec import OBJS_PER_BLOCK
+
+FPGA_FREQ_MHZ = 200 # kernel_frequency in executor.cfg
+
+MICRO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         '../../../spatial-join-on-FPGA-PBSM/experiments/micro')
+
+DEFAULT_COSTS = {
+    'cycles_per_page': 1.0,         # read unit, per 64-byte block
+    'cycles_per_pair': 1.0,         # join unit, per MBR comparison
+    'cycles_per_write': 1.0,        # write units, per 8-byte pair
+    'read_request_latency': 256,    # DRAM latency per round of read requests
+    'prefetch_requests': 16,        # node pairs per round of read requests (max_prefetch_request)
+    'parse_cycles_per_block': 3,    # parse_page LOAD_PAGE, II=3
+    'page_pair_latency': 20,        # per node pair in a join PE: loop entry/exit, last signal, count
+    'level_latency': 2000,          # per level: drain the PEs and the layer cache writes
+}
+
+
+def load_micro_costs(micro_dir=MICRO_DIR):
+    """
+    Read the per-unit costs from micro_read.json and micro_join.json: the average
+        cycles per page of the simple read and cycles per pair of the simple join
+
+    Output: a copy of DEFAULT_COSTS with cycles_per_page and cycles_per_pair replaced
+    """
+    costs = dict(DEFAULT_COSTS)
+    with open(os.path.join(micro_dir, 'micro_read.json')) as f:
+        costs['cycles_per_page'] = float(np.mean([r['cycles_per_page'] for r in json.load(f)['simple']]))
+    with open(os.path.join(micro_dir, 'micro_join.json')) as f:
+        costs['cycles_per_pair'] = float(np.mean([r['cycles_per_pair'] for r in json.load(f)['simple']]))
+    return costs
+
+def get_blocks_per_node(max_entry : int):
+    """
+    64-byte blocks read per node: meta + ceil(max_entry / 3), same as read_nodes
+    """
+    return 1 + (max_entry + OBJS_PER_BLOCK - 1) // OBJS_PER_BLOCK
+
+def simulate_BFS(tree_A, tree_B, num_PEs=16, max_entry=None, costs=None, pair_cache_size=1024):
+    """
+    Input:
+        tree_A, tree_B: ArrayRTree or MappedRTree
+        num_PEs: join PEs of the design (N_JOIN_PE)
+        max_entry: max entries per node set during indexing, the largest node count by default
+        costs: per-unit costs, DEFAULT_COSTS by default
+    Output: a list of dicts, one per level, root pair level first
+        node_pairs, leaf_pairs, page_reads_A, page_reads_B (pages), unique_pages_A,
+        unique_pages_B, read_blocks (64-byte blocks, both trees), mbr_comparisons,
+        results, layer_cache_pairs (node pairs written for the next level),
+        and the cycles of each stage + the level cycles + the bottleneck stage
+    """
+    if costs is None:
+        costs = DEFAULT_COSTS
+    if max_entry is None:
+        max_entry = int(max(np.amax(tree_A.count), np.amax(tree_B.count)))
+    blocks_per_node = get_blocks_per_node(max_entry)
+
+    stats = []
+    level = np.zeros((1, 2), dtype=np.int64) # root pair
+    while len(level) > 0:
+        node_A, node_B = level[:, 0], level[:, 1]
+        count_A = tree_A.count[node_A].astype(np.int64)
+        count_B = tree_B.count[node_B].astype(np.int64)
+        leaf_A = tree_A.is_leaf[node_A] != 0
+        leaf_B = tree_B.is_leaf[node_B] != 0
+        comparisons = np.where(leaf_A == leaf_B, count_A * count_B, np.where(leaf_A, count_B, count_A))
+
+        num_results = 0
+        next_A = []
+        next_B = []
+        for a, b in level.tolist():
+            is_leaf_pair, ids_A, ids_B = join_node_pair(tree_A, a, tree_B, b)
+            if is_leaf_pair:
+                num_results += len(ids_A)
+            else:
+                next_A.append(ids_A)
+                next_B.append(ids_B)
+        next_level = np.stack([np.concatenate(next_A), np.concatenate(next_B)], axis=1).astype(np.int64) \
+            if len(next_A) > 0 else np.zeros((0, 2), dtype=np.int64)
+
+        num_pairs = len(level)
+        PE_id = (np.arange(num_pairs) % pair_cache_size) % num_PEs
+        parse_cycles = np.bincount(PE_id, minlength=num_PEs) * \
+            (blocks_per_node - 1) * costs['parse_cycles_per_block']
+        join_cycles = np.bincount(PE_id, minlength=num_PEs, weights=
+            np.maximum(count_A, count_B) + comparisons * costs['cycles_per_pair'] + costs['page_pair_latency'])
+        stage_cycles = {
+            'read': num_pairs * blocks_per_node * costs['cycles_per_page'] +
+                -(-num_pairs // costs['prefetch_requests']) * costs['read_request_latency'],
+            'parse': float(np.amax(parse_cycles)),
+            'join': float(np.amax(join_cycles)),
+            'result_write': num_results * costs['cycles_per_write'],
+            # written by the join PEs, then read back by the scheduler
+            'layer_cache': len(next_level) * costs['cycles_per_write'] + num_pairs,
+        }
+        bottleneck = max(stage_cycles, key=stage_cycles.get)
+
+        stats.append({
+            'node_pairs': num_pairs,
+            'leaf_pairs': int(np.count_nonzero(leaf_A & leaf_B)),
+            'page_reads_A': num_pairs,
+            'page_reads_B': num_pairs,
+            'unique_pages_A': len(np.unique(node_A)),
+            'unique_pages_B': len(np.unique(node_B)),
+            'read_blocks': 2 * num_pairs * blocks_per_node,
+            'mbr_comparisons': int(np.sum(comparisons)),
+            'results': num_results,
+            'layer_cache_pairs': len(next_level),
+            'stage_cycles': stage_cycles,
+            'bottleneck': bottleneck,
+            'cycles': stage_cycles[bottleneck] + costs['level_latency'],
+        })
+        level = next_level
+
+    return stats
+
+def estimate_time_ms(stats, freq_MHz=FPGA_FREQ_MHZ):
+    """
+    Output: (total cycles, kernel time in ms) of the simulate_BFS statistics
+    """
+    cycles = sum(level_stats['cycles'] for level_stats in stats)
+    return cycles, cycles / (freq_MHz * 1e3)
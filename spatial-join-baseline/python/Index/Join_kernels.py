@@ -0,0 +1,47 @@
+"""
+Batched MBR intersection kernels shared by all the Python join paths.
+
+Instead of calling MBR.intersects once per entry pair, all entries of a node are
+    tested against all entries of another node in a single broadcast comparison.
+    Same predicate as Index.Region.MBR.intersects: point intersect also counts.
+"""
+import numpy as np
+
+
+def intersect_pairs(low0_A, high0_A, low1_A, high1_A, low0_B, high0_B, low1_B, high1_B):
+    """
+    Test all MBRs in A against all MBRs in B.
+
+    Input: the coordinate arrays of the two MBR sets
+    Output: (idx_A, idx_B), the index arrays of the intersected pairs,
+        in row-major order (same order as a nested loop over A then B)
+    """
+    mask = (low0_A[:, None] <= high0_B[None, :]) & (high0_A[:, None] >= low0_B[None, :]) & \
+        (low1_A[:, None] <= high1_B[None, :]) & (high1_A[:, None] >= low1_B[None, :])
+    return np.nonzero(mask)
+
+def intersect_one(low0, high0, low1, high1, low0_B, high0_B, low1_B, high1_B):
+    """
+    Test a single MBR against all MBRs in B.
+
+    Output: idx_B, the index array of the intersected MBRs in B
+    """
+    mask = (low0 <= high0_B) & (high0 >= low0_B) & (low1 <= high1_B) & (high1 >= low1_B)
+    return np.nonzero(mask)[0]
+
+def join_nodes(node_A, node_B):
+    """
+    Join the entries of two Index.RTree.Node
+
+    Output: (idx_A, idx_B), the entry index arrays of the intersected pairs
+    """
+    return intersect_pairs(*node_A.get_mbr_arrays(), *node_B.get_mbr_arrays())
+
+def join_mbr_node(mbr, node):
+    """
+    Join an Index.Region.MBR with the entries of an Index.RTree.Node
+
+    Output: idx, the entry index array of the intersected entries
+    """
+    return intersect_one(mbr.get_low0(), mbr.get_high0(), mbr.get_low1(), mbr.get_high1(),
+                         *node.get_mbr_arrays())
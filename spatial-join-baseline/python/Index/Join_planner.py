@@ -0,0 +1,612 @@
+"""
+Cost-based join planner: picks the join engine of a dataset pair and its parameters from
+    statistics of the datasets and a calibrated cost model, instead of by hand per experiment.
+
+Engines, each one as an FPGA design (host_command) or as a Python engine on the CPU:
+    nested:         nested loop join, designs/nested/simple, scripts/join/nested_join.py
+    index:          index nested loop join against an R-tree of B, designs/index/simple,
+                        scripts/join/index_join.py
+    pbsm:           partition-based spatial merge, designs/pbsm/static and dynamic, Index.PBSM
+    sync_traversal: synchronous traversal of R-trees of A and B, FPGA_BFS, Index.Array_RTree
+
+Statistics (get_dataset_stats): size, extent, quantiles of the MBR widths and heights, and
+    skew (largest count of the MBRHistogram cells over the mean count of the non-empty ones),
+    plus the sampled join size estimate of Index.Selectivity.
+
+Work of a candidate (JoinPlanner.workload), computed from the datasets, not by joining them:
+    nested:         pairs, objects      nA x nB MBR comparisons, nA + nB
+    index:          probes, results     nA x log_M(nB) node visits of the probes of A
+    pbsm:           comparisons, pages, sum of |A| x |B|, 64-byte pages and objects of the
+                    copies                  partitions of host_partition (the partitioning is
+                                            cheap next to the join, so it is exact)
+    sync_traversal: node_pairs,         visited node pairs and their MBR comparisons per level
+                    mbr_comparisons,        of the BFS (traversal_workload), from the node MBRs
+                    results                 of the trees (cpu)
+                    leaf_pairs,             leaf pairs and their MBR comparisons predicted from
+                    leaf_comparisons,       the dataset sizes and max_entry (traversal_size_work),
+                    results                 the measured FPGA_BFS runs only record the sizes (fpga)
+
+Cost model: time_ms = intercept + sum(coefficient x work), per target (fpga, cpu), design and
+    number of PEs. The FPGA coefficients are fitted on the runs of
+    spatial-join-on-FPGA-PBSM/experiments/{nested,index,pbsm_static,pbsm_dynamic} and on the
+    FPGA_BFS runs of spatial-join-baseline/plots/json_FPGA (calibrate_fpga, kernel time, plus
+    the host time of PBSM which partitions on the CPU). The CPU coefficients are fitted by
+    timing the Python engines. scripts/join/plan_join.py --calibrate fits both.
+    Trees that are not given are built by STR (as tree_constructor.py), their build time is
+    added to the plans that need them.
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+from Index import PBSM
+from Index.Array_RTree import MappedRTree, tree_max_depth
+from Index.Bulk_loading import get_node_bytes, read_dataset, str_bulk_load
+from Index.Page_codec import OBJS_PER_BLOCK
+from Index.Plane_sweep import iter_sweep_chunks
+from Index.Selectivity import DEFAULT_SAMPLE_SIZE, MBRHistogram, estimate_join_size, read_tree_objects, \
+    result_buffer_size
+from Index.Tree_statistics import node_levels
+
+PBSM_REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../spatial-join-on-FPGA-PBSM')
+BFS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../spatial-join-on-FPGA-R-Tree/FPGA_BFS')
+EXPERIMENTS_DIR = os.path.join(PBSM_REPO_DIR, 'experiments')
+# measured FPGA_BFS runs: FPGA_perf_{num_PEs}_PE_3_runs.json
+BFS_RUNS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../plots/json_FPGA')
+
+TARGETS = ('fpga', 'cpu')
+ENGINES = ('nested', 'index', 'pbsm', 'sync_traversal')
+
+# FPGA designs: engine, folder of the host per number of PEs (the hosts run there, the input
+#   paths of the experiments are relative to it) and bitstream
+DESIGNS = {
+    'nested': ('nested', os.path.join(PBSM_REPO_DIR, 'designs/nested/simple/{num_PEs}'), 'xclbin/executor.hw.xclbin'),
+    'index': ('index', os.path.join(PBSM_REPO_DIR, 'designs/index/simple/{num_PEs}'), 'xclbin/executor.hw.xclbin'),
+    'pbsm_static': ('pbsm', os.path.join(PBSM_REPO_DIR, 'designs/pbsm/static/{num_PEs}'), 'xclbin/executor.hw.xclbin'),
+    'pbsm_dynamic': ('pbsm', os.path.join(PBSM_REPO_DIR, 'designs/pbsm/dynamic/{num_PEs}'), 'xclbin/executor.hw.xclbin'),
+    'sync_traversal': ('sync_traversal', os.path.join(BFS_DIR, 'BFS_multi_PE_v3.{version}_{num_PEs}_PE'), 'xclbin/vadd.hw.xclbin'),
+}
+BFS_PE_COUNTS = (1, 2, 4, 8, 16)
+EXPERIMENT_DATASETS = ('uniform', 'osm', 'gaussian')
+
+# work terms of the cost model of each target and design
+FEATURES = {
+    'fpga': {
+        'nested': ('pairs',),
+        'index': ('probes',),
+        'pbsm_static': ('comparisons', 'pages'),
+        'pbsm_dynamic': ('comparisons', 'pages'),
+        'sync_traversal': ('leaf_pairs', 'leaf_comparisons', 'results'),
+    },
+    # nested_join.py prunes its blocks on x, so its time follows the objects, not the pairs
+    'cpu': {
+        'nested': ('objects',),
+        'index': ('probes',),
+        'pbsm': ('copies',),
+        'sync_traversal': ('node_pairs',),
+    },
+}
+
+# PBSM hosts partition on the CPU: host time (cpu_time) terms, fitted apart from the kernel
+HOST_FEATURES = {
+    'pbsm_static': ('copies',),
+    'pbsm_dynamic': ('copies',),
+}
+
+# candidate parameters
+MAX_ENTRIES = (8, 16, 32)
+NUM_PARTITIONS_1D = (5, 10, 20)
+MAX_COMPARISONS_PER_PARTITION = 1000
+QUANTILES = (50, 90, 99)
+
+# time_ms = intercept + sum(coefficient x work) per target, design and number of PEs
+# fpga: calibrate_fpga on experiments/ and, for sync_traversal, on plots/json_FPGA
+# cpu: plan_join.py --calibrate on the 100K OSM, uniform and Gaussian pairs, averaged
+DEFAULT_COST_MODEL = {
+    'fpga': {
+        'nested': {
+            1: {'intercept': 0.3155, 'pairs': 1.333e-05},
+            2: {'intercept': 0.6486, 'pairs': 6.667e-06},
+            4: {'intercept': 0.4264, 'pairs': 3.334e-06},
+            8: {'intercept': 1.196, 'pairs': 1.667e-06},
+            16: {'intercept': 0.3753, 'pairs': 8.775e-07},
+        },
+        'index': {
+            1: {'intercept': 0.0, 'probes': 0.001167},
+            2: {'intercept': 11.36, 'probes': 0.0006799},
+            4: {'intercept': 11.43, 'probes': 0.0006797},
+            8: {'intercept': 11.38, 'probes': 0.0006798},
+            16: {'intercept': 11.32, 'probes': 0.0006797},
+        },
+        'pbsm_static': {
+            1: {'intercept': 13.02, 'comparisons': 0.0, 'pages': 0.0001832, 'copies': 0.0002902},
+            2: {'intercept': 16.45, 'comparisons': 0.0, 'pages': 9.056e-05, 'copies': 0.0001888},
+            4: {'intercept': 13.63, 'comparisons': 0.0, 'pages': 4.854e-05, 'copies': 0.0001688},
+            8: {'intercept': 20.98, 'comparisons': 0.0, 'pages': 2.245e-05, 'copies': 8.384e-05},
+        },
+        'pbsm_dynamic': {
+            1: {'intercept': 14.04, 'comparisons': 0.0, 'pages': 0.0002129, 'copies': 0.0002852},
+            2: {'intercept': 10.22, 'comparisons': 0.0, 'pages': 0.0001066, 'copies': 0.0002527},
+            4: {'intercept': 14.36, 'comparisons': 0.0, 'pages': 5.497e-05, 'copies': 0.0001646},
+            8: {'intercept': 16.03, 'comparisons': 0.0, 'pages': 2.782e-05, 'copies': 0.0001286},
+        },
+        'sync_traversal': {
+            1: {'intercept': 0.0, 'leaf_pairs': 7.631e-05, 'leaf_comparisons': 4.556e-06, 'results': 8.509e-06},
+            2: {'intercept': 0.0, 'leaf_pairs': 3.805e-05, 'leaf_comparisons': 2.271e-06, 'results': 7.623e-06},
+            4: {'intercept': 0.0, 'leaf_pairs': 1.888e-05, 'leaf_comparisons': 1.13e-06, 'results': 7.152e-06},
+            8: {'intercept': 0.0, 'leaf_pairs': 5.286e-05, 'leaf_comparisons': 4.904e-07, 'results': 6.972e-06},
+            16: {'intercept': 1.598, 'leaf_pairs': 8.059e-05, 'leaf_comparisons': 1.952e-07, 'results': 6.965e-06},
+        },
+    },
+    'cpu': {
+        'nested': {
+            1: {'intercept': 2.094, 'objects': 0.002035},
+        },
+        'index': {
+            1: {'intercept': 0.1246, 'probes': 0.0003901},
+        },
+        'pbsm': {
+            1: {'intercept': 0.0, 'copies': 0.0005919},
+        },
+        'sync_traversal': {
+            1: {'intercept': 0.07122, 'node_pairs': 0.01231},
+        },
+    },
+}
+
+
+# DATASET STATISTICS
+
+def get_dataset_stats(objects, map_bounds, grid_size=32):
+    """
+    Output: a dict: num_objects, extent (min_x, max_x, min_y, max_y), width and height
+        (QUANTILES of the MBR sides), skew (largest cell count of the MBRHistogram over the
+        mean count of the non-empty cells, 1 for evenly spread objects) and occupancy
+        (share of non-empty cells)
+    """
+    _, low0, high0, low1, high1 = objects
+    num_objects = len(low0)
+    if num_objects == 0:
+        return {'num_objects': 0, 'extent': None, 'width': None, 'height': None, 'skew': 0.0, 'occupancy': 0.0}
+    hist = MBRHistogram(objects, map_bounds, grid_size)
+    occupied = hist.count[hist.count > 0]
+    return {
+        'num_objects': num_objects,
+        'extent': (float(np.amin(low0)), float(np.amax(high0)), float(np.amin(low1)), float(np.amax(high1))),
+        'width': tuple(float(q) for q in np.percentile(high0 - low0, QUANTILES)),
+        'height': tuple(float(q) for q in np.percentile(high1 - low1, QUANTILES)),
+        'skew': float(np.amax(occupied) / np.mean(occupied)),
+        'occupancy': len(occupied) / len(hist.count),
+    }
+
+
+# SYNCHRONOUS TRAVERSAL MODEL
+
+def traversal_workload(tree_A, tree_B):
+    """
+    Node pairs of each level of the BFS synchronous traversal, without visiting them:
+        below the root pair, the pairs visited at a level are exactly the intersecting pairs
+        of the nodes of that level (a node MBR covers its entries, so the parents of two
+        intersecting nodes intersect), found by a plane sweep over the node MBRs. When a tree
+        runs out of levels, its leaves are paired with the next levels of the other one.
+
+    Input: tree_A, tree_B: ArrayRTree or MappedRTree
+    Output: a list of dicts, one per level, root pair level first: node_pairs, leaf_pairs,
+        mbr_comparisons (same count as FPGA_cost_model.simulate_BFS) and load_cycles (sum of
+        max(count_A, count_B), the cycles of the join PEs to load the pages)
+    """
+    levels_A = node_levels(tree_A)
+    levels_B = node_levels(tree_B)
+    stats = []
+    for level in range(max(len(levels_A), len(levels_B))):
+        nodes_A = levels_A[min(level, len(levels_A) - 1)]
+        nodes_B = levels_B[min(level, len(levels_B) - 1)]
+        if level == 0:
+            pair_chunks = [(np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64))]
+        else:
+            pair_chunks = iter_sweep_chunks(tree_A.node_low0[nodes_A], tree_A.node_high0[nodes_A],
+                                            tree_A.node_low1[nodes_A], tree_A.node_high1[nodes_A],
+                                            tree_B.node_low0[nodes_B], tree_B.node_high0[nodes_B],
+                                            tree_B.node_low1[nodes_B], tree_B.node_high1[nodes_B])
+        level_stats = {'node_pairs': 0, 'leaf_pairs': 0, 'mbr_comparisons': 0, 'load_cycles': 0}
+        for idx_A, idx_B in pair_chunks:
+            node_A = nodes_A[idx_A]
+            node_B = nodes_B[idx_B]
+            count_A = tree_A.count[node_A].astype(np.int64)
+            count_B = tree_B.count[node_B].astype(np.int64)
+            leaf_A = tree_A.is_leaf[node_A] != 0
+            leaf_B = tree_B.is_leaf[node_B] != 0
+            comparisons = np.where(leaf_A == leaf_B, count_A * count_B, np.where(leaf_A, count_B, count_A))
+            level_stats['node_pairs'] += len(node_A)
+            level_stats['leaf_pairs'] += int(np.count_nonzero(leaf_A & leaf_B))
+            level_stats['mbr_comparisons'] += int(np.sum(comparisons))
+            level_stats['load_cycles'] += int(np.sum(np.maximum(count_A, count_B)))
+        stats.append(level_stats)
+    return stats
+
+def traversal_size_work(num_objects_A, num_objects_B, max_entry, num_results):
+    """
+    Work of the FPGA_BFS traversal predicted from the dataset sizes: with the objects spread
+        evenly, the leaves of a tree of n objects have sides ~ sqrt(max_entry / n) of the map,
+        so ~(sqrt(nA) + sqrt(nB))^2 / max_entry leaf pairs intersect, each one with
+        max_entry^2 MBR comparisons; the costs of the other levels are a fraction of these
+
+    Output: a dict: leaf_pairs, leaf_comparisons, results
+    """
+    reach = (np.sqrt(num_objects_A) + np.sqrt(num_objects_B)) ** 2
+    return {'leaf_pairs': reach / max_entry, 'leaf_comparisons': reach * max_entry, 'results': num_results}
+
+
+# COST MODEL
+
+def predict_time_ms(coefficients, work):
+    """
+    Output: intercept + sum(coefficient x work) over the work terms of the coefficients
+    """
+    return coefficients.get('intercept', 0.0) + \
+        sum(coefficient * work[name] for name, coefficient in coefficients.items() if name != 'intercept')
+
+def fit_coefficients(works, times_ms, features):
+    """
+    Least squares fit of time_ms = intercept + sum(coefficient x work) with non-negative
+        coefficients: the term with the most negative coefficient is dropped until none is left
+
+    Input: works: a list of work dicts, times_ms: the measured times
+    Output: a coefficient dict (the dropped terms are 0)
+    """
+    names = ['intercept', *features]
+    X = np.array([[1.0] + [float(work[name]) for name in features] for work in works])
+    y = np.asarray(times_ms, dtype=np.float64)
+    active = list(range(len(names)))
+    while True:
+        coefficients = np.linalg.lstsq(X[:, active], y, rcond=None)[0]
+        if np.all(coefficients >= 0) or len(active) == 1:
+            break
+        del active[int(np.argmin(coefficients))]
+    fitted = dict.fromkeys(names, 0.0)
+    for column, coefficient in zip(active, coefficients.tolist()):
+        fitted[names[column]] = max(coefficient, 0.0)
+    return fitted
+
+def save_cost_model(cost_model, path):
+    with open(path, 'w') as f:
+        json.dump(cost_model, f, indent=4)
+
+def load_cost_model(path):
+    """
+    Output: the cost model of a JSON file (save_cost_model), the PE counts back to ints
+    """
+    with open(path) as f:
+        cost_model = json.load(f)
+    return {target: {design: {int(num_PEs): coefficients for num_PEs, coefficients in per_PE.items()}
+                     for design, per_PE in designs.items()} for target, designs in cost_model.items()}
+
+
+# CALIBRATION
+
+def resolve_input(design, num_PEs, path):
+    """
+    Path of an input of an experiment: relative to the folder the host runs in
+    """
+    return os.path.normpath(os.path.join(get_design_dir(design, num_PEs), path))
+
+def count_objects(path, node_bytes=None):
+    """
+    Number of objects of a dataset (or of the leaves of a tree with node_bytes); if the file
+        is not there, the size in its name (e.g. uniform_1000000_polygon_file_0_set_0.bin)
+    """
+    if os.path.exists(path):
+        if node_bytes is not None:
+            return len(read_tree_objects(path, node_bytes)[0])
+        return len(read_dataset(path)[0])
+    for token in os.path.basename(path).split('_'):
+        if token.isdigit():
+            return int(token)
+    raise ValueError(f"Unknown dataset size of {path}")
+
+def experiment_work(design, run):
+    """
+    Work terms of a measured run of experiments/<design>/*.json, None if its inputs
+        are needed and missing
+    """
+    num_PEs = run['version']
+    input1 = resolve_input(design, num_PEs, run['input1'])
+    input2 = resolve_input(design, num_PEs, run['input2'])
+    args = run['additional_args'].split()
+    if design == 'nested':
+        return {'pairs': count_objects(input1) * count_objects(input2)}
+    elif design == 'index':
+        max_entry = int(args[1])
+        num_objects_B = count_objects(input2, get_node_bytes(max_entry))
+        return {'probes': count_objects(input1) * get_tree_height(num_objects_B, max_entry)}
+    if not (os.path.exists(input1) and os.path.exists(input2)):
+        return None
+    num_partitions_1d = int(args[1]) if len(args) > 1 else 10
+    max_comparisons = int(args[2]) if len(args) > 2 else MAX_COMPARISONS_PER_PARTITION
+    objects_A = PBSM.filter_invalid_objects(read_dataset(input1))
+    objects_B = PBSM.filter_invalid_objects(read_dataset(input2))
+    partitions, _ = PBSM.host_partition(objects_A, objects_B, num_partitions_1d, max_comparisons,
+                                        np.random.default_rng(0))
+    return partition_work(partitions)
+
+def bfs_runs(bfs_runs_dir=BFS_RUNS_DIR):
+    """
+    Measured FPGA_BFS runs of plots/json_FPGA (FPGA_perf_{num_PEs}_PE_3_runs.json: dataset,
+        join, size of A, size of B, max_entry: num_results, kernel_time_ms)
+
+    Output: a dict, per number of PEs, a list of (work, fastest kernel time)
+    """
+    samples = {}
+    for num_PEs in BFS_PE_COUNTS:
+        path = os.path.join(bfs_runs_dir, f'FPGA_perf_{num_PEs}_PE_3_runs.json')
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            experiments = json.load(f)
+        for joins in experiments.values():
+            for sizes_A in joins.values():
+                for num_objects_A, sizes_B in sizes_A.items():
+                    for num_objects_B, max_entries in sizes_B.items():
+                        for max_entry, run in max_entries.items():
+                            work = traversal_size_work(int(num_objects_A), int(num_objects_B), int(max_entry),
+                                                       run['num_results'])
+                            samples.setdefault(num_PEs, []).append((work, min(run['kernel_time_ms'])))
+    return samples
+
+def calibrate_fpga(experiments_dir=EXPERIMENTS_DIR, bfs_runs_dir=BFS_RUNS_DIR, verbose=False):
+    """
+    Fit the FPGA coefficients of each design and number of PEs on the runs measured by the
+        experiments: the fastest kernel time of each run, plus for PBSM the fastest host time
+        (cpu_time), fitted apart on HOST_FEATURES and added to the kernel coefficients;
+        sync_traversal on the runs of bfs_runs
+
+    Output: the 'fpga' part of a cost model
+    """
+    cost_model = {}
+    work_cache = {}
+    for design in ('nested', 'index', 'pbsm_static', 'pbsm_dynamic'):
+        samples = {}
+        for dataset in EXPERIMENT_DATASETS:
+            path = os.path.join(experiments_dir, design, dataset + '.json')
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                experiments = json.load(f)
+            for runs in experiments.values():
+                for run in runs:
+                    # the work does not depend on the number of PEs
+                    key = (DESIGNS[design][0], run['input1'], run['input2'], run['additional_args'])
+                    if key not in work_cache:
+                        work_cache[key] = experiment_work(design, run)
+                    if work_cache[key] is not None:
+                        times = run['times']
+                        samples.setdefault(run['version'], []).append(
+                            (work_cache[key], min(times['kernel_time']), min(times.get('cpu_time', [0.0]))))
+        cost_model[design] = {}
+        for num_PEs, design_samples in sorted(samples.items()):
+            works, kernel_ms, host_ms = zip(*design_samples)
+            coefficients = fit_coefficients(works, kernel_ms, FEATURES['fpga'][design])
+            if design in HOST_FEATURES:
+                host = fit_coefficients(works, host_ms, HOST_FEATURES[design])
+                for name, coefficient in host.items():
+                    coefficients[name] = coefficients.get(name, 0.0) + coefficient
+            cost_model[design][num_PEs] = coefficients
+            if verbose:
+                errors = [abs(predict_time_ms(coefficients, work) - (kernel + host)) / (kernel + host)
+                          for work, kernel, host in design_samples]
+                print(f"{design} {num_PEs} PEs: {len(design_samples)} runs, mean error {100 * np.mean(errors):.1f}%")
+
+    cost_model['sync_traversal'] = {}
+    for num_PEs, design_samples in sorted(bfs_runs(bfs_runs_dir).items()):
+        works, kernel_ms = zip(*design_samples)
+        coefficients = fit_coefficients(works, kernel_ms, FEATURES['fpga']['sync_traversal'])
+        cost_model['sync_traversal'][num_PEs] = coefficients
+        if verbose:
+            errors = [abs(predict_time_ms(coefficients, work) - kernel) / kernel for work, kernel in design_samples]
+            print(f"sync_traversal {num_PEs} PEs: {len(design_samples)} runs, mean error {100 * np.mean(errors):.1f}%")
+    return cost_model
+
+
+# PLANNER
+
+def get_tree_height(num_objects, max_entry):
+    """
+    Levels of a full tree of num_objects with max_entry entries per node, as a real number
+    """
+    return max(1.0, np.log(max(num_objects, 1)) / np.log(max_entry))
+
+def get_design_dir(design, num_PEs):
+    # FPGA_BFS: v3.1 for 16 PEs, v3.2 for the others
+    return DESIGNS[design][1].format(num_PEs=num_PEs, version=1 if num_PEs == 16 else 2)
+
+def partition_work(partitions):
+    count_A = partitions.count_A.astype(np.int64)
+    count_B = partitions.count_B.astype(np.int64)
+    return {
+        'comparisons': int(np.sum(count_A * count_B)),
+        'pages': int(np.sum((count_A + OBJS_PER_BLOCK - 1) // OBJS_PER_BLOCK +
+                            (count_B + OBJS_PER_BLOCK - 1) // OBJS_PER_BLOCK)),
+        'copies': int(np.sum(count_A + count_B)),
+        'partitions': partitions.num_partitions,
+    }
+
+
+class JoinPlanner:
+    """
+    Candidate plans of a join of objects_A and objects_B on a target, costed by a cost model.
+
+    The trees (STR, per max_entry) and partitions (per num_partitions_1d) computed for the
+        work of the candidates are kept, so the chosen plan can reuse them.
+
+    A plan is a dict: engine, design, num_PEs, max_entry, num_partitions_1d,
+        max_comparisons_per_partition (None if not a parameter of the engine),
+        join_ms (predicted), prepare_ms (measured time to build the missing trees, or to
+        partition for the CPU PBSM), time_ms (sum) and max_num_results
+    """
+
+    def __init__(self, objects_A, objects_B, target='fpga', cost_model=None, tree_A=None, tree_B=None,
+                 tree_max_entry=None, sample_size=DEFAULT_SAMPLE_SIZE, rng=None):
+        """
+        Input:
+            cost_model: DEFAULT_COST_MODEL by default
+            tree_A, tree_B: existing trees (ArrayRTree or MappedRTree) of A and B with
+                tree_max_entry entries per node, built by STR for each MAX_ENTRIES otherwise
+        """
+        if target not in TARGETS:
+            raise ValueError(f"Unknown target {target}, must be one of {TARGETS}")
+        if rng is None:
+            rng = np.random.default_rng()
+        self.objects_A = PBSM.filter_invalid_objects(objects_A)
+        self.objects_B = PBSM.filter_invalid_objects(objects_B)
+        self.target = target
+        self.cost_model = (cost_model if cost_model is not None else DEFAULT_COST_MODEL)[target]
+        self.rng = rng
+        self.max_entries = MAX_ENTRIES if tree_A is None and tree_B is None else (tree_max_entry,)
+        self.trees = {}
+        if tree_A is not None or tree_B is not None:
+            self.trees[tree_max_entry] = {'A': tree_A, 'B': tree_B, 'build_ms_A': 0.0, 'build_ms_B': 0.0}
+        self.partitions = {}
+        self.levels = {}
+
+        map_bounds = PBSM.get_map_bounds(self.objects_A, self.objects_B)
+        self.stats_A = get_dataset_stats(self.objects_A, map_bounds)
+        self.stats_B = get_dataset_stats(self.objects_B, map_bounds)
+        self.estimate = estimate_join_size(self.objects_A, self.objects_B, sample_size, rng=rng)
+
+    def get_tree(self, side, max_entry):
+        """
+        Output: (tree, build_ms) of dataset A or B
+        """
+        trees = self.trees.setdefault(max_entry, {'A': None, 'B': None})
+        if trees[side] is None:
+            start = time.time()
+            trees[side] = str_bulk_load(*(self.objects_A if side == 'A' else self.objects_B), max_entry=max_entry)
+            trees['build_ms_' + side] = (time.time() - start) * 1000
+        return trees[side], trees['build_ms_' + side]
+
+    def get_partitions(self, num_partitions_1d):
+        """
+        Output: (Partitions, partition_ms)
+        """
+        if num_partitions_1d not in self.partitions:
+            start = time.time()
+            partitions, _ = PBSM.host_partition(self.objects_A, self.objects_B, num_partitions_1d,
+                                                MAX_COMPARISONS_PER_PARTITION, self.rng)
+            self.partitions[num_partitions_1d] = (partitions, (time.time() - start) * 1000)
+        return self.partitions[num_partitions_1d]
+
+    def get_levels(self, max_entry):
+        if max_entry not in self.levels:
+            self.levels[max_entry] = traversal_workload(self.get_tree('A', max_entry)[0],
+                                                        self.get_tree('B', max_entry)[0])
+        return self.levels[max_entry]
+
+    def workload(self, engine, max_entry=None, num_partitions_1d=None):
+        """
+        Output: (work, prepare_ms), the work terms of the engine (see the module doc)
+        """
+        num_objects_A = self.stats_A['num_objects']
+        num_objects_B = self.stats_B['num_objects']
+        num_results = self.estimate['estimate']
+        if engine == 'nested':
+            return {'pairs': num_objects_A * num_objects_B, 'objects': num_objects_A + num_objects_B}, 0.0
+        elif engine == 'index':
+            work = {'probes': num_objects_A * get_tree_height(num_objects_B, max_entry), 'results': num_results}
+            return work, self.get_tree('B', max_entry)[1]
+        elif engine == 'pbsm':
+            partitions, partition_ms = self.get_partitions(num_partitions_1d)
+            # the FPGA host partitions on its own, its time is part of the fitted coefficients
+            return partition_work(partitions), partition_ms if self.target == 'cpu' else 0.0
+        elif engine == 'sync_traversal':
+            levels = self.get_levels(max_entry)
+            work = {
+                'node_pairs': sum(level['node_pairs'] for level in levels),
+                'mbr_comparisons': sum(level['mbr_comparisons'] for level in levels),
+                **traversal_size_work(num_objects_A, num_objects_B, max_entry, num_results),
+            }
+            return work, self.get_tree('A', max_entry)[1] + self.get_tree('B', max_entry)[1]
+        raise ValueError(f"Unknown engine {engine}, must be one of {ENGINES}")
+
+    def candidates(self, engines=ENGINES):
+        """
+        Output: the plans of all the designs, numbers of PEs and parameters of the cost model,
+            fastest first
+        """
+        plans = []
+        for design, per_PE in self.cost_model.items():
+            engine = DESIGNS[design][0] if self.target == 'fpga' else design
+            if engine not in engines:
+                continue
+            if engine in ('index', 'sync_traversal'):
+                parameters = [{'max_entry': max_entry} for max_entry in self.max_entries]
+            elif engine == 'pbsm':
+                parameters = [{'num_partitions_1d': n, 'max_comparisons_per_partition': MAX_COMPARISONS_PER_PARTITION}
+                              for n in NUM_PARTITIONS_1D]
+            else:
+                parameters = [{}]
+            for num_PEs, coefficients in sorted(per_PE.items()):
+                for params in parameters:
+                    work, prepare_ms = self.workload(engine, params.get('max_entry'), params.get('num_partitions_1d'))
+                    join_ms = predict_time_ms(coefficients, work)
+                    plans.append({
+                        'engine': engine,
+                        'design': design,
+                        'num_PEs': num_PEs,
+                        'max_entry': None,
+                        'num_partitions_1d': None,
+                        'max_comparisons_per_partition': None,
+                        **params,
+                        'join_ms': join_ms,
+                        'prepare_ms': prepare_ms,
+                        'time_ms': join_ms + prepare_ms,
+                        'max_num_results': result_buffer_size(self.estimate),
+                    })
+        # fastest first, fewer PEs on ties
+        plans.sort(key=lambda plan: (round(plan['time_ms'], 3), plan['num_PEs']))
+        return plans
+
+    def plan(self, engines=ENGINES):
+        """
+        Output: the fastest plan
+        """
+        plans = self.candidates(engines)
+        if len(plans) == 0:
+            raise ValueError(f"No {self.target} design of {engines} in the cost model")
+        return plans[0]
+
+
+def host_command(plan, file_A, file_B, tree_A=None, tree_B=None):
+    """
+    Command line of the FPGA host of a plan, run from the folder of its design
+
+    Input: file_A, file_B: the datasets; tree_A, tree_B: the serialized trees (index:
+        tree_B, sync_traversal: both, with plan['max_entry'] entries per node)
+    Output: (design folder, command, swapped); swapped: the FPGA_BFS host needs the tree of
+        depth A <= depth B, so a deeper tree A is passed second, and the host writes
+        (obj id B, obj id A) pairs
+    """
+    design = plan['design']
+    design_dir = get_design_dir(design, plan['num_PEs'])
+    xclbin = DESIGNS[design][2]
+    max_num_results = plan['max_num_results']
+    swapped = False
+    if plan['engine'] == 'nested':
+        args = [file_A, file_B, max_num_results]
+    elif plan['engine'] == 'index':
+        tree = MappedRTree(tree_B, get_node_bytes(plan['max_entry']))
+        args = [file_A, tree_B, tree_max_depth(tree), plan['max_entry'], max_num_results]
+    elif plan['engine'] == 'pbsm':
+        args = [file_A, file_B, max_num_results, plan['num_partitions_1d'], plan['max_comparisons_per_partition']]
+    elif plan['engine'] == 'sync_traversal':
+        node_bytes = get_node_bytes(plan['max_entry'])
+        depth_A = tree_max_depth(MappedRTree(tree_A, node_bytes))
+        depth_B = tree_max_depth(MappedRTree(tree_B, node_bytes))
+        swapped = depth_A > depth_B
+        if swapped:
+            tree_A, tree_B, depth_A, depth_B = tree_B, tree_A, depth_B, depth_A
+        args = [tree_A, tree_B, depth_A, depth_B, plan['max_entry'], node_bytes, max_num_results]
+    else:
+        raise ValueError(f"Unknown engine {plan['engine']}, must be one of {ENGINES}")
+    return design_dir, ' '.join(['./host', xclbin] + [str(arg) for arg in args]), swapped
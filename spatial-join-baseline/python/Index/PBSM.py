@@ -0,0 +1,703 @@
+"""
+Partition-Based Spatial Merge (PBSM) join with NumPy, Python counterpart of the host code
+    of spatial-join-on-FPGA-PBSM/designs/pbsm (partition_utils.hpp, partition_multi.hpp)
+    and of its join units (join_unit in PEs.hpp).
+
+The steps and their timers are the same as host_partition:
+    1. init grid:       map bounds of A and B, num_partitions_1d x num_partitions_1d
+                            uniform cells, minimum cell size = median object width and
+                            height of a sample of A and B (compute_map_stats)
+    2. partition:       every object is assigned to all the cells its MBR overlaps
+    3. refine:          a cell over the budget (|A| x |B| > max_comparisons_per_partition
+                            or |B| > MAX_OBJS_PER_PARTITION) is split into 4 quadrants, until
+                            it fits or reaches the minimum cell size; objects on a split line
+                            go to both sides (distribute_object), quadrants without objects
+                            of A or B are dropped
+    4. prepare:         the cells with objects of A and B are packed into the 64-byte pages
+                            and partition meta pages read by the kernel
+    join:               per cell, all objects of A against all objects of B; an intersecting
+                            pair is kept if the lower-left corner of the intersection (its
+                            reference point) is owned by the cell, see DEDUP_MODES
+
+Reference-point duplicate elimination: an object is replicated into every cell it overlaps,
+    so a pair can be found in several cells. Each point of the map is owned by exactly one
+    final cell, found the way the objects were assigned: the grid cell of its truncated
+    float32 index, then at every split the left (bottom) quadrant if x < mid (y < mid), else
+    the right (top) one. Both objects of an intersecting pair contain its reference point,
+    so both are assigned to the owner cell, and reporting the pair only there outputs every
+    result exactly once, without any global set of pairs. The join unit instead checks
+    min <= point <= max, and reports the pairs whose point is on a shared cell border twice.
+
+The refinement can also follow a PartitionLayout planned from a sample of A and B
+    (plan_partitions): the hot cells of skewed datasets are split from estimated counts,
+    the layout can be saved and applied again, and apply_layout still refines the cells
+    that turn out to be over the budget.
+
+All the cells of a step are processed at once: the objects of a cell are an index range of
+    an object index array sorted by cell, the refinement splits all the overloaded cells of
+    a round together instead of using one stack per initial cell. Coordinates are kept in
+    float32 like the C++ code, so the cells and the assignments are the same.
+"""
+import os
+
+import numpy as np
+
+from Index import Page_codec
+from Index.Plane_sweep import expand_ranges, MAX_CANDIDATES
+
+MAX_OBJS_PER_PARTITION = 100 # size of cache_B in the join unit
+MAX_META_PER_PAGE = 5
+
+# which cells report an intersecting pair:
+#     reference_point:  only the owner of the reference point, every result exactly once
+#     join_unit:        every cell with the reference point in [min, max], as designs/pbsm
+#     none:             every cell holding both objects
+DEDUP_MODES = ('reference_point', 'join_unit', 'none')
+
+# partition_meta_t as packed by pack_meta_to_pages: count, then the lower-left corner (A)
+#     or the upper-right corner (B) of the cell
+PARTITION_META_DTYPE = np.dtype([('count', '<i4'), ('x', '<f4'), ('y', '<f4')])
+META_PAGE_DTYPE = np.dtype({'names': ['meta'], 'formats': [(PARTITION_META_DTYPE, (MAX_META_PER_PAGE,))],
+                            'itemsize': Page_codec.AXI_BYTES})
+
+
+class Partitions:
+    """
+    Cells of a PBSM partitioning (struct-of-arrays).
+
+    Per cell (num_partitions):
+        min_x, max_x, min_y, max_y      float32, the cell bounds
+        grid_cell                       int64, the initial grid cell the cell was split from
+        split_edges                     bool (num_partitions, 4), whether the min_x, max_x,
+                                            min_y, max_y edge is a split line (else it is
+                                            the edge of the grid cell)
+    Grid:
+        grid                            (num_partitions_1d, map min_x, map min_y, cell_width,
+                                            cell_height) of the initial grid
+    Per side (A and B):
+        offset_A, offset_B              int64 (num_partitions + 1), the objects of cell i are
+                                            obj_A[offset_A[i]:offset_A[i + 1]]
+        obj_A, obj_B                    int64, indices into the dataset arrays, grouped by
+                                            cell, dataset order inside a cell
+    """
+
+    def __init__(self, min_x, max_x, min_y, max_y, grid_cell, split_edges, grid, cell_A, obj_A, cell_B, obj_B):
+        """
+        cell_A, obj_A (cell_B, obj_B): one (cell, object index) pair per assignment, sorted by cell
+        """
+        self.min_x = min_x
+        self.max_x = max_x
+        self.min_y = min_y
+        self.max_y = max_y
+        self.grid_cell = grid_cell
+        self.split_edges = split_edges
+        self.grid = grid
+        num_partitions = len(min_x)
+        self.offset_A = np.concatenate([[0], np.cumsum(np.bincount(cell_A, minlength=num_partitions))])
+        self.offset_B = np.concatenate([[0], np.cumsum(np.bincount(cell_B, minlength=num_partitions))])
+        self.obj_A = obj_A
+        self.obj_B = obj_B
+
+    @property
+    def num_partitions(self):
+        return len(self.min_x)
+
+    @property
+    def count_A(self):
+        return np.diff(self.offset_A)
+
+    @property
+    def count_B(self):
+        return np.diff(self.offset_B)
+
+    def get_cells_A(self):
+        """
+        Output: the cell of each entry of obj_A
+        """
+        return np.repeat(np.arange(self.num_partitions), self.count_A)
+
+    def get_cells_B(self):
+        return np.repeat(np.arange(self.num_partitions), self.count_B)
+
+    def owns(self, cell, x, y):
+        """
+        Output: a bool array, whether cell[i] is the owner of the point (x[i], y[i])
+        """
+        num_partitions_1d, min_x, min_y, cell_width, cell_height = self.grid
+        # same index as assign_to_grid, the grid cell of a point is one of the cells of any MBR holding it
+        grid_x = np.clip(((x - min_x) / cell_width).astype(np.int64), 0, num_partitions_1d - 1)
+        grid_y = np.clip(((y - min_y) / cell_height).astype(np.int64), 0, num_partitions_1d - 1)
+        # then half-open on the split lines, same sides as distribute_objects
+        split_edges = self.split_edges[cell]
+        return (grid_y * num_partitions_1d + grid_x == self.grid_cell[cell]) & \
+            (~split_edges[:, 0] | (x >= self.min_x[cell])) & (~split_edges[:, 1] | (x < self.max_x[cell])) & \
+            (~split_edges[:, 2] | (y >= self.min_y[cell])) & (~split_edges[:, 3] | (y < self.max_y[cell]))
+
+
+def filter_invalid_objects(objects):
+    """
+    Drop the invalid rows (0 0 0 0 0) of the OSM datasets, as read_objects_from_file does
+    """
+    ids, low0, high0, low1, high1 = objects
+    valid = (ids != 0) | (low0 != 0) | (high0 != 0) | (low1 != 0) | (high1 != 0)
+    if np.all(valid):
+        return objects
+    return ids[valid], low0[valid], high0[valid], low1[valid], high1[valid]
+
+
+# 1. INIT GRID
+
+def get_map_bounds(objects_A, objects_B):
+    """
+    Output: (min_x, max_x, min_y, max_y) of the objects of A and B, float32
+    """
+    _, low0_A, high0_A, low1_A, high1_A = objects_A
+    _, low0_B, high0_B, low1_B, high1_B = objects_B
+    return np.float32(min(np.amin(low0_A), np.amin(low0_B))), np.float32(max(np.amax(high0_A), np.amax(high0_B))), \
+        np.float32(min(np.amin(low1_A), np.amin(low1_B))), np.float32(max(np.amax(high1_A), np.amax(high1_B)))
+
+def init_grid(num_partitions_1d, map_bounds):
+    """
+    Output: min_x, max_x, min_y, max_y of the uniform cells, row-major (index = y * n + x)
+        as init_grid_1D, and (cell_width, cell_height)
+    """
+    min_x, max_x, min_y, max_y = map_bounds
+    cell_width = np.float32((max_x - min_x) / np.float32(num_partitions_1d))
+    cell_height = np.float32((max_y - min_y) / np.float32(num_partitions_1d))
+    j = np.tile(np.arange(num_partitions_1d, dtype=np.float32), num_partitions_1d)
+    i = np.repeat(np.arange(num_partitions_1d, dtype=np.float32), num_partitions_1d)
+    cell_min_x = min_x + j * cell_width
+    cell_min_y = min_y + i * cell_height
+    return cell_min_x, cell_min_x + cell_width, cell_min_y, cell_min_y + cell_height, (cell_width, cell_height)
+
+def determine_sample_size(dataset_size : int):
+    """
+    Same sample sizes as the host: all the objects up to 10K, 5% up to 50K,
+        2% up to 100K, then 1% but at most 5000
+    """
+    if dataset_size <= 10000:
+        return dataset_size
+    elif dataset_size <= 50000:
+        return int(dataset_size * 0.05)
+    elif dataset_size <= 100000:
+        return int(dataset_size * 0.02)
+    else:
+        return min(5000, int(dataset_size * 0.01))
+
+def compute_map_stats(objects_A, objects_B, rng=None):
+    """
+    Minimum cell size of the refinement: the median width and height of a random sample
+        of A and B (without replacement)
+
+    Output: (min_cell_size_x, min_cell_size_y), float32
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    widths = []
+    heights = []
+    for _, low0, high0, low1, high1 in (objects_A, objects_B):
+        sample = rng.choice(len(low0), size=determine_sample_size(len(low0)), replace=False)
+        widths.append(high0[sample] - low0[sample])
+        heights.append(high1[sample] - low1[sample])
+    widths = np.sort(np.concatenate(widths))
+    heights = np.sort(np.concatenate(heights))
+    return np.float32(widths[len(widths) // 2]), np.float32(heights[len(heights) // 2])
+
+
+# 2. PARTITION OBJECTS
+
+def assign_to_grid(objects, num_partitions_1d, map_bounds, cell_size):
+    """
+    Assign every object to all the grid cells its MBR overlaps (partition_objects)
+
+    Output: (cell, obj) int64 arrays, one element per assignment, sorted by cell
+        with the objects of a cell in dataset order
+    """
+    _, low0, high0, low1, high1 = objects
+    min_x, _, min_y, _ = map_bounds
+    cell_width, cell_height = cell_size
+    n = num_partitions_1d
+    # float32 arithmetic and truncation, same as static_cast<int>
+    x_min = np.maximum(0, ((low0 - min_x) / cell_width).astype(np.int64))
+    x_max = np.minimum(n - 1, ((high0 - min_x) / cell_width).astype(np.int64))
+    y_min = np.maximum(0, ((low1 - min_y) / cell_height).astype(np.int64))
+    y_max = np.minimum(n - 1, ((high1 - min_y) / cell_height).astype(np.int64))
+
+    num_x = np.maximum(0, x_max - x_min + 1)
+    num_cells = num_x * np.maximum(0, y_max - y_min + 1)
+    obj = np.repeat(np.arange(len(low0)), num_cells)
+    # k-th cell of an object: x = x_min + k % num_x, y = y_min + k // num_x
+    k = np.arange(len(obj)) - np.repeat(np.cumsum(num_cells) - num_cells, num_cells)
+    num_x = np.repeat(num_x, num_cells)
+    cell = (np.repeat(y_min, num_cells) + k // num_x) * n + np.repeat(x_min, num_cells) + k % num_x
+
+    order = np.argsort(cell, kind='stable')
+    return cell[order], obj[order]
+
+def select_cells(cells, cell_A, obj_A, cell_B, obj_B, keep):
+    """
+    Keep the cells where keep is set, renumber them 0..k-1
+
+    Output: the bounds of the kept cells, (cell_A, obj_A), (cell_B, obj_B)
+    """
+    new_id = np.cumsum(keep) - 1
+    mask_A = keep[cell_A]
+    mask_B = keep[cell_B]
+    return [c[keep] for c in cells], (new_id[cell_A[mask_A]], obj_A[mask_A]), (new_id[cell_B[mask_B]], obj_B[mask_B])
+
+
+# 3. REFINE PARTITIONS
+
+def distribute_objects(cell, obj, objects, split_id, mid_x, mid_y):
+    """
+    Distribute the objects of the split cells among their 4 quadrants (distribute_object),
+        quadrant q of split cell s gets the id 4 * s + q (0: top-left, 1: top-right,
+        2: bottom-left, 3: bottom-right)
+
+    Output: (cell, obj) of the quadrants, sorted by cell
+    """
+    _, low0, high0, low1, high1 = objects
+    split = split_id[cell] >= 0
+    cell, obj = cell[split], obj[split]
+    cell_mid_x, cell_mid_y = mid_x[cell], mid_y[cell]
+    left = low0[obj] <= cell_mid_x
+    right = high0[obj] >= cell_mid_x
+    bottom = low1[obj] <= cell_mid_y
+    top = high1[obj] >= cell_mid_y
+
+    new_cell = []
+    new_obj = []
+    for quadrant, mask in enumerate([left & top, right & top, left & bottom, right & bottom]):
+        new_cell.append(4 * split_id[cell[mask]] + quadrant)
+        new_obj.append(obj[mask])
+    new_cell = np.concatenate(new_cell)
+    new_obj = np.concatenate(new_obj)
+    order = np.argsort(new_cell, kind='stable')
+    return new_cell[order], new_obj[order]
+
+def split_cells(cells, split):
+    """
+    Split the cells where split is set into 4 quadrants (0: top-left, 1: top-right,
+        2: bottom-left, 3: bottom-right), quadrant q of split cell s is cell 4 * s + q
+
+    Input: cells: (min_x, max_x, min_y, max_y, grid_cell, split_edges) arrays
+    Output: the quadrant cells, and (split_id, mid_x, mid_y) of the cells for distribute_objects
+    """
+    min_x, max_x, min_y, max_y, grid_cell, split_edges = cells
+    split_id = np.where(split, np.cumsum(split) - 1, -1)
+    mid_x = (min_x + max_x) / np.float32(2)
+    mid_y = (min_y + max_y) / np.float32(2)
+    s_min_x, s_max_x, s_min_y, s_max_y, s_mid_x, s_mid_y = \
+        min_x[split], max_x[split], min_y[split], max_y[split], mid_x[split], mid_y[split]
+    # a quadrant keeps the outer edges of its cell, its 2 inner edges are split lines
+    s_edges = np.repeat(split_edges[split], 4, axis=0).reshape(-1, 4, 4)
+    s_edges[:, [1, 3], 0] = True
+    s_edges[:, [0, 2], 1] = True
+    s_edges[:, [0, 1], 2] = True
+    s_edges[:, [2, 3], 3] = True
+    quadrants = (np.stack([s_min_x, s_mid_x, s_min_x, s_mid_x], axis=1).reshape(-1),
+                 np.stack([s_mid_x, s_max_x, s_mid_x, s_max_x], axis=1).reshape(-1),
+                 np.stack([s_mid_y, s_mid_y, s_min_y, s_min_y], axis=1).reshape(-1),
+                 np.stack([s_max_y, s_max_y, s_mid_y, s_mid_y], axis=1).reshape(-1),
+                 np.repeat(grid_cell[split], 4),
+                 s_edges.reshape(-1, 4))
+    return quadrants, (split_id, mid_x, mid_y)
+
+def refine_partitions(cells, assignments_A, assignments_B, objects_A, objects_B,
+                      max_comparisons_per_partition, map_stats, grid, planned_splits=None):
+    """
+    Split the overloaded cells until all of them fit (refine_partition_iterative), one round
+        per level of splits, all the overloaded cells of a round are split together
+
+    Input:
+        cells: (min_x, max_x, min_y, max_y) arrays of the initial grid
+        assignments_A, assignments_B: (cell, obj) arrays sorted by cell
+        map_stats: (min_cell_size_x, min_cell_size_y)
+        grid: the initial grid, see Partitions
+        planned_splits: the splits of a PartitionLayout, the planned cells are split even if
+            they fit, the others as usual
+    Output: Partitions, the final cells with objects of A and B, in round order
+    """
+    min_cell_size_x, min_cell_size_y = map_stats
+    if planned_splits is None:
+        planned_splits = []
+    # carried along the cells: the grid cell and the split edges, for the reference-point
+    #     check, and the id of the cell in the planned round (-1 if not planned)
+    num_cells = len(cells[0])
+    cells = (*cells, np.arange(num_cells), np.zeros((num_cells, 4), dtype=bool), np.arange(num_cells))
+    final_cells = []
+    final_A = []
+    final_B = []
+    num_final = 0
+
+    (cell_A, obj_A), (cell_B, obj_B) = assignments_A, assignments_B
+    level = 0
+    while len(cells[0]) > 0:
+        num_cells = len(cells[0])
+        count_A = np.bincount(cell_A, minlength=num_cells)
+        count_B = np.bincount(cell_B, minlength=num_cells)
+
+        # cells that cannot lead to join results are dropped
+        keep = (count_A > 0) & (count_B > 0)
+        cells, (cell_A, obj_A), (cell_B, obj_B) = select_cells(cells, cell_A, obj_A, cell_B, obj_B, keep)
+        count_A, count_B = count_A[keep], count_B[keep]
+        min_x, max_x, min_y, max_y, grid_cell, split_edges, plan_id = cells
+
+        is_cell_small = ((max_x - min_x) <= min_cell_size_x) | ((max_y - min_y) <= min_cell_size_y)
+        is_under_comparison_limit = (count_A * count_B <= max_comparisons_per_partition) & \
+            (count_B <= MAX_OBJS_PER_PARTITION)
+        done = is_cell_small | is_under_comparison_limit
+        planned = np.zeros(len(done), dtype=bool)
+        if level < len(planned_splits):
+            planned[plan_id >= 0] = planned_splits[level][plan_id[plan_id >= 0]]
+            done &= ~planned
+
+        # final cells
+        done_id = np.cumsum(done) - 1
+        mask_A = done[cell_A]
+        mask_B = done[cell_B]
+        final_cells.append([c[done] for c in cells[:6]])
+        final_A.append((num_final + done_id[cell_A[mask_A]], obj_A[mask_A]))
+        final_B.append((num_final + done_id[cell_B[mask_B]], obj_B[mask_B]))
+        num_final += int(np.count_nonzero(done))
+
+        # split the others into 4 quadrants
+        split = ~done
+        quadrants, (split_id, mid_x, mid_y) = split_cells(cells[:6], split)
+        cell_A, obj_A = distribute_objects(cell_A, obj_A, objects_A, split_id, mid_x, mid_y)
+        cell_B, obj_B = distribute_objects(cell_B, obj_B, objects_B, split_id, mid_x, mid_y)
+        # the quadrants of a planned split are the cells 4 * s + q of the next planned round
+        next_plan_id = np.full(len(split), -1)
+        if level < len(planned_splits):
+            plan_split_id = np.cumsum(planned_splits[level]) - 1
+            next_plan_id[planned] = plan_split_id[plan_id[planned]]
+        next_plan_id = np.repeat(next_plan_id[split], 4)
+        next_plan_id = np.where(next_plan_id >= 0, 4 * next_plan_id + np.tile(np.arange(4), len(next_plan_id) // 4), -1)
+        cells = (*quadrants, next_plan_id)
+        level += 1
+
+    cells = [np.concatenate([c[i] for c in final_cells]) for i in range(6)]
+    cell_A = np.concatenate([a[0] for a in final_A])
+    obj_A = np.concatenate([a[1] for a in final_A])
+    cell_B = np.concatenate([b[0] for b in final_B])
+    obj_B = np.concatenate([b[1] for b in final_B])
+    # the final cells of a round are numbered after those of the previous rounds: already sorted
+    return Partitions(*cells, grid, cell_A, obj_A, cell_B, obj_B)
+
+
+# 4. PREPARE PARTITIONS
+
+def encode_partition_pages(objects, obj, offset):
+    """
+    Pack the objects of every partition into 64-byte pages of 3 obj_t, each partition
+        starts on a new page (pack_partitions_to_pages)
+
+    Output: a Page_codec.BLOCK_DTYPE array
+    """
+    ids, low0, high0, low1, high1 = objects
+    count = np.diff(offset)
+    pages = Page_codec.get_num_data_blocks(count)
+    page_offset = np.cumsum(pages) - pages
+    blocks = np.zeros(int(np.sum(pages)), dtype=Page_codec.BLOCK_DTYPE)
+    rank = np.arange(len(obj)) - np.repeat(offset[:-1], count)
+    block = np.repeat(page_offset, count) + rank // Page_codec.OBJS_PER_BLOCK
+    slot = rank % Page_codec.OBJS_PER_BLOCK
+    objs = blocks['objs']
+    for field, values in zip(Page_codec.OBJ_DTYPE.names, (ids, low0, high0, low1, high1)):
+        objs[field][block, slot] = values[obj]
+    return blocks
+
+def encode_meta_pages(count, x, y):
+    """
+    Pack the partition meta data, 5 partition_meta_t per 64-byte page (pack_meta_to_pages)
+
+    Output: a META_PAGE_DTYPE array
+    """
+    num_partitions = len(count)
+    pages = np.zeros((num_partitions + MAX_META_PER_PAGE - 1) // MAX_META_PER_PAGE, dtype=META_PAGE_DTYPE)
+    meta = pages['meta'].reshape(-1)
+    meta['count'][:num_partitions] = count
+    meta['x'][:num_partitions] = x
+    meta['y'][:num_partitions] = y
+    pages['meta'] = meta.reshape(-1, MAX_META_PER_PAGE)
+    return pages
+
+def prepare_partitions(objects_A, objects_B, partitions):
+    """
+    Output: a dict of the 4 kernel input buffers: partitions_A, meta_A (count, lower-left
+        corner of the cells), partitions_B, meta_B (count, upper-right corner of the cells)
+    """
+    return {
+        'partitions_A': encode_partition_pages(objects_A, partitions.obj_A, partitions.offset_A),
+        'meta_A': encode_meta_pages(partitions.count_A, partitions.min_x, partitions.min_y),
+        'partitions_B': encode_partition_pages(objects_B, partitions.obj_B, partitions.offset_B),
+        'meta_B': encode_meta_pages(partitions.count_B, partitions.max_x, partitions.max_y),
+    }
+
+def write_partition_pages(out_dir, buffers):
+    """
+    Write the kernel input buffers of prepare_partitions to out_dir/<name>.bin
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for name, pages in buffers.items():
+        pages.tofile(os.path.join(out_dir, name + '.bin'))
+
+
+def host_partition(objects_A, objects_B, num_partitions_1d=10, max_comparisons_per_partition=1000,
+                   rng=None, timer=None):
+    """
+    Steps 1 to 3 of host_partition
+
+    Input:
+        objects_A, objects_B: (ids, low0, high0, low1, high1) arrays, e.g. from
+            Index.Bulk_loading.read_dataset
+        rng: np.random.Generator of the map stats sample
+        timer: called with the name of each step when it completes (init, partition, refine)
+    Output: (Partitions, map_stats)
+    """
+    map_bounds = get_map_bounds(objects_A, objects_B)
+    *cells, cell_size = init_grid(num_partitions_1d, map_bounds)
+    map_stats = compute_map_stats(objects_A, objects_B, rng)
+    if timer is not None:
+        timer('init')
+
+    assignments_A = assign_to_grid(objects_A, num_partitions_1d, map_bounds, cell_size)
+    assignments_B = assign_to_grid(objects_B, num_partitions_1d, map_bounds, cell_size)
+    if timer is not None:
+        timer('partition')
+
+    grid = (num_partitions_1d, map_bounds[0], map_bounds[2], *cell_size)
+    partitions = refine_partitions(cells, assignments_A, assignments_B, objects_A, objects_B,
+                                   max_comparisons_per_partition, map_stats, grid)
+    if timer is not None:
+        timer('refine')
+    return partitions, map_stats
+
+
+# PARTITION PLANNER
+
+class PartitionLayout:
+    """
+    Planned splits of a PBSM partitioning, computed from a sample (plan_partitions), saved
+        and applied to the full datasets (apply_layout).
+
+        num_partitions_1d, map_bounds   the initial grid, see init_grid
+        map_stats                       (min_cell_size_x, min_cell_size_y)
+        splits                          one bool array per round of splits, splits[r][c]: cell c
+                                            of round r is split, round 0 is the grid and the
+                                            cells of round r + 1 are the quadrants 4 * s + q of
+                                            the split cells of round r (split_cells)
+    """
+
+    def __init__(self, num_partitions_1d, map_bounds, map_stats, splits):
+        self.num_partitions_1d = int(num_partitions_1d)
+        self.map_bounds = tuple(np.float32(b) for b in map_bounds)
+        self.map_stats = tuple(np.float32(m) for m in map_stats)
+        self.splits = [np.asarray(split, dtype=bool) for split in splits]
+
+    @property
+    def num_cells(self):
+        """
+        Number of cells of the layout: the unsplit cells of all the rounds
+        """
+        num_cells = self.num_partitions_1d ** 2
+        for split in self.splits:
+            num_cells += 3 * int(np.count_nonzero(split))
+        return num_cells
+
+    def save(self, path):
+        np.savez(path, num_partitions_1d=self.num_partitions_1d, map_bounds=np.array(self.map_bounds),
+                 map_stats=np.array(self.map_stats), **{f'split_{r}': split for r, split in enumerate(self.splits)})
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as f:
+            splits = [f[f'split_{r}'] for r in range(len(f.files) - 3)]
+            return PartitionLayout(f['num_partitions_1d'], f['map_bounds'], f['map_stats'], splits)
+
+
+def sample_objects(objects, sample_size, rng):
+    """
+    Output: a random sample (without replacement, in dataset order) of the objects
+    """
+    sample = np.sort(rng.choice(len(objects[0]), size=sample_size, replace=False))
+    return tuple(c[sample] for c in objects)
+
+def plan_partitions(objects_A, objects_B, num_partitions_1d=10, max_comparisons_per_partition=1000,
+                    sample_fraction=0.1, map_stats=None, rng=None):
+    """
+    Plan the refinement from a sample of A and B: the number of objects of A and B in a cell
+        is estimated from the sample objects it holds, and the cells whose estimated
+        |A| x |B| (or |B|) is over the budget of refine_partitions are split, round by round,
+        until all the estimates fit or the cells reach the minimum cell size
+
+    Input:
+        sample_fraction: sampled share of each dataset, at least determine_sample_size objects
+        map_stats: the minimum cell size, default: compute_map_stats
+    Output: a PartitionLayout
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    map_bounds = get_map_bounds(objects_A, objects_B)
+    if map_stats is None:
+        map_stats = compute_map_stats(objects_A, objects_B, rng)
+    min_cell_size_x, min_cell_size_y = map_stats
+    *cells, cell_size = init_grid(num_partitions_1d, map_bounds)
+    num_cells = len(cells[0])
+    cells = (*cells, np.arange(num_cells), np.zeros((num_cells, 4), dtype=bool))
+
+    samples = []
+    assignments = []
+    scales = []
+    for objects in (objects_A, objects_B):
+        dataset_size = len(objects[0])
+        sample_size = min(dataset_size, max(determine_sample_size(dataset_size), int(dataset_size * sample_fraction)))
+        sample = sample_objects(objects, sample_size, rng)
+        samples.append(sample)
+        assignments.append(assign_to_grid(sample, num_partitions_1d, map_bounds, cell_size))
+        scales.append(dataset_size / max(sample_size, 1))
+
+    splits = []
+    while True:
+        min_x, max_x, min_y, max_y, _, _ = cells
+        num_cells = len(min_x)
+        estimate_A, estimate_B = [np.bincount(cell, minlength=num_cells) * scale
+                                  for (cell, _), scale in zip(assignments, scales)]
+        is_cell_small = ((max_x - min_x) <= min_cell_size_x) | ((max_y - min_y) <= min_cell_size_y)
+        is_hot = (estimate_A * estimate_B > max_comparisons_per_partition) | (estimate_B > MAX_OBJS_PER_PARTITION)
+        # as in refine_partitions, cells without objects of A or B will be dropped
+        split = is_hot & ~is_cell_small & (estimate_A > 0) & (estimate_B > 0)
+        if not np.any(split):
+            break
+        splits.append(split)
+        cells, (split_id, mid_x, mid_y) = split_cells(cells, split)
+        assignments = [distribute_objects(cell, obj, sample, split_id, mid_x, mid_y)
+                       for (cell, obj), sample in zip(assignments, samples)]
+
+    return PartitionLayout(num_partitions_1d, map_bounds, map_stats, splits)
+
+def apply_layout(objects_A, objects_B, layout, max_comparisons_per_partition=1000, timer=None):
+    """
+    Steps 2 and 3 of host_partition on a planned layout: the objects are assigned to the grid
+        of the layout, the planned cells are split, and the cells still over the budget are
+        refined as usual (the estimates of a sample can be low)
+
+    Output: Partitions
+    """
+    map_bounds = layout.map_bounds
+    *cells, cell_size = init_grid(layout.num_partitions_1d, map_bounds)
+    assignments_A = assign_to_grid(objects_A, layout.num_partitions_1d, map_bounds, cell_size)
+    assignments_B = assign_to_grid(objects_B, layout.num_partitions_1d, map_bounds, cell_size)
+    if timer is not None:
+        timer('partition')
+
+    grid = (layout.num_partitions_1d, map_bounds[0], map_bounds[2], *cell_size)
+    partitions = refine_partitions(cells, assignments_A, assignments_B, objects_A, objects_B,
+                                   max_comparisons_per_partition, layout.map_stats, grid, layout.splits)
+    if timer is not None:
+        timer('refine')
+    return partitions
+
+
+# JOIN
+
+def iter_join_chunks(objects_A, objects_B, partitions, pair_kernel=None, dedup='reference_point',
+                     max_candidates=MAX_CANDIDATES):
+    """
+    Join every partition, same intersection test as the join unit
+
+    Input:
+        pair_kernel: None for a nested loop over all the partitions at once, in chunks of
+            max_candidates object pairs, or a per-partition kernel with the interface of
+            Index.Join_kernels.intersect_pairs (e.g., Index.Plane_sweep.PAIR_KERNELS)
+        dedup: one of DEDUP_MODES, which cells report a pair
+    Output: a generator of (obj id A, obj id B) int32 arrays of shape (n, 2)
+    """
+    if dedup not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode: {dedup}, expected one of {DEDUP_MODES}")
+    ids_A, low0_A, high0_A, low1_A, high1_A = objects_A
+    ids_B, low0_B, high0_B, low1_B, high1_B = objects_B
+
+    def filter_pairs(cell, a, b, intersects):
+        # reference point: lower-left corner of the intersection
+        x = np.maximum(low0_A[a], low0_B[b])
+        y = np.maximum(low1_A[a], low1_B[b])
+        if dedup == 'reference_point':
+            keep = intersects & partitions.owns(cell, x, y)
+        elif dedup == 'join_unit':
+            keep = intersects & (x >= partitions.min_x[cell]) & (y >= partitions.min_y[cell]) & \
+                (x <= partitions.max_x[cell]) & (y <= partitions.max_y[cell])
+        else:
+            keep = intersects
+        return np.stack([ids_A[a[keep]], ids_B[b[keep]]], axis=1).astype(np.int32)
+
+    if pair_kernel is None:
+        # every entry of A against the B range of its cell
+        cell_of_A = partitions.get_cells_A()
+        starts = partitions.offset_B[cell_of_A]
+        ends = partitions.offset_B[cell_of_A + 1]
+        for entry_A, entry_B in expand_ranges(starts, ends, max_candidates):
+            a, b = partitions.obj_A[entry_A], partitions.obj_B[entry_B]
+            intersects = (low0_A[a] <= high0_B[b]) & (high0_A[a] >= low0_B[b]) & \
+                (low1_A[a] <= high1_B[b]) & (high1_A[a] >= low1_B[b])
+            yield filter_pairs(cell_of_A[entry_A], a, b, intersects)
+        return
+
+    for cell in range(partitions.num_partitions):
+        a = partitions.obj_A[partitions.offset_A[cell]:partitions.offset_A[cell + 1]]
+        b = partitions.obj_B[partitions.offset_B[cell]:partitions.offset_B[cell + 1]]
+        idx_A, idx_B = pair_kernel(low0_A[a], high0_A[a], low1_A[a], high1_A[a],
+                                   low0_B[b], high0_B[b], low1_B[b], high1_B[b])
+        a, b = a[idx_A], b[idx_B]
+        yield filter_pairs(np.full(len(a), cell), a, b, np.ones(len(a), dtype=bool))
+
+def join_partitions(objects_A, objects_B, partitions, count_only=False, pair_kernel=None, dedup='reference_point'):
+    """
+    Output: an int32 array of shape (num_results, 2), each row is (obj id A, obj id B),
+        or the number of results if count_only; with the default dedup, every result
+        appears once
+    """
+    num_results = 0
+    results = []
+    for chunk in iter_join_chunks(objects_A, objects_B, partitions, pair_kernel, dedup):
+        num_results += len(chunk)
+        if not count_only:
+            results.append(chunk)
+
+    if count_only:
+        return num_results
+    return np.concatenate(results) if len(results) > 0 else np.zeros((0, 2), dtype=np.int32)
+
+
+if __name__ == '__main__':
+
+    from Index.Plane_sweep import sweep_pairs
+    from Index.Self_check import DISTRIBUTIONS, generate_objects, nested_loop_results, sorted_pairs
+
+    test_num = 10
+    rng = np.random.default_rng(0)
+
+    for i in range(test_num):
+        for distribution in DISTRIBUTIONS:
+            objects_A = generate_objects(rng, 2000, distribution)
+            objects_B = generate_objects(rng, 1500, distribution)
+            results_nested = nested_loop_results(objects_A, objects_B)
+            print("{} nested loop result length: {}".format(distribution, len(results_nested)))
+
+            partitions, map_stats = host_partition(objects_A, objects_B, rng=rng)
+            layout = plan_partitions(objects_A, objects_B, sample_fraction=0.2, map_stats=map_stats, rng=rng)
+            planned_partitions = apply_layout(objects_A, objects_B, layout)
+
+            for parts in (partitions, planned_partitions):
+                # reference_point: every result exactly once, with both pair kernels
+                for pair_kernel in (None, sweep_pairs):
+                    results = join_partitions(objects_A, objects_B, parts, pair_kernel=pair_kernel)
+                    assert np.array_equal(sorted_pairs(results), results_nested)
+                # join_unit and none: the same results, possibly reported more than once
+                for dedup in ('join_unit', 'none'):
+                    results = join_partitions(objects_A, objects_B, parts, dedup=dedup)
+                    assert len(results) >= len(results_nested)
+                    assert np.array_equal(np.unique(results, axis=0), results_nested)
+                assert join_partitions(objects_A, objects_B, parts, count_only=True) == len(results_nested)
+            print("{} PBSM partitions: {}, planned: {}".format(
+                distribution, partitions.num_partitions, planned_partitions.num_partitions))
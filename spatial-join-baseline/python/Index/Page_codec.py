@@ -0,0 +1,244 @@
+"""
+NumPy codec of the FPGA R-tree page format.
+
+One node per page of node_bytes (e.g., 4096), split in 64-byte AXI blocks:
+
+    first 64 bytes: node_meta_t (28 bytes) + padding
+
+        typedef struct {
+            // 7 * 4 bytes = 28 bytes
+            int is_leaf;  // bool
+            int count;    // valid items
+            obj_t obj;    // id/ptr + mbr
+        } node_meta_t;
+
+    the rest 64-byte blocks, each contain 3 obj_t (first 60 bytes) + 4 bytes padding:
+
+        typedef struct {
+            // obj id for data nodes; pointer to children for directory nodes
+            int id;
+            // minimum bounding rectangle
+            float low0;
+            float high0;
+            float low1;
+            float high1;
+        } obj_t;
+
+A page is described by a single structured dtype, so a whole range of nodes is
+    encoded into (or decoded from) one NumPy array without per-entry Python work.
+
+The PBSM data files (spatial-join-on-FPGA-PBSM/data/*/bin) use the same 64-byte
+    blocks without the tree: a 64-byte header whose first int is the number of
+    objects, then 3 obj_t per 64-byte block. DataFileWriter writes them chunk by chunk.
+"""
+import numpy as np
+
+AXI_BYTES = 64
+OBJS_PER_BLOCK = 3
+
+META_DTYPE = np.dtype([('is_leaf', '<i4'), ('count', '<i4'), ('id', '<i4'),
+                       ('low0', '<f4'), ('high0', '<f4'), ('low1', '<f4'), ('high1', '<f4')])
+OBJ_DTYPE = np.dtype([('id', '<i4'), ('low0', '<f4'), ('high0', '<f4'), ('low1', '<f4'), ('high1', '<f4')])
+BLOCK_DTYPE = np.dtype({'names': ['objs'], 'formats': [(OBJ_DTYPE, (OBJS_PER_BLOCK,))], 'itemsize': AXI_BYTES})
+
+
+def get_blocks_per_page(node_bytes : int):
+    """
+    Number of 64-byte object blocks after the meta block
+    """
+    return (node_bytes - AXI_BYTES) // AXI_BYTES
+
+def get_max_entries_per_page(node_bytes : int):
+    return get_blocks_per_page(node_bytes) * OBJS_PER_BLOCK
+
+def get_page_dtype(node_bytes : int):
+    """
+    Structured dtype of a whole page: ('meta', META_DTYPE) + ('blocks', BLOCK_DTYPE x blocks),
+        all the padding bytes are unnamed
+    """
+    if node_bytes < 2 * AXI_BYTES:
+        raise ValueError("A page needs at least one meta block and one object block")
+    return np.dtype({'names': ['meta', 'blocks'],
+                     'formats': [META_DTYPE, (BLOCK_DTYPE, (get_blocks_per_page(node_bytes),))],
+                     'offsets': [0, AXI_BYTES],
+                     'itemsize': node_bytes})
+
+def encode_pages(tree, node_bytes=4096, node_start=0, node_end=None):
+    """
+    Encode nodes [node_start, node_end) of an Index.Array_RTree.ArrayRTree
+
+    Output: a structured array of get_page_dtype(node_bytes), one element per node
+    """
+    if node_end is None:
+        node_end = tree.num_nodes
+    num_nodes = node_end - node_start
+
+    pages = np.zeros(num_nodes, dtype=get_page_dtype(node_bytes))
+    if num_nodes == 0:
+        return pages
+
+    count = tree.count[node_start: node_end]
+    if int(np.amax(count)) > get_max_entries_per_page(node_bytes):
+        raise ValueError("Node with {} entries does not fit in a page of {} bytes".format(
+            int(np.amax(count)), node_bytes))
+
+    meta = pages['meta']
+    meta['is_leaf'] = tree.is_leaf[node_start: node_end]
+    meta['count'] = count
+    meta['id'] = np.arange(node_start, node_end)
+    meta['low0'] = tree.node_low0[node_start: node_end]
+    meta['high0'] = tree.node_high0[node_start: node_end]
+    meta['low1'] = tree.node_low1[node_start: node_end]
+    meta['high1'] = tree.node_high1[node_start: node_end]
+
+    # entries of the node range are contiguous: scatter them to (page, block, slot in block)
+    entry_start = tree.entry_offset[node_start]
+    entry_end = tree.entry_offset[node_end - 1] + tree.count[node_end - 1]
+    local_node = np.repeat(np.arange(num_nodes), count)
+    slot = np.arange(entry_end - entry_start) - (tree.entry_offset[node_start: node_end] - entry_start)[local_node]
+    block = slot // OBJS_PER_BLOCK
+    slot_in_block = slot % OBJS_PER_BLOCK
+
+    objs = pages['blocks']['objs']
+    objs['id'][local_node, block, slot_in_block] = tree.ids[entry_start: entry_end]
+    for field in ('low0', 'high0', 'low1', 'high1'):
+        objs[field][local_node, block, slot_in_block] = getattr(tree, field)[entry_start: entry_end]
+
+    return pages
+
+def write_pages(tree, node_bytes=4096, out_dir=None, nodes_per_chunk=None):
+    """
+    Encode all the nodes of an array R-tree.
+
+    Input:
+        out_dir: no file write without specifying
+        nodes_per_chunk: if specified (and out_dir is specified), the pages are encoded
+            and appended to the file chunk by chunk, so the peak memory is bounded by
+            the chunk size rather than by the tree size
+    Output:
+        a uint8 array of num_nodes * node_bytes bytes, or None if the tree is streamed to disk
+    """
+    if nodes_per_chunk is None or out_dir is None:
+        pages = encode_pages(tree, node_bytes)
+        if out_dir is not None:
+            pages.tofile(out_dir)
+        return pages.view(np.uint8)
+
+    with open(out_dir, 'wb') as f:
+        for node_start in range(0, tree.num_nodes, nodes_per_chunk):
+            node_end = min(node_start + nodes_per_chunk, tree.num_nodes)
+            encode_pages(tree, node_bytes, node_start, node_end).tofile(f)
+
+def open_pages(in_dir, node_bytes=4096):
+    """
+    Memory-map a serialized tree, nothing is read from disk until a page is accessed
+
+    Output: a read-only np.memmap of get_page_dtype(node_bytes), one element per node
+    """
+    return np.memmap(in_dir, dtype=get_page_dtype(node_bytes), mode='r')
+
+def decode_entries(pages):
+    """
+    Bulk-decode the entries of a range of pages (e.g., open_pages(...)[start:end])
+
+    Output: count (per page), ids, low0, high0, low1, high1 (per entry, page after page)
+    """
+    count = np.array(pages['meta']['count'])
+    objs = np.array(pages['blocks']['objs']).reshape(len(pages), -1)
+    valid = np.arange(objs.shape[1])[None, :] < count[:, None]
+    objs = objs[valid]
+    return count, objs['id'], objs['low0'], objs['high0'], objs['low1'], objs['high1']
+
+def get_num_data_blocks(num_objects : int):
+    return (num_objects + OBJS_PER_BLOCK - 1) // OBJS_PER_BLOCK
+
+def open_data_blocks(in_dir):
+    """
+    Memory-map a PBSM data file
+
+    Output: (objs, num_objects)
+        objs: a read-only (num_blocks, 3) OBJ_DTYPE view of the mapped file, object i
+            is objs[i // 3, i % 3], the slots after num_objects in the last block are padding
+    """
+    num_objects = int(np.fromfile(in_dir, dtype='<i4', count=1)[0])
+    if num_objects == 0:
+        return np.zeros((0, OBJS_PER_BLOCK), dtype=OBJ_DTYPE), 0
+    blocks = np.memmap(in_dir, dtype=BLOCK_DTYPE, mode='r', offset=AXI_BYTES,
+                       shape=(get_num_data_blocks(num_objects),))
+    return blocks['objs'], num_objects
+
+def read_data_objects(in_dir):
+    """
+    Read a PBSM data file into a contiguous OBJ_DTYPE array of num_objects elements,
+        one vectorized copy out of the mapped blocks
+    """
+    objs, num_objects = open_data_blocks(in_dir)
+    return np.array(objs).reshape(-1)[:num_objects]
+
+def encode_data_blocks(ids, low0, high0, low1, high1):
+    """
+    Output: a BLOCK_DTYPE array holding the objects, 3 per block, padding is zero
+    """
+    num_objects = len(ids)
+    blocks = np.zeros(get_num_data_blocks(num_objects), dtype=BLOCK_DTYPE)
+    obj_idx = np.arange(num_objects)
+    block, slot_in_block = obj_idx // OBJS_PER_BLOCK, obj_idx % OBJS_PER_BLOCK
+    objs = blocks['objs']
+    for field, values in zip(OBJ_DTYPE.names, (ids, low0, high0, low1, high1)):
+        objs[field][block, slot_in_block] = values
+    return blocks
+
+def write_data_file(out_dir, ids, low0, high0, low1, high1):
+    """
+    Write objects (arrays of ids and coordinates) as a PBSM data file
+    """
+    header = np.zeros(AXI_BYTES // 4, dtype='<i4')
+    header[0] = len(ids)
+    with open(out_dir, 'wb') as f:
+        header.tofile(f)
+        encode_data_blocks(ids, low0, high0, low1, high1).tofile(f)
+
+class DataFileWriter:
+    """
+    Write a PBSM data file chunk by chunk: the full blocks of every chunk are written at
+        once, the last 1-2 objects wait for the next chunk, and the object count is
+        patched into the header on close
+
+        with DataFileWriter(out_dir) as writer:
+            for ids, low0, high0, low1, high1 in chunks:
+                writer.write(ids, low0, high0, low1, high1)
+    """
+
+    def __init__(self, out_dir):
+        self.file = open(out_dir, 'wb')
+        self.num_objects = 0
+        self.pending = [np.zeros(0, dtype=OBJ_DTYPE[field]) for field in OBJ_DTYPE.names]
+        np.zeros(AXI_BYTES // 4, dtype='<i4').tofile(self.file) # header, count patched on close
+
+    def write(self, ids, low0, high0, low1, high1):
+        columns = [np.concatenate([pending, np.asarray(values, dtype=pending.dtype)])
+                   for pending, values in zip(self.pending, (ids, low0, high0, low1, high1))]
+        num_full = len(columns[0]) // OBJS_PER_BLOCK * OBJS_PER_BLOCK
+        if num_full > 0:
+            encode_data_blocks(*[values[:num_full] for values in columns]).tofile(self.file)
+        self.pending = [values[num_full:] for values in columns]
+        self.num_objects += len(ids)
+
+    def close(self):
+        """
+        Output: the number of objects written
+        """
+        if self.file.closed:
+            return self.num_objects
+        if len(self.pending[0]) > 0:
+            encode_data_blocks(*self.pending).tofile(self.file)
+        self.file.seek(0)
+        np.array([self.num_objects], dtype='<i4').tofile(self.file)
+        self.file.close()
+        return self.num_objects
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,154 @@
+"""
+Multi-process synchronous traversal on array R-trees (ArrayRTree or MappedRTree),
+    Python counterpart of bfs_parallel / bfs_dfs_parallel in cpp/RTree.h.
+
+Parallel approaches (same names as cpp/multithread.cpp):
+    bfs_static:         every level of node pairs is joined in parallel, the level is
+                            split into one contiguous block per process
+    bfs_dynamic:        same as bfs_static, but the level is handed out in small batches
+                            from the pool's task queue
+    bfs_dfs_static:     BFS until there are at least 10 x num_processes node pairs, then
+                            each process runs DFS on one contiguous block of them
+    bfs_dfs_dynamic:    same as bfs_dfs_static, but the DFS tasks are handed out in
+                            small batches from the pool's task queue
+
+The trees are inherited by the worker processes (fork), only node ids and results are
+    sent between processes.
+"""
+import multiprocessing
+
+import numpy as np
+
+from Index.Array_RTree import join_node_pair, iter_result_chunks, count_results
+
+PARALLEL_APPROACHES = ['bfs_static', 'bfs_dfs_static', 'bfs_dynamic', 'bfs_dfs_dynamic']
+
+# per worker process, set by init_worker
+worker_tree_A = None
+worker_tree_B = None
+worker_count_only = False
+
+
+def init_worker(tree_A, tree_B, count_only):
+    global worker_tree_A, worker_tree_B, worker_count_only
+    worker_tree_A = tree_A
+    worker_tree_B = tree_B
+    worker_count_only = count_only
+
+def empty_results():
+    return np.zeros((0, 2), dtype=np.int32)
+
+def bfs_task(pairs):
+    """
+    Join a batch of node pairs of the same level
+
+    Input: an (n, 2) array of (node id A, node id B)
+    Output: (results, num_results, next_pairs)
+        results: (k, 2) int32 array of object id pairs (empty if count only)
+        next_pairs: (m, 2) array of the node pairs of the next level
+    """
+    results = []
+    num_results = 0
+    next_A = []
+    next_B = []
+    for node_A, node_B in pairs.tolist():
+        is_leaf_pair, ids_A, ids_B = join_node_pair(worker_tree_A, node_A, worker_tree_B, node_B)
+        if is_leaf_pair:
+            num_results += len(ids_A)
+            if not worker_count_only and len(ids_A) > 0:
+                results.append(np.stack([ids_A, ids_B], axis=1))
+        else:
+            next_A.append(ids_A)
+            next_B.append(ids_B)
+
+    results = np.concatenate(results) if len(results) > 0 else empty_results()
+    next_pairs = np.stack([np.concatenate(next_A), np.concatenate(next_B)], axis=1) \
+        if len(next_A) > 0 else np.zeros((0, 2), dtype=np.int32)
+    return results, num_results, next_pairs
+
+def dfs_task(pairs):
+    """
+    Run the (iterative) synchronous traversal from each node pair in the batch
+
+    Output: (results, num_results), same as bfs_task
+    """
+    results = []
+    num_results = 0
+    for node_A, node_B in pairs.tolist():
+        if worker_count_only:
+            num_results += count_results(worker_tree_A, worker_tree_B, root_pair=(node_A, node_B))
+        else:
+            for chunk in iter_result_chunks(worker_tree_A, worker_tree_B, root_pair=(node_A, node_B)):
+                results.append(chunk)
+                num_results += len(chunk)
+
+    results = np.concatenate(results) if len(results) > 0 else empty_results()
+    return results, num_results
+
+def split_tasks(pairs, num_processes, dynamic, batch_size):
+    """
+    static: one contiguous block per process; dynamic: batches of batch_size pairs
+    """
+    if dynamic:
+        return [pairs[i: i + batch_size] for i in range(0, len(pairs), batch_size)]
+    else:
+        return [block for block in np.array_split(pairs, num_processes) if len(block) > 0]
+
+def parallel_sync_traversal(tree_A, tree_B, parallel_approach='bfs_dynamic', num_processes=None,
+                            count_only=False, batch_size=16, bfs_dfs_threshold=None, verbose=False):
+    """
+    Input:
+        parallel_approach: one of PARALLEL_APPROACHES
+        num_processes: number of worker processes, os.cpu_count() by default
+        count_only: only return the number of results
+        batch_size: node pairs per task for the dynamic approaches
+        bfs_dfs_threshold: number of node pairs to stop BFS at for the bfs_dfs approaches,
+            10 x num_processes by default (same as the C++)
+        verbose: print the progress lines of the C++ (end of BFS, number of DFS tasks)
+    Output:
+        an int32 array of shape (num_results, 2), in no particular order, or the number
+            of results if count_only
+    """
+    assert parallel_approach in PARALLEL_APPROACHES
+    if num_processes is None:
+        num_processes = multiprocessing.cpu_count()
+    if bfs_dfs_threshold is None:
+        bfs_dfs_threshold = 10 * num_processes
+    dynamic = parallel_approach.endswith('dynamic')
+    bfs_dfs = parallel_approach.startswith('bfs_dfs')
+
+    results = []
+    num_results = 0
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+
+    with context.Pool(num_processes, initializer=init_worker, initargs=(tree_A, tree_B, count_only)) as pool:
+
+        # BFS part: one level per iteration
+        level = np.zeros((1, 2), dtype=np.int32) # root pair
+        while len(level) > 0 and not (bfs_dfs and len(level) >= bfs_dfs_threshold):
+            next_levels = []
+            for level_results, level_num_results, next_pairs in \
+                    pool.imap_unordered(bfs_task, split_tasks(level, num_processes, dynamic, batch_size)):
+                results.append(level_results)
+                num_results += level_num_results
+                next_levels.append(next_pairs)
+            level = np.concatenate(next_levels)
+        if verbose:
+            print("finish bfs part")
+
+        # DFS part: the remaining node pairs are independent tasks
+        if len(level) > 0:
+            if verbose:
+                print("continue with dfs part, num tasks:{}".format(len(level)))
+            for task_results, task_num_results in \
+                    pool.imap_unordered(dfs_task, split_tasks(level, num_processes, dynamic, batch_size)):
+                results.append(task_results)
+                num_results += task_num_results
+
+    if count_only:
+        return num_results
+    return np.concatenate(results) if len(results) > 0 else empty_results()
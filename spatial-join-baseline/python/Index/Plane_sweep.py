@@ -0,0 +1,158 @@
+"""
+Sort-based forward-scan plane-sweep join, Python counterpart of sweep_line_join in
+    cpp/1d_stripes.hpp (compared against the nested loop by tile_join_microbench.cpp).
+
+Both inputs are sorted on low0. The sweep then visits the objects of A and B in low0
+    order, and each object is only compared with the objects of the other set that start
+    inside its x-interval:
+        A pass:     a is compared with the b such that low0_A <= low0_B <= high0_A
+        B pass:     b is compared with the a such that low0_B < low0_A <= high0_B
+    every pair whose x-intervals overlap is found exactly once (by the object that starts
+    first, by A on ties), then the candidates are tested on all 4 coordinates.
+
+The scan is vectorized: the candidate range of every object is found with searchsorted
+    on the sorted low0 of the other set, and the ranges are expanded in chunks of at most
+    max_candidates pairs, so the same code runs on a pair of nodes or on whole datasets.
+
+sweep_pairs has the same interface as Index.Join_kernels.intersect_pairs, and can replace
+    it as the leaf kernel of Index.Array_RTree.sync_traversal or as the per-partition
+    kernel of a partitioned join (see PAIR_KERNELS).
+"""
+import numpy as np
+
+from Index.Join_kernels import intersect_pairs
+
+MAX_CANDIDATES = 1 << 22 # candidate pairs expanded at once, bounds the memory of the scan
+
+
+def expand_ranges(starts, ends, max_candidates=MAX_CANDIDATES):
+    """
+    Expand the ranges [starts[i], ends[i]) into (i, j) index pairs
+
+    Output: a generator of (idx, other_idx) int64 arrays, at most max_candidates pairs
+        per chunk, except when a single range is longer
+    """
+    counts = ends - starts
+    # split the objects where the cumulative number of candidates crosses a chunk boundary
+    cum = np.cumsum(counts)
+    bounds = np.searchsorted(cum, np.arange(max_candidates, cum[-1] if len(cum) > 0 else 0, max_candidates),
+                             side='left') + 1
+    bounds = np.unique(np.concatenate([[0], bounds, [len(counts)]]))
+    for first, last in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        chunk_counts = counts[first:last]
+        total = int(np.sum(chunk_counts))
+        if total == 0:
+            continue
+        idx = np.repeat(np.arange(first, last), chunk_counts)
+        # position inside each range: global position - start of the range in the chunk
+        range_start = np.cumsum(chunk_counts) - chunk_counts
+        other_idx = np.arange(total) - np.repeat(range_start, chunk_counts) + np.repeat(starts[first:last], chunk_counts)
+        yield idx, other_idx
+
+def iter_sweep_chunks(low0_A, high0_A, low1_A, high1_A, low0_B, high0_B, low1_B, high1_B,
+                      strict=False, max_candidates=MAX_CANDIDATES):
+    """
+    Plane-sweep join of two MBR sets
+
+    Input: the coordinate arrays of the two MBR sets, in any order
+        strict: touching MBRs do not intersect (designs/nested, scripts/join/nested_join.py --strict),
+            by default they do, same as Index.Region.MBR.intersects and the FPGA join units
+    Output: a generator of (idx_A, idx_B) index arrays of the intersected pairs, in sweep order
+    """
+    order_A = np.argsort(low0_A, kind='stable')
+    order_B = np.argsort(low0_B, kind='stable')
+    sorted_low0_A = low0_A[order_A]
+    sorted_low0_B = low0_B[order_B]
+
+    # A pass: B starting in [low0_A, high0_A]; B pass: A starting in (low0_B, high0_B]
+    passes = [
+        (order_A, order_B, np.searchsorted(sorted_low0_B, sorted_low0_A, side='left'),
+            np.searchsorted(sorted_low0_B, high0_A[order_A], side='right'), False),
+        (order_B, order_A, np.searchsorted(sorted_low0_A, sorted_low0_B, side='right'),
+            np.searchsorted(sorted_low0_A, high0_B[order_B], side='right'), True),
+    ]
+    for order, other_order, starts, ends, swapped in passes:
+        ends = np.maximum(starts, ends)
+        for idx, other_idx in expand_ranges(starts, ends, max_candidates):
+            idx_A, idx_B = order[idx], other_order[other_idx]
+            if swapped:
+                idx_A, idx_B = idx_B, idx_A
+            if strict:
+                mask = (low0_A[idx_A] < high0_B[idx_B]) & (high0_A[idx_A] > low0_B[idx_B]) & \
+                    (low1_A[idx_A] < high1_B[idx_B]) & (high1_A[idx_A] > low1_B[idx_B])
+            else:
+                # the x-intervals overlap by construction
+                mask = (low1_A[idx_A] <= high1_B[idx_B]) & (high1_A[idx_A] >= low1_B[idx_B])
+            yield idx_A[mask], idx_B[mask]
+
+def sweep_pairs(low0_A, high0_A, low1_A, high1_A, low0_B, high0_B, low1_B, high1_B, strict=False):
+    """
+    Drop-in replacement of Index.Join_kernels.intersect_pairs
+
+    Output: (idx_A, idx_B), the index arrays of the intersected pairs,
+        in row-major order (same order as a nested loop over A then B)
+    """
+    chunks = list(iter_sweep_chunks(low0_A, high0_A, low1_A, high1_A, low0_B, high0_B, low1_B, high1_B, strict))
+    if len(chunks) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    idx_A = np.concatenate([chunk[0] for chunk in chunks])
+    idx_B = np.concatenate([chunk[1] for chunk in chunks])
+    order = np.lexsort((idx_B, idx_A))
+    return idx_A[order], idx_B[order]
+
+def sweep_join(objects_A, objects_B, count_only=False, strict=False, max_candidates=MAX_CANDIDATES):
+    """
+    Plane-sweep join of two datasets, e.g. the output of Index.Bulk_loading.read_dataset
+
+    Input: objects_A, objects_B: (ids, low0, high0, low1, high1) arrays
+    Output: an int32 array of shape (num_results, 2), each row is (obj id A, obj id B),
+        in no particular order, or the number of results if count_only
+    """
+    ids_A, low0_A, high0_A, low1_A, high1_A = objects_A
+    ids_B, low0_B, high0_B, low1_B, high1_B = objects_B
+    num_results = 0
+    results = []
+    for idx_A, idx_B in iter_sweep_chunks(low0_A, high0_A, low1_A, high1_A, low0_B, high0_B, low1_B, high1_B,
+                                          strict, max_candidates):
+        num_results += len(idx_A)
+        if not count_only:
+            results.append(np.stack([ids_A[idx_A], ids_B[idx_B]], axis=1).astype(np.int32))
+
+    if count_only:
+        return num_results
+    return np.concatenate(results) if len(results) > 0 else np.zeros((0, 2), dtype=np.int32)
+
+
+# pair kernels with the interface of intersect_pairs, selectable by name
+PAIR_KERNELS = {
+    'nested_loop': intersect_pairs,
+    'plane_sweep': sweep_pairs,
+}
+
+
+if __name__ == '__main__':
+
+    from Index.Self_check import generate_objects, nested_loop_join, nested_loop_results, sorted_pairs
+
+    test_num = 10
+    rng = np.random.default_rng(0)
+
+    for i in range(test_num):
+        for distribution in ('uniform', 'ties'):
+            objects_A = generate_objects(rng, 2000, distribution)
+            objects_B = generate_objects(rng, 1500, distribution)
+            for strict in (False, True):
+                results_nested = nested_loop_results(objects_A, objects_B, strict)
+                print("{} strict={} nested loop result length: {}".format(distribution, strict, len(results_nested)))
+
+                # same pairs in the same order as the nested loop
+                sweep_A, sweep_B = sweep_pairs(*objects_A[1:], *objects_B[1:], strict=strict)
+                idx_A, idx_B = nested_loop_join(objects_A, objects_B, strict)
+                assert np.array_equal(sweep_A, idx_A) and np.array_equal(sweep_B, idx_B)
+
+                # every result exactly once, also when the candidates are split into small chunks
+                for max_candidates in (MAX_CANDIDATES, 1000):
+                    results = sweep_join(objects_A, objects_B, strict=strict, max_candidates=max_candidates)
+                    assert np.array_equal(sorted_pairs(results), results_nested)
+                    assert sweep_join(objects_A, objects_B, count_only=True, strict=strict,
+                                      max_candidates=max_candidates) == len(results_nested)
@@ -1,3 +1,7 @@
+import numpy as np
+
+from Index import Array_RTree
+from Index.Join_kernels import join_nodes
 
 class Node:
     """
@@ -11,6 +15,7 @@ class Node:
     child_ptrs = None # for directory nodes, each element in the list is a node
     obj_ids = None # for data nodes
     mbrs = None
+    mbr_arrays = None # cached (low0, high0, low1, high1) arrays of mbrs, see get_mbr_arrays
 
     def __init__(self, node_id : int, is_leaf : bool, mbr):
         self.node_id = node_id 
@@ -42,6 +47,7 @@ class Node:
             self.obj_ids.append(data)
         self.mbrs.append(mbr)
         self.count += 1
+        self.mbr_arrays = None
 
     def add_entries(self, mbrs : list, data: list):
         assert len(mbrs) == len(data)
@@ -54,6 +60,18 @@ class Node:
         for mbr in mbrs:
             self.mbrs.append(mbr)
         self.count += len(data)
+        self.mbr_arrays = None
+
+    def get_mbr_arrays(self):
+        """
+        Return the entry MBRs as (low0, high0, low1, high1) arrays,
+            built once and reused by the join kernels in Index.Join_kernels
+        """
+        if self.mbr_arrays is None:
+            coords = np.array([(mbr.get_low0(), mbr.get_high0(), mbr.get_low1(), mbr.get_high1())
+                               for mbr in self.mbrs], dtype=np.float64).reshape(-1, 4)
+            self.mbr_arrays = (coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+        return self.mbr_arrays
 
     def deep_copy(self):
         new_node = Node(node_id=self.node_id, is_leaf=self.is_leaf, mbr=self.mbr)
@@ -69,7 +87,13 @@ class Node:
 def sync_traversal(root_A, root_B):
     """
     Synchronous traversal on R-Tree
+
+    For array R-trees (Index.Array_RTree.ArrayRTree / MappedRTree), the results are returned as an
+        int32 array of shape (num_results, 2) instead of a list of tuples
     """
+    if isinstance(root_A, Array_RTree.ARRAY_TREE_TYPES):
+        return Array_RTree.sync_traversal(root_A, root_B)
+
     results = []
     join_nodes_recursive(root_A, root_B, results)
 
@@ -93,19 +117,16 @@ def join_nodes_recursive(node_A, node_B, results: list):
             join_nodes_recursive(node_A, node_B.child_ptrs[i], results)
     elif not node_A.is_leaf and node_B.is_leaf:
         for i in range(node_A.get_count()):
-            join_nodes_recursive(node_B, node_A.child_ptrs[i], results)
+            join_nodes_recursive(node_A.child_ptrs[i], node_B, results)
     elif node_A.is_leaf and node_B.is_leaf: # both are leaf
-        for i in range(node_A.get_count()):
-            for j in range(node_B.get_count()):
-                if node_A.mbrs[i].intersects(node_B.mbrs[j]):
-                    # here, we assume tree A and B has different object id spaces,
-                    #   so the IDs need not to be different
-                    results.append((node_A.obj_ids[i], node_B.obj_ids[j]))
+        idx_A, idx_B = join_nodes(node_A, node_B)
+        # here, we assume tree A and B has different object id spaces,
+        #   so the IDs need not to be different
+        results += [(node_A.obj_ids[i], node_B.obj_ids[j]) for i, j in zip(idx_A.tolist(), idx_B.tolist())]
     else: # neither is leaf
-        for i in range(node_A.get_count()):
-            for j in range(node_B.get_count()):
-                if node_A.mbrs[i].intersects(node_B.mbrs[j]):
-                    join_nodes_recursive(node_A.child_ptrs[i], node_B.child_ptrs[j], results)
+        idx_A, idx_B = join_nodes(node_A, node_B)
+        for i, j in zip(idx_A.tolist(), idx_B.tolist()):
+            join_nodes_recursive(node_A.child_ptrs[i], node_B.child_ptrs[j], results)
 
 def join_data_nodes(node_A, node_B):
     """
@@ -115,10 +136,7 @@ def join_data_nodes(node_A, node_B):
     """
     assert node_A.is_leaf and node_B.is_leaf 
 
-    results = []
-    for i in range(node_A.get_count()):
-        for j in range(node_B.get_count()):
-            if node_A.mbrs[i].intersects(node_B.mbrs[j]):
-                if node_A.obj_ids[i] != node_B.obj_ids[j]:
-                    results.append((node_A.obj_ids[i], node_B.obj_ids[j]))
+    idx_A, idx_B = join_nodes(node_A, node_B)
+    results = [(node_A.obj_ids[i], node_B.obj_ids[j]) for i, j in zip(idx_A.tolist(), idx_B.tolist())
+               if node_A.obj_ids[i] != node_B.obj_ids[j]]
     return results
@@ -0,0 +1,55 @@
+"""
+Result pairs of the joins as written by the FPGA kernels and the Python engines.
+
+Two layouts of 8-byte pairs:
+    pair_t:         {int id_A; int id_B;} rows, written by Array_RTree.write_results and
+                        the --output of the join scripts
+    kernel output:  the ap_uint<64> buffer of write_unit (designs/pbsm), element 0 is the
+                        number of results, then one result_t per element packed by pack_pair
+                        (bits 31..0: id_A, bits 63..32: id_B), i.e., pair_t rows after a header
+
+A result set is compared through a fingerprint instead of a set of pairs: the number of
+    pairs and the sum (mod 2^64) of a 64-bit hash of each pair. The sum does not depend on
+    the order of the pairs, can be accumulated chunk by chunk, and a missing, wrong or
+    duplicated pair changes it, so two result streams of any size are compared in constant
+    memory.
+"""
+import numpy as np
+
+PAIR_CHUNK = 1 << 20 # pairs read at once
+
+
+def iter_pair_file(path, kernel_output=False, chunk_pairs=PAIR_CHUNK):
+    """
+    Input: kernel_output: the file is a dump of the kernel output buffer, only the first
+        results of its header are read
+    Output: a generator of (n, 2) int32 arrays of (obj id A, obj id B)
+    """
+    pairs = np.memmap(path, dtype='<i4', mode='r').reshape(-1, 2)
+    if kernel_output:
+        num_results = int(pairs[:1].view('<i8')[0, 0]) if len(pairs) > 0 else 0
+        pairs = pairs[1:1 + num_results]
+    for start in range(0, len(pairs), chunk_pairs):
+        yield np.array(pairs[start:start + chunk_pairs])
+
+def hash_pairs(pairs):
+    """
+    Output: a uint64 hash of each (obj id A, obj id B) row (splitmix64 of the packed pair)
+    """
+    pairs = np.ascontiguousarray(pairs, dtype='<i4')
+    h = pairs.view('<u8').reshape(-1) + np.uint64(0x9E3779B97F4A7C15)
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+def fingerprint(chunks):
+    """
+    Input: an iterable of (n, 2) int32 arrays of (obj id A, obj id B)
+    Output: (number of pairs, sum of the pair hashes mod 2^64)
+    """
+    num_pairs = 0
+    checksum = np.zeros(1, dtype=np.uint64)
+    for chunk in chunks:
+        num_pairs += len(chunk)
+        checksum += np.sum(hash_pairs(chunk), dtype=np.uint64)
+    return num_pairs, int(checksum[0])
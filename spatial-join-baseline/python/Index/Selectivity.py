@@ -0,0 +1,283 @@
+"""
+Join cardinality estimation: the number of results of a spatial join (inclusive
+    intersection test, same as the FPGA join units), predicted without running the join.
+
+Two estimators, both built on a uniform grid over the union of the map bounds:
+    histogram:  per-dataset 2D MBR histograms (MBRHistogram), an object is counted in the
+                    cell of its center, together with the sums of the widths, heights and
+                    areas of the objects of the cell. Two MBRs whose centers are uniform in
+                    a cell intersect with probability (w_A + w_B) (h_A + h_B) / cell area,
+                    so a cell contributes
+                        (area_A n_B + w_A h_B + h_A w_B + n_A area_B) / cell area
+                    (sums over the objects of the cell). No join, but no error bound either.
+    sampled:    a sample of A, stratified by the histogram cells of A (proportional
+                    allocation, at least one object per non-empty cell), is joined with all
+                    of B by plane sweep. The number of results of each sampled object gives
+                    the stratified estimate of the join size and its standard error, the
+                    result count is in [estimate - z se, estimate + z se] with the normal
+                    confidence of z (3: ~99.7%).
+                The results per object are heavy-tailed when a few MBRs of A are much larger
+                    than the others: a handful of them can hold a large share of the results
+                    and be missed by the sample, with a small standard error. The largest
+                    objects of A (area once enlarged by the mean width and height of B) are
+                    therefore a stratum of their own, joined exhaustively, which takes
+                    LARGEST_FRACTION of the sample.
+                The standard error misses the rare objects as well, e.g. when nearly every
+                    object has the same number of results and the sample sees no variance:
+                    the upper bound adds z^2 unsampled / sampled results, the upper bound
+                    of the Wilson interval on the share of objects with an extra result that
+                    no sampled object showed (0 when A is sampled entirely).
+
+The sampled estimate costs a sort of B and the join of the sample, on datasets of 100K
+    objects about as much as the exact plane-sweep count. The FPGA kernels do not check the
+    bounds of their result buffer, so the max_num_results of a run is count_join_results,
+    counted before the run; the upper bound (result_buffer_size) only serves the planner.
+"""
+import numpy as np
+
+from Index import Page_codec
+from Index.Bulk_loading import read_dataset
+from Index.PBSM import get_map_bounds
+from Index.Plane_sweep import iter_sweep_chunks, sweep_join
+
+DEFAULT_SAMPLE_SIZE = 10000 # sampled objects of A
+DEFAULT_GRID_SIZE = 32 # histogram cells per dimension
+DEFAULT_Z = 3.0 # width of the confidence interval, in standard errors
+LARGEST_FRACTION = 0.1 # share of the sample taken by the largest objects of A, joined exhaustively
+
+
+class MBRHistogram:
+    """
+    2D histogram of the MBRs of a dataset, grid_size x grid_size cells (row-major, index = y * n + x)
+        over the given map bounds, per cell:
+
+        count                           number of objects whose center is in the cell
+        sum_width, sum_height, sum_area sums over these objects
+    """
+
+    def __init__(self, objects, map_bounds, grid_size=DEFAULT_GRID_SIZE):
+        _, low0, high0, low1, high1 = objects
+        self.map_bounds = map_bounds
+        self.grid_size = grid_size
+        self.cell = get_center_cells(objects, map_bounds, grid_size)
+        width = (high0 - low0).astype(np.float64)
+        height = (high1 - low1).astype(np.float64)
+        num_cells = grid_size * grid_size
+        self.count = np.bincount(self.cell, minlength=num_cells)
+        self.sum_width = np.bincount(self.cell, weights=width, minlength=num_cells)
+        self.sum_height = np.bincount(self.cell, weights=height, minlength=num_cells)
+        self.sum_area = np.bincount(self.cell, weights=width * height, minlength=num_cells)
+
+    @property
+    def cell_area(self):
+        min_x, max_x, min_y, max_y = self.map_bounds
+        return (float(max_x) - float(min_x)) * (float(max_y) - float(min_y)) / (self.grid_size * self.grid_size)
+
+
+def get_center_cells(objects, map_bounds, grid_size):
+    """
+    Output: the grid cell of the center of every object
+    """
+    _, low0, high0, low1, high1 = objects
+    min_x, max_x, min_y, max_y = [float(b) for b in map_bounds]
+    center_x = (low0.astype(np.float64) + high0) / 2
+    center_y = (low1.astype(np.float64) + high1) / 2
+    x = ((center_x - min_x) / max(max_x - min_x, np.finfo(np.float64).tiny) * grid_size).astype(np.int64)
+    y = ((center_y - min_y) / max(max_y - min_y, np.finfo(np.float64).tiny) * grid_size).astype(np.int64)
+    return np.clip(y, 0, grid_size - 1) * grid_size + np.clip(x, 0, grid_size - 1)
+
+def read_tree_objects(tree_file, node_bytes):
+    """
+    Read the data objects of a serialized R-tree (the entries of its leaf pages)
+
+    Output: ids, low0, high0, low1, high1
+    """
+    pages = Page_codec.open_pages(tree_file, node_bytes)
+    _, ids, low0, high0, low1, high1 = Page_codec.decode_entries(pages[np.array(pages['meta']['is_leaf']) != 0])
+    return ids, low0, high0, low1, high1
+
+
+def estimate_histogram(hist_A, hist_B):
+    """
+    Join size predicted from two histograms over the same grid
+    """
+    assert hist_A.grid_size == hist_B.grid_size and hist_A.map_bounds == hist_B.map_bounds
+    cell_area = hist_A.cell_area
+    if cell_area <= 0:
+        # degenerate map: all the objects are on a line or a point, every pair intersects
+        return float(np.sum(hist_A.count)) * float(np.sum(hist_B.count))
+    pairs = hist_A.sum_area * hist_B.count + hist_A.sum_width * hist_B.sum_height + \
+        hist_A.sum_height * hist_B.sum_width + hist_A.count * hist_B.sum_area
+    return float(np.sum(pairs) / cell_area)
+
+def stratified_sample(strata, sample_size, rng, exhaustive=None):
+    """
+    Proportional allocation over the strata, at least one object per non-empty stratum,
+        objects drawn without replacement
+
+    Input:
+        exhaustive: bool array, one per stratum, the strata sampled entirely, their objects
+            are taken out of the sample size before the allocation of the others
+    Output: (sample, stratum_size, stratum_sample_size), sample holds indices sorted by stratum
+    """
+    num_objects = len(strata)
+    if exhaustive is None:
+        exhaustive = np.zeros(np.amax(strata) + 1 if num_objects > 0 else 0, dtype=bool)
+    stratum_size = np.bincount(strata, minlength=len(exhaustive))
+    num_exhaustive = int(np.sum(stratum_size[exhaustive]))
+    remaining_sample_size = max(sample_size - num_exhaustive, 0)
+    # largest remainder rounding of the proportional allocation, so the whole sample is used
+    quota = np.where(exhaustive, 0, stratum_size) * remaining_sample_size / max(num_objects - num_exhaustive, 1)
+    allocation = np.floor(quota).astype(np.int64)
+    leftover = remaining_sample_size - int(np.sum(allocation))
+    allocation[np.argsort(allocation - quota, kind='stable')[:leftover]] += 1
+    stratum_sample_size = np.minimum(stratum_size, np.maximum(stratum_size > 0, allocation))
+    stratum_sample_size[exhaustive] = stratum_size[exhaustive]
+    # random order inside each stratum, then the first stratum_sample_size objects of each
+    order = np.lexsort((rng.random(num_objects), strata))
+    sorted_strata = strata[order]
+    rank = np.arange(num_objects) - (np.cumsum(stratum_size) - stratum_size)[sorted_strata]
+    sample = order[rank < stratum_sample_size[sorted_strata]]
+    return sample, stratum_size, stratum_sample_size
+
+def estimate_join_size(objects_A, objects_B, sample_size=DEFAULT_SAMPLE_SIZE, grid_size=DEFAULT_GRID_SIZE,
+                       z=DEFAULT_Z, rng=None):
+    """
+    Sampled estimate of the join size (see the module doc)
+
+    Input: objects_A, objects_B: (ids, low0, high0, low1, high1) arrays
+    Output: a dict: estimate, std_error, lower, upper (estimate -/+ z std_error, lower >= 0,
+        upper plus the rare results unseen by the sample),
+        histogram (estimate_histogram), sample_size; if sample_size covers A, the join is
+        exact and std_error is 0
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    _, low0_A, high0_A, low1_A, high1_A = objects_A
+    _, low0_B, high0_B, low1_B, high1_B = objects_B
+    if len(low0_A) == 0 or len(low0_B) == 0:
+        return {'estimate': 0.0, 'std_error': 0.0, 'lower': 0.0, 'upper': 0.0, 'histogram': 0.0, 'sample_size': 0}
+
+    map_bounds = get_map_bounds(objects_A, objects_B)
+    hist_A = MBRHistogram(objects_A, map_bounds, grid_size)
+    hist_B = MBRHistogram(objects_B, map_bounds, grid_size)
+
+    num_cells = grid_size * grid_size
+    exhaustive = np.zeros(num_cells + 1, dtype=bool)
+    if sample_size < len(low0_A):
+        # the histogram cells of A, and the largest objects of A in stratum num_cells
+        strata = hist_A.cell.copy()
+        num_largest = int(sample_size * LARGEST_FRACTION)
+        if num_largest > 0:
+            mean_width_B = float(np.mean(high0_B - low0_B.astype(np.float64)))
+            mean_height_B = float(np.mean(high1_B - low1_B.astype(np.float64)))
+            reach = (high0_A - low0_A.astype(np.float64) + mean_width_B) * \
+                (high1_A - low1_A.astype(np.float64) + mean_height_B)
+            strata[np.argpartition(-reach, num_largest - 1)[:num_largest]] = num_cells
+            exhaustive[num_cells] = True
+    else:
+        strata = np.zeros(len(low0_A), dtype=np.int64)
+    sample, stratum_size, stratum_sample_size = stratified_sample(strata, sample_size, rng, exhaustive)
+
+    # number of results of every sampled object of A
+    results = np.zeros(len(sample), dtype=np.int64)
+    for idx_A, _ in iter_sweep_chunks(low0_A[sample], high0_A[sample], low1_A[sample], high1_A[sample],
+                                      low0_B, high0_B, low1_B, high1_B):
+        results += np.bincount(idx_A, minlength=len(sample))
+
+    # stratified mean and variance, the sample is grouped by stratum
+    sample_strata = strata[sample]
+    sum_h = np.bincount(sample_strata, weights=results, minlength=len(stratum_size))
+    sum_sq_h = np.bincount(sample_strata, weights=results.astype(np.float64) ** 2, minlength=len(stratum_size))
+    sampled = stratum_sample_size > 0
+    N_h = stratum_size[sampled].astype(np.float64)
+    n_h = stratum_sample_size[sampled].astype(np.float64)
+    mean_h = sum_h[sampled] / n_h
+    # weights N_h / n_h, exactly 1 for an exhaustive stratum
+    estimate = float(np.sum(sum_h[sampled] * (N_h / n_h)))
+
+    # within-stratum variances; the strata with a single sampled object get a variance pooled
+    #     over the cells: the strata with more objects, and the pairs of consecutive cells with
+    #     a single object (collapsed strata, (y_1 - y_2)^2 / 2 per pair, conservative as the
+    #     difference of the cells adds to it); the exhaustive strata are left out of the pool
+    multi = n_h > 1
+    var_h = np.zeros(len(n_h))
+    var_h[multi] = (sum_sq_h[sampled][multi] - n_h[multi] * mean_h[multi] ** 2) / (n_h[multi] - 1)
+    var_h = np.maximum(var_h, 0)
+    pool = multi & ~exhaustive[sampled]
+    single = mean_h[~multi & ~exhaustive[sampled]]
+    num_pairs = len(single) // 2
+    pairs = (single[0:2 * num_pairs:2] - single[1:2 * num_pairs:2]) ** 2 / 2
+    degrees = np.sum(n_h[pool] - 1) + num_pairs
+    if degrees > 0:
+        pooled = (np.sum(var_h[pool] * (n_h[pool] - 1)) + np.sum(pairs)) / degrees
+    else:
+        pooled = float(np.var(results, ddof=1)) if len(results) > 1 else 0.0
+    var_h[~multi] = pooled
+    # finite population correction: an exhaustively sampled stratum has no error
+    variance = np.sum(N_h ** 2 * (1 - n_h / N_h) * var_h / n_h)
+    std_error = float(np.sqrt(variance))
+    # rare objects with an extra result, unseen by the sample (see the module doc)
+    partial = ~exhaustive[sampled]
+    unseen = z ** 2 * np.sum(N_h[partial] - n_h[partial]) / max(np.sum(n_h[partial]), 1)
+
+    return {
+        'estimate': estimate,
+        'std_error': std_error,
+        'lower': max(0.0, estimate - z * std_error),
+        'upper': estimate + z * std_error + float(unseen),
+        'histogram': estimate_histogram(hist_A, hist_B),
+        'sample_size': len(sample),
+    }
+
+def result_buffer_size(estimate):
+    """
+    Planned max_num_results: the upper bound of estimate_join_size, rounded up (a run is
+        sized by count_join_results, the hosts of spatial-join-on-FPGA-PBSM only add 1024
+        entries to the buffer, the FPGA_BFS host 1024 bytes, i.e. 128 results)
+    """
+    return int(np.ceil(estimate['upper']))
+
+def read_join_inputs(file_A, file_B, tree_B_node_bytes=None):
+    """
+    Read two dataset files, B can also be a serialized R-tree (with its node size)
+
+    Output: (objects_A, objects_B)
+    """
+    objects_A = read_dataset(file_A)
+    if tree_B_node_bytes is not None:
+        objects_B = read_tree_objects(file_B, tree_B_node_bytes)
+    else:
+        objects_B = read_dataset(file_B)
+    return objects_A, objects_B
+
+def count_join_results(file_A, file_B, tree_B_node_bytes=None):
+    """
+    Exact number of results of two dataset files (plane sweep), the max_num_results of the
+        FPGA hosts, see read_join_inputs
+    """
+    objects_A, objects_B = read_join_inputs(file_A, file_B, tree_B_node_bytes)
+    return sweep_join(objects_A, objects_B, count_only=True)
+
+
+if __name__ == '__main__':
+
+    from Index.Self_check import generate_objects, nested_loop_join
+
+    test_num = 20
+    rng = np.random.default_rng(0)
+
+    for i in range(test_num):
+        # a few much larger objects of A hold a large share of the results
+        objects_A = generate_objects(rng, 5000, num_large=5)
+        objects_B = generate_objects(rng, 4000)
+        num_results = len(nested_loop_join(objects_A, objects_B)[0])
+
+        # a sample covering A is the exact join
+        estimate = estimate_join_size(objects_A, objects_B, sample_size=len(objects_A[0]), rng=rng)
+        assert estimate['estimate'] == num_results and estimate['std_error'] == 0
+
+        estimate = estimate_join_size(objects_A, objects_B, sample_size=500, grid_size=16, rng=rng)
+        print("Results: {}, estimate: {:.0f}, result buffer: {}".format(
+            num_results, estimate['estimate'], result_buffer_size(estimate)))
+        assert num_results <= result_buffer_size(estimate)
@@ -0,0 +1,65 @@
+"""
+Random datasets and the nested-loop reference join of the self-checks of the join modules
+    (python -m Index.Plane_sweep, Index.PBSM, Index.Selectivity).
+"""
+import numpy as np
+
+from Index.Join_kernels import intersect_pairs
+
+DISTRIBUTIONS = ('uniform', 'gaussian', 'ties')
+
+
+def generate_objects(rng, num_objects, distribution='uniform', num_large=0):
+    """
+    Random MBRs of one of DISTRIBUTIONS:
+        uniform:    uniform corners in [0, 1000), sizes in [0, 20)
+        gaussian:   corners around (500, 500) (skewed, hot cells), sizes in [0, 5)
+        ties:       integer corners in [0, 100) and sizes in [0, 4), many equal low0 and
+                    touching MBRs
+        the first num_large objects are 200 larger in both dimensions
+
+    Output: ids (int32, shuffled), low0, high0, low1, high1 (float32)
+    """
+    if distribution == 'uniform':
+        low0, low1 = rng.uniform(0, 1000, num_objects), rng.uniform(0, 1000, num_objects)
+        size0, size1 = rng.uniform(0, 20, num_objects), rng.uniform(0, 20, num_objects)
+    elif distribution == 'gaussian':
+        low0, low1 = rng.normal(500, 50, num_objects), rng.normal(500, 50, num_objects)
+        size0, size1 = rng.uniform(0, 5, num_objects), rng.uniform(0, 5, num_objects)
+    elif distribution == 'ties':
+        low0, low1 = rng.integers(0, 100, num_objects), rng.integers(0, 100, num_objects)
+        size0, size1 = rng.integers(0, 4, num_objects), rng.integers(0, 4, num_objects)
+    else:
+        raise ValueError(f"Unknown distribution: {distribution}, expected one of {DISTRIBUTIONS}")
+    size0[:num_large] += 200
+    size1[:num_large] += 200
+    ids = rng.permutation(num_objects).astype(np.int32)
+    return ids, np.float32(low0), np.float32(low0 + size0), np.float32(low1), np.float32(low1 + size1)
+
+def nested_loop_join(objects_A, objects_B, strict=False):
+    """
+    Reference join, every pair of A x B tested (intersect_pairs); strict: the MBRs must
+        overlap, touching borders do not count
+
+    Output: (idx_A, idx_B), in the order of a nested loop over A then B
+    """
+    _, low0_A, high0_A, low1_A, high1_A = objects_A
+    _, low0_B, high0_B, low1_B, high1_B = objects_B
+    if strict:
+        mask = (low0_A[:, None] < high0_B[None, :]) & (high0_A[:, None] > low0_B[None, :]) & \
+            (low1_A[:, None] < high1_B[None, :]) & (high1_A[:, None] > low1_B[None, :])
+        return np.nonzero(mask)
+    return intersect_pairs(low0_A, high0_A, low1_A, high1_A, low0_B, high0_B, low1_B, high1_B)
+
+def sorted_pairs(results):
+    """
+    (id A, id B) result pairs sorted by id A, then id B
+    """
+    return results[np.lexsort((results[:, 1], results[:, 0]))]
+
+def nested_loop_results(objects_A, objects_B, strict=False):
+    """
+    Output: the (id A, id B) pairs of nested_loop_join, see sorted_pairs
+    """
+    idx_A, idx_B = nested_loop_join(objects_A, objects_B, strict)
+    return sorted_pairs(np.stack([objects_A[0][idx_A], objects_B[0][idx_B]], axis=1))
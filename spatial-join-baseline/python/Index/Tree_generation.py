@@ -2,8 +2,8 @@
 Generate a random RTree
 """
 import numpy as np
-from struct import pack, unpack, unpack_from
 
+from Index import Array_RTree, Page_codec
 from Index.Region import MBR
 from Index.RTree import Node
 
@@ -81,7 +81,13 @@ def collect_all_nodes(root):
     """
     Run BFS starting from the root, and generate the list of all nodes in the tree, 
         whose node IDs are consecutively increasing  
+
+    For array R-trees, the nodes are already stored by ID, and the returned list
+        contains Index.Array_RTree.ArrayNode views
     """
+    if isinstance(root, Array_RTree.ARRAY_TREE_TYPES):
+        return [root.get_node(i) for i in range(root.num_nodes)]
+
     candidate_node_list = [] # as a queue
     final_node_list = [] # as the final node list
 
@@ -99,213 +105,55 @@ def collect_all_nodes(root):
 
     return final_node_list
 
-def index_serialization(root, node_bytes=4096, out_dir=None):
+def index_serialization(root, node_bytes=4096, out_dir=None, nodes_per_chunk=None):
     """
     Inputs: 
-        a root node
+        a root node, or an Index.Array_RTree.ArrayRTree / MappedRTree
         all the FPGA related parameters 
             node_bytes: the size per page for a single node
         output file directory: no file write without specifying 
+        nodes_per_chunk: if specified with out_dir, stream the pages to disk chunk by chunk,
+            such that the peak memory does not grow with the tree size
 
-    FPGA storage format:
-        one node per page (e.g., 4096 bytes)
-        data are split in 64-byte AXI width 
-
-        first 64 byte:
-
-            typedef struct {
-                // 7 * 4 bytes = 28 bytes
-                int is_leaf;  // bool 
-                int count;    // valid items
-                obj_t obj;    // id/ptr + mbr
-            } node_meta_t;
-
-        the rest 64-byte blocks, each contain 3 object (first 60 bytes):
-
-            typedef struct {
-                // obj id for data nodes; pointer to children for directory nodes
-                int id; 
-                // minimum bounding rectangle 
-                float low0; 
-                float high0; 
-                float low1; 
-                float high1; 
-            } obj_t;
+    FPGA storage format: one node per page, refer to Index.Page_codec
 
     Output: 
-        a binary file format of the tree
+        a binary format of the tree (uint8 array), None if streamed to disk
     """
-    node_list = collect_all_nodes(root)
-    num_nodes = len(node_list)
-
-    def node_serialization(node, node_bytes=4096):
-
-        node_bin = bytes()
+    if isinstance(root, Array_RTree.MappedRTree):
+        root = root.to_array_tree()
+    elif not isinstance(root, Array_RTree.ArrayRTree):
+        root = tree_to_arrays(root)
 
-        empty_byte = int(0).to_bytes(1, "little", signed=False)
-        AXI_bytes = 64
-        obj_bytes = 20
-        header_bytes = 28
-
-        # meta data: 28 byte out of the first 64
-        if node.is_leaf:
-            node_bin += int(1).to_bytes(4, "little", signed=False)
-        else:
-            node_bin += int(0).to_bytes(4, "little", signed=False)
-
-        node_bin += int(node.count).to_bytes(4, "little", signed=False)
-
-        node_bin += int(node.node_id).to_bytes(4, "little", signed=False)
-
-        node_bin += pack('<f', node.mbr.get_low0())
-        node_bin += pack('<f', node.mbr.get_high0())
-        node_bin += pack('<f', node.mbr.get_low1())
-        node_bin += pack('<f', node.mbr.get_high1())
-
-        assert len(node_bin) == header_bytes
-        node_bin += (AXI_bytes - header_bytes) * empty_byte
-
-        # handle all the children
-
-        # for data node, fill id as polygon id
-        if node.is_leaf:
-
-            assert node.count == len(node.obj_ids)
-            assert node.count == len(node.mbrs)
-
-            for i in range(int(np.ceil(node.count / 3.0))):
-                # append 3 objects, then fill 4 bytes
-                for j in range(3):
-                    child_id = i * 3 + j
-                    if child_id >= node.count:
-                        break
-                    node_bin += int(node.obj_ids[child_id]).to_bytes(4, "little", signed=False)
-                    node_bin += pack('<f', node.mbrs[child_id].get_low0())
-                    node_bin += pack('<f', node.mbrs[child_id].get_high0())
-                    node_bin += pack('<f', node.mbrs[child_id].get_low1())
-                    node_bin += pack('<f', node.mbrs[child_id].get_high1())
-                node_bin += (AXI_bytes - 3 * obj_bytes) * empty_byte
-        # for directory node, fill id as children node id
-        else: # is directory
-            assert node.count == len(node.child_ptrs)
-            assert node.count == len(node.mbrs)
-
-            for i in range(int(np.ceil(node.count / 3.0))):
-                # append 3 objects, then fill 4 bytes
-                for j in range(3):
-                    child_id = i * 3 + j
-                    if child_id >= node.count:
-                        break
-                    node_bin += int(node.child_ptrs[child_id].node_id).to_bytes(4, "little", signed=False)
-                    node_bin += pack('<f', node.child_ptrs[child_id].mbr.get_low0())
-                    node_bin += pack('<f', node.child_ptrs[child_id].mbr.get_high0())
-                    node_bin += pack('<f', node.child_ptrs[child_id].mbr.get_low1())
-                    node_bin += pack('<f', node.child_ptrs[child_id].mbr.get_high1())
-                node_bin += (AXI_bytes - 3 * obj_bytes) * empty_byte
-
-        # final assertion & padding
-        if len(node_bin) > node_bytes:
-            raise ValueError
-        if len(node_bin) < node_bytes:
-            node_bin += (node_bytes - len(node_bin)) * empty_byte
-        assert len(node_bin) == node_bytes
-
-        return node_bin
-        
-    # assert that the nodes are sorted by IDs
-    for i in range(num_nodes):
-        assert node_list[i].node_id == i
-
-    tree_bin = bytes()
-    for i in range(num_nodes):
-        tree_bin += node_serialization(node_list[i], node_bytes)
-
-    assert len(tree_bin) == num_nodes * node_bytes
-
-    if out_dir is not None: 
-        with open(out_dir, 'wb') as f:
-            f.write(tree_bin)
-
-    return tree_bin
+    return Page_codec.write_pages(root, node_bytes, out_dir, nodes_per_chunk)
 
 def load_serialized_index(in_dir, node_bytes=4096):
     """
     Given a binary index, reconstruct it to the tree structure, and return the root
-    """
 
-    def node_deserialization(node_bin):
-        """
-        Given a binary format of node, return the real python data structure
-        NOTE! For directory nodes, the child_ptrs field, instead of being the real pointer, 
-            are children IDs, these must be converted into real pointer afterwards
-        """
-
-        # meta data: 28 byte out of the first 64
-        is_leaf = unpack_from("<i", node_bin, offset=0)[0]
-        count = unpack_from("<i", node_bin, offset=4)[0]
-        node_id = unpack_from("<i", node_bin, offset=8)[0]
-
-        low0 = unpack_from("<f", node_bin, offset=12)[0]
-        high0 = unpack_from("<f", node_bin, offset=16)[0]
-        low1 = unpack_from("<f", node_bin, offset=20)[0]
-        high1 = unpack_from("<f", node_bin, offset=24)[0]
-        mbr = MBR(low0, high0, low1, high1)
-
-        node = Node(node_id, is_leaf, mbr)
-
-        # handle all the children
-        for i in range(int(np.ceil(count / 3.0))):
-            # append 3 objects, then fill 4 bytes
-            for j in range(3):
-                child_id = i * 3 + j
-                child_id_addr = 64 + 64 * i + 20 * j
-                if child_id >= count:
-                    break
-
-                id = unpack_from("<i", node_bin, offset=child_id_addr)[0]
-                low0 = unpack_from("<f", node_bin, offset=child_id_addr + 4)[0]
-                high0 = unpack_from("<f", node_bin, offset=child_id_addr + 8)[0]
-                low1 = unpack_from("<f", node_bin, offset=child_id_addr + 12)[0]
-                high1 = unpack_from("<f", node_bin, offset=child_id_addr + 16)[0]
-                mbr = MBR(low0, high0, low1, high1)
-                
-                node.add_entry(mbr, id)
-
-        assert node.count == count 
-
-        return node
-
-    tree_bin = bytes()
-    with open(in_dir, 'rb') as f:
-        tree_bin = f.read()
-
-    assert len(tree_bin) % node_bytes == 0
-    num_nodes = int(len(tree_bin) / node_bytes)
-    
-    node_list = []
-    for i in range(num_nodes):
-        node_bin = tree_bin[i * node_bytes: (i + 1) * node_bytes]
-        # here, the children ptr for directory nodes as just node IDs
-        node_list.append(node_deserialization(node_bin))
-
-    node_list.sort(key=lambda n: n.node_id)
-    for i in range(len(node_list)):
-        assert node_list[i].node_id == i
+    The pages are bulk-decoded by Index.Page_codec, use load_mapped_index instead
+        if the Node objects are not needed
+    """
+    tree = Array_RTree.MappedRTree(in_dir, node_bytes)
+    assert np.array_equal(tree.pages['meta']['id'], np.arange(tree.num_nodes))
 
-    # replace the children id by real pointers
-    for node in node_list: 
-        if not node.is_leaf: 
-            for i, child_id in enumerate(node.child_ptrs):
-                node.child_ptrs[i] = node_list[child_id]
+    return arrays_to_tree(tree.to_array_tree())
 
-    root = node_list[0]
+def load_mapped_index(in_dir, node_bytes=4096):
+    """
+    Open a binary index without loading it: the file is memory-mapped, and nodes
+        are decoded on demand when a traversal visits them.
 
-    return root
+    Output: an Index.Array_RTree.MappedRTree
+    """
+    return Array_RTree.MappedRTree(in_dir, node_bytes)
 
 def tree_max_depth(root):    
     """
     Use DFS to get the maximum depth of a tree
     """
+    if isinstance(root, Array_RTree.ARRAY_TREE_TYPES):
+        return Array_RTree.tree_max_depth(root)
 
     def get_node_depth(node):
         if node.is_leaf:
@@ -322,6 +170,54 @@ def tree_max_depth(root):
 
     return depth 
 
+def tree_to_arrays(root):
+    """
+    Convert a Node-based R-tree into an Index.Array_RTree.ArrayRTree,
+        the node IDs must be consecutive (see collect_all_nodes)
+    """
+    node_list = collect_all_nodes(root)
+
+    entry_ids = []
+    entry_mbrs = []
+    for node in node_list:
+        if node.is_leaf:
+            entry_ids += node.obj_ids
+        else:
+            entry_ids += [child.node_id for child in node.child_ptrs]
+        entry_mbrs += node.mbrs
+
+    return Array_RTree.ArrayRTree(
+        is_leaf=[node.is_leaf for node in node_list],
+        count=[node.count for node in node_list],
+        node_low0=[node.mbr.get_low0() for node in node_list],
+        node_high0=[node.mbr.get_high0() for node in node_list],
+        node_low1=[node.mbr.get_low1() for node in node_list],
+        node_high1=[node.mbr.get_high1() for node in node_list],
+        ids=entry_ids,
+        low0=[mbr.get_low0() for mbr in entry_mbrs],
+        high0=[mbr.get_high0() for mbr in entry_mbrs],
+        low1=[mbr.get_low1() for mbr in entry_mbrs],
+        high1=[mbr.get_high1() for mbr in entry_mbrs])
+
+def arrays_to_tree(tree):
+    """
+    Convert an Index.Array_RTree.ArrayRTree back into Node objects, and return the root
+    """
+    node_list = []
+    for i in range(tree.num_nodes):
+        mbr = MBR(*[float(v) for v in (tree.node_low0[i], tree.node_high0[i], tree.node_low1[i], tree.node_high1[i])])
+        node_list.append(Node(node_id=i, is_leaf=bool(tree.is_leaf[i]), mbr=mbr))
+
+    for node in node_list:
+        ids, low0, high0, low1, high1 = tree.get_entries(node.node_id)
+        mbrs = [MBR(*coords) for coords in zip(low0.tolist(), high0.tolist(), low1.tolist(), high1.tolist())]
+        if node.is_leaf:
+            node.add_entries(mbrs, ids.tolist())
+        else:
+            node.add_entries(mbrs, [node_list[child_id] for child_id in ids])
+
+    return node_list[0]
+
 if __name__ == "__main__":
     
     max_level = 4
@@ -0,0 +1,119 @@
+"""
+Quality metrics of array R-trees, used to compare packing orders (e.g., STR vs Hilbert).
+
+Per level:
+    node area:      sum of the node MBR areas
+    overlap:        sum of the pairwise intersection areas between sibling entries
+    dead space:     area covered by a node MBR but by none of its entries
+For a pair of trees:
+    node pairs:     number of node pairs visited by the synchronous traversal, i.e.,
+                        the page pairs the FPGA join units have to read
+"""
+import numpy as np
+
+from Index.Array_RTree import join_node_pair
+
+
+def node_levels(tree):
+    """
+    Output: a list of node id arrays, one per level, root level first
+    """
+    levels = []
+    frontier = np.zeros(1, dtype=np.int64) # root
+    while len(frontier) > 0:
+        levels.append(frontier)
+        frontier = tree.get_children(frontier[tree.is_leaf[frontier] == 0])
+    return levels
+
+def padded_entries(tree, node_ids):
+    """
+    Gather the entries of the given nodes into (num_nodes, max_count) arrays,
+        padded slots are empty MBRs (low = +inf, high = -inf) that cover nothing
+
+    Output: low0, high0, low1, high1 (float64)
+    """
+    max_count = int(np.amax(tree.count[node_ids]))
+    slot = np.arange(max_count)
+    valid = slot[None, :] < tree.count[node_ids][:, None]
+    entry_idx = np.where(valid, tree.entry_offset[node_ids][:, None] + slot[None, :], 0)
+
+    padded = []
+    for coord, fill in ((tree.low0, np.inf), (tree.high0, -np.inf), (tree.low1, np.inf), (tree.high1, -np.inf)):
+        padded.append(np.where(valid, coord[entry_idx].astype(np.float64), fill))
+    return padded
+
+def sibling_overlap(low0, high0, low1, high1):
+    """
+    Input: padded (num_nodes, max_count) entry coordinates
+    Output: per node, the sum of the pairwise intersection areas between its entries
+    """
+    width = np.minimum(high0[:, :, None], high0[:, None, :]) - np.maximum(low0[:, :, None], low0[:, None, :])
+    height = np.minimum(high1[:, :, None], high1[:, None, :]) - np.maximum(low1[:, :, None], low1[:, None, :])
+    area = np.clip(width, 0, None) * np.clip(height, 0, None)
+    # each pair once, no self-intersection
+    return np.sum(np.triu(area, k=1), axis=(1, 2))
+
+def covered_area(low0, high0, low1, high1):
+    """
+    Area of the union of the entries of each node, by coordinate compression:
+        the node is cut into a (2 * max_count - 1)^2 grid by the entry boundaries,
+        and a grid cell counts if any entry contains it.
+
+    Input: padded (num_nodes, max_count) entry coordinates
+    Output: per node, the covered area
+    """
+    # padded slots (+-inf) are moved onto the first entry's low corner, giving zero-width cells
+    xs = np.concatenate([low0, high0], axis=1)
+    ys = np.concatenate([low1, high1], axis=1)
+    xs = np.sort(np.where(np.isfinite(xs), xs, low0[:, :1]), axis=1)
+    ys = np.sort(np.where(np.isfinite(ys), ys, low1[:, :1]), axis=1)
+
+    cell_width = np.diff(xs, axis=1) # (nodes, X)
+    cell_height = np.diff(ys, axis=1) # (nodes, Y)
+    covered_x = (low0[:, None, :] <= xs[:, :-1, None]) & (high0[:, None, :] >= xs[:, 1:, None]) # (nodes, X, entries)
+    covered_y = (low1[:, None, :] <= ys[:, :-1, None]) & (high1[:, None, :] >= ys[:, 1:, None]) # (nodes, Y, entries)
+    covered = np.any(covered_x[:, :, None, :] & covered_y[:, None, :, :], axis=3) # (nodes, X, Y)
+    return np.sum(covered * cell_width[:, :, None] * cell_height[:, None, :], axis=(1, 2))
+
+def level_statistics(tree):
+    """
+    Output: a list of dicts, one per level (root level first), with keys
+        num_nodes, node_area, overlap, dead_space
+    """
+    # covered_area allocates (nodes, 2M, 2M, M) booleans, keep a chunk around 16 MB
+    max_count = int(np.amax(tree.count))
+    chunk_size = max(1, (1 << 24) // (4 * max_count ** 3))
+    stats = []
+    for node_ids in node_levels(tree):
+        node_area = (tree.node_high0[node_ids].astype(np.float64) - tree.node_low0[node_ids]) * \
+            (tree.node_high1[node_ids].astype(np.float64) - tree.node_low1[node_ids])
+        overlap = 0.0
+        dead_space = 0.0
+        for start in range(0, len(node_ids), chunk_size):
+            chunk = node_ids[start: start + chunk_size]
+            entries = padded_entries(tree, chunk)
+            overlap += np.sum(sibling_overlap(*entries))
+            dead_space += np.sum(np.clip(node_area[start: start + chunk_size] - covered_area(*entries), 0, None))
+        stats.append({'num_nodes': len(node_ids), 'node_area': float(np.sum(node_area)),
+                      'overlap': float(overlap), 'dead_space': float(dead_space)})
+    return stats
+
+def count_node_pairs(tree_A, tree_B):
+    """
+    Number of node pairs visited by Index.Array_RTree.sync_traversal
+
+    Output: (num_node_pairs, num_leaf_pairs)
+    """
+    num_node_pairs = 0
+    num_leaf_pairs = 0
+    stack = [(0, 0)]
+    while len(stack) > 0:
+        node_A, node_B = stack.pop()
+        num_node_pairs += 1
+        is_leaf_pair, ids_A, ids_B = join_node_pair(tree_A, node_A, tree_B, node_B)
+        if is_leaf_pair:
+            num_leaf_pairs += 1
+        else:
+            stack += zip(ids_A.tolist(), ids_B.tolist())
+
+    return num_node_pairs, num_leaf_pairs
@@ -0,0 +1,46 @@
+"""
+Compare the packing orders of the bulk loaders (STR vs Hilbert) on a pair of datasets:
+    per-level node area, sibling overlap and dead space of each tree, and the number of
+    node pairs the synchronous traversal visits when joining them.
+
+Example Usage:
+
+python compare_bulk_loading.py \
+--file_A ../generated_data/C_OSM_100000_polygon_file_0_set_0.txt \
+--file_B ../generated_data/C_OSM_100000_polygon_file_1_set_0.txt \
+--max_entry_size 16
+"""
+import argparse
+
+from Index.Bulk_loading import BULK_LOADERS, read_dataset
+from Index.Tree_statistics import level_statistics, count_node_pairs
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--file_A', type=str, default='../generated_data/C_uniform_100000_polygon_file_0_set_0.txt', help="C_*.txt or PBSM .bin dataset")
+parser.add_argument('--file_B', type=str, default='../generated_data/C_uniform_100000_polygon_file_1_set_0.txt', help="C_*.txt or PBSM .bin dataset")
+parser.add_argument('--max_entry_size', type=int, default=16, help="the max entry numbers in an R tree node")
+parser.add_argument('--fill_factor', type=float, default=1.0, help="fraction of max_entry_size used per node")
+args = parser.parse_args()
+
+
+def print_level_statistics(name, tree):
+    print("Tree {}:".format(name))
+    print("\tlevel\tnodes\tnode area\toverlap\tdead space")
+    for level, stats in enumerate(level_statistics(tree)):
+        print("\t{}\t{}\t{:.4e}\t{:.4e}\t{:.4e}".format(
+            level, stats['num_nodes'], stats['node_area'], stats['overlap'], stats['dead_space']))
+
+if __name__ == '__main__':
+
+    dataset_A = read_dataset(args.file_A)
+    dataset_B = read_dataset(args.file_B)
+
+    for loader_name, bulk_load in BULK_LOADERS.items():
+        print("===== Bulk loader: {} =====".format(loader_name))
+        tree_A = bulk_load(*dataset_A, max_entry=args.max_entry_size, fill_factor=args.fill_factor)
+        tree_B = bulk_load(*dataset_B, max_entry=args.max_entry_size, fill_factor=args.fill_factor)
+        print_level_statistics("A", tree_A)
+        print_level_statistics("B", tree_B)
+        num_node_pairs, num_leaf_pairs = count_node_pairs(tree_A, tree_B)
+        print("Node pairs visited by sync traversal: {}".format(num_node_pairs))
+        print("Leaf pairs visited by sync traversal: {}".format(num_leaf_pairs))
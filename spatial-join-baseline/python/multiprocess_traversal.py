@@ -0,0 +1,58 @@
+"""
+Python counterpart of cpp/multithread: build two R-trees with the STR bulk loader,
+    then run the multi-process synchronous traversal with the selected approach(es).
+
+The arguments and the log keys are the same as the C++ program, so
+    cpp_scripts/cpp_run_all_multithread_experiments.py can run it by setting
+    --cpp_exe_dir "python /path/to/multiprocess_traversal.py".
+
+Example Usage:
+
+python multiprocess_traversal.py \
+../generated_data/C_uniform_100000_polygon_file_0_set_0.txt \
+../generated_data/C_uniform_100000_polygon_file_1_set_0.txt \
+bfs_dynamic 16 8
+"""
+import argparse
+import time
+
+from Index.Bulk_loading import read_dataset, str_bulk_load
+from Index.Parallel_traversal import PARALLEL_APPROACHES, parallel_sync_traversal
+
+parser = argparse.ArgumentParser()
+parser.add_argument('trace_1', type=str, help="C_*.txt or PBSM .bin dataset")
+parser.add_argument('trace_2', type=str, help="C_*.txt or PBSM .bin dataset")
+parser.add_argument('parallel_approach', type=str, help='"all" or "bfs_static" or "bfs_dfs_static" or "bfs_dynamic" or "bfs_dfs_dynamic"')
+parser.add_argument('max_entries', type=int, help="the max entry numbers in an R tree node")
+parser.add_argument('num_processes', type=int, help="number of worker processes")
+parser.add_argument('fill_factor', type=float, nargs='?', default=1.0, help="fraction of max_entries used per node")
+parser.add_argument('--batch_size', type=int, default=16, help="node pairs per task for the dynamic approaches")
+args = parser.parse_args()
+
+approach_names = {
+    'bfs_static': 'BFS + static',
+    'bfs_dfs_static': 'BFS-DFS + static',
+    'bfs_dynamic': 'BFS + dynamic',
+    'bfs_dfs_dynamic': 'BFS-DFS + dynamic'}
+
+if __name__ == '__main__':
+
+    assert args.parallel_approach == 'all' or args.parallel_approach in PARALLEL_APPROACHES
+
+    trees = []
+    for i, trace in enumerate([args.trace_1, args.trace_2]):
+        t_start = time.time()
+        trees.append(str_bulk_load(*read_dataset(trace), max_entry=args.max_entries, fill_factor=args.fill_factor))
+        t_end = time.time()
+        print("Building RTree for trace {}: {:.2f} ms".format(i + 1, (t_end - t_start) * 1000))
+    tree_A, tree_B = trees
+
+    for parallel_approach in PARALLEL_APPROACHES:
+        if args.parallel_approach != 'all' and args.parallel_approach != parallel_approach:
+            continue
+        t_start = time.time()
+        num_results = parallel_sync_traversal(tree_A, tree_B, parallel_approach, args.num_processes,
+                                              count_only=True, batch_size=args.batch_size, verbose=True)
+        t_end = time.time()
+        print("{} duration: {:.2f} ms".format(approach_names[parallel_approach], (t_end - t_start) * 1000))
+        print("Number of results ({}): {}".format(approach_names[parallel_approach], num_results))
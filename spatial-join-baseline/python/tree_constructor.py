@@ -0,0 +1,65 @@
+"""
+Python replacement of cpp/FPGA_index_constructor: bulk-load two datasets (STR or Hilbert),
+    serialize the trees as tree_A.bin and tree_B.bin, and run the synchronous
+    traversal to get the number of results that the FPGA should return.
+
+The log keys are the same as the C++ constructor, so the perf test scripts can
+    parse either of them.
+
+Example Usage:
+
+python tree_constructor.py \
+--file_A ../generated_data/C_uniform_100000_polygon_file_0_set_0.txt \
+--file_B ../generated_data/C_uniform_100000_polygon_file_1_set_0.txt \
+--max_entry_size 16
+"""
+import argparse
+import time
+
+from Index.Array_RTree import count_results, write_results, tree_max_depth
+from Index.Bulk_loading import BULK_LOADERS, get_node_bytes, read_dataset
+from Index.Tree_generation import index_serialization
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--file_A', type=str, default='../generated_data/C_uniform_100000_polygon_file_0_set_0.txt', help="C_*.txt or PBSM .bin dataset")
+parser.add_argument('--file_B', type=str, default='../generated_data/C_uniform_100000_polygon_file_1_set_0.txt', help="C_*.txt or PBSM .bin dataset")
+parser.add_argument('--tree_A_dir', type=str, default='tree_A.bin', help="output dir of tree A")
+parser.add_argument('--tree_B_dir', type=str, default='tree_B.bin', help="output dir of tree B")
+parser.add_argument('--max_entry_size', type=int, default=16, help="the max entry numbers in an R tree node")
+parser.add_argument('--node_bytes', type=int, default=0, help="bytes per node, 0 = the C++ constructor page size")
+parser.add_argument('--bulk_loader', type=str, default='str', choices=list(BULK_LOADERS.keys()), help="packing order of the objects")
+parser.add_argument('--fill_factor', type=float, default=1.0, help="fraction of max_entry_size used per node")
+parser.add_argument('--nodes_per_chunk', type=int, default=0, help="stream the tree pages to disk in chunks of this many nodes, 0 = one buffer")
+parser.add_argument('--results_dir', type=str, default=None, help="if specified, write the join results as pair_t (int id_A, int id_B)")
+parser.add_argument('--skip_join', type=int, default=0, help="1 = only build and serialize the trees")
+args = parser.parse_args()
+file_A = args.file_A
+file_B = args.file_B
+max_entry_size = args.max_entry_size
+node_bytes = args.node_bytes if args.node_bytes > 0 else get_node_bytes(max_entry_size)
+
+
+def build_tree(file_dir, tree_dir, name):
+    t_start = time.time()
+    tree = BULK_LOADERS[args.bulk_loader](*read_dataset(file_dir), max_entry=max_entry_size, fill_factor=args.fill_factor)
+    index_serialization(tree, node_bytes, tree_dir, args.nodes_per_chunk if args.nodes_per_chunk > 0 else None)
+    t_end = time.time()
+    print("Building RTree for trace {}: {:.2f} ms".format(name, (t_end - t_start) * 1000))
+    print("Tree {}: {} nodes, max depth: {}".format(name, tree.num_nodes, tree_max_depth(tree)))
+    return tree
+
+if __name__ == '__main__':
+
+    tree_A = build_tree(file_A, args.tree_A_dir, 1)
+    tree_B = build_tree(file_B, args.tree_B_dir, 2)
+    print("Bytes per node during serialization: {}".format(node_bytes))
+
+    if not args.skip_join:
+        t_start = time.time()
+        if args.results_dir is not None:
+            num_results = write_results(tree_A, tree_B, args.results_dir)
+        else:
+            num_results = count_results(tree_A, tree_B)
+        t_end = time.time()
+        print("Sync traversal duration: {:.2f} ms".format((t_end - t_start) * 1000))
+        print("Number of results: {}".format(num_results))
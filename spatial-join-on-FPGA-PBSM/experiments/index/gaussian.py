@@ -7,28 +7,28 @@ if __name__ == "__main__":
             "input2": "../../../../data/tree/tree_gaussian_100000_polygon_file_1_set_0.bin",
             "description": "Gaussian, 50K x 100K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "2 16 60240"
+            "additional_args": "2 16 {max_num_results}"
         },
         {
             "input1": "../../../../data/gaussian/bin/gaussian_100000_polygon_file_0_set_0.bin",
             "input2": "../../../../data/tree/tree_gaussian_100000_polygon_file_1_set_0.bin",
             "description": "Gaussian, 100K x 100K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "2 16 120040"
+            "additional_args": "2 16 {max_num_results}"
         },
         {
             "input1": "../../../../data/gaussian/bin/gaussian_200000_polygon_file_0_set_0.bin",
             "input2": "../../../../data/tree/tree_gaussian_200000_polygon_file_1_set_0.bin",
             "description": "Gaussian, 200K x 200K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "2 16 230240"
+            "additional_args": "2 16 {max_num_results}"
         },
         {
             "input1": "../../../../data/gaussian/bin/gaussian_1000000_polygon_file_0_set_0.bin",
             "input2": "../../../../data/tree/tree_gaussian_1000000_polygon_file_1_set_0.bin",
             "description": "Gaussian, 1M x 1M",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "2 16 1200240"
+            "additional_args": "2 16 {max_num_results}"
         },
     ]
 
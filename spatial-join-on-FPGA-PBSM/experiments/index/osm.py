@@ -7,28 +7,28 @@ if __name__ == "__main__":
             "input2": "../../../../data/tree/tree_OSM_100000_polygon_file_1.bin",
             "description": "OSM, 50K x 100K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "2 16 60240"
+            "additional_args": "2 16 {max_num_results}"
         },
         {
             "input1": "../../../../data/osm/bin/OSM_100000_polygon_file_0.bin",
             "input2": "../../../../data/tree/tree_OSM_100000_polygon_file_1.bin",
             "description": "OSM, 100K x 100K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "2 16 120040"
+            "additional_args": "2 16 {max_num_results}"
         },
         {
             "input1": "../../../../data/osm/bin/OSM_200000_polygon_file_0.bin",
             "input2": "../../../../data/tree/tree_OSM_200000_polygon_file_1.bin",
             "description": "OSM, 200K x 200K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "2 16 230240"
+            "additional_args": "2 16 {max_num_results}"
         },
         {
             "input1": "../../../../data/osm/bin/OSM_1000000_polygon_file_0.bin",
             "input2": "../../../../data/tree/tree_OSM_1000000_polygon_file_1.bin",
             "description": "OSM, 1M x 1M",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "2 16 1200240"
+            "additional_args": "2 16 {max_num_results}"
         },
     ]
 
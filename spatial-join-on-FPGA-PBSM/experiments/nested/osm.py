@@ -7,28 +7,28 @@ if __name__ == "__main__":
             "input2": "../../../../data/osm/bin/OSM_10000_polygon_file_1.bin",
             "description": "OSM, 10K x 10K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "10240"
+            "additional_args": "{max_num_results}"
         },
         {
             "input1": "../../../../data/osm/bin/OSM_50000_polygon_file_0.bin",
             "input2": "../../../../data/osm/bin/OSM_50000_polygon_file_1.bin",
             "description": "OSM, 50K x 50K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "1024"
+            "additional_args": "{max_num_results}"
         },
         {
             "input1": "../../../../data/osm/bin/OSM_50000_polygon_file_0.bin",
             "input2": "../../../../data/osm/bin/OSM_100000_polygon_file_1.bin",
             "description": "OSM, 50K x 100K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "102400"
+            "additional_args": "{max_num_results}"
         },
         {
             "input1": "../../../../data/osm/bin/OSM_100000_polygon_file_0.bin",
             "input2": "../../../../data/osm/bin/OSM_100000_polygon_file_1.bin",
             "description": "OSM, 100K x 100K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "102400"
+            "additional_args": "{max_num_results}"
         },
     ]
 
@@ -7,28 +7,28 @@ if __name__ == "__main__":
             "input2": "../../../../data/uniform/bin/uniform_10000_polygon_file_1_set_0.bin",
             "description": "Uniform, 10K x 10K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "10240"
+            "additional_args": "{max_num_results}"
         },
         {
             "input1": "../../../../data/uniform/bin/uniform_50000_polygon_file_0_set_0.bin",
             "input2": "../../../../data/uniform/bin/uniform_50000_polygon_file_1_set_0.bin",
             "description": "Uniform, 50K x 50K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "1024"
+            "additional_args": "{max_num_results}"
         },
         {
             "input1": "../../../../data/uniform/bin/uniform_50000_polygon_file_0_set_0.bin",
             "input2": "../../../../data/uniform/bin/uniform_100000_polygon_file_1_set_0.bin",
             "description": "Uniform, 50K x 100K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "102400"
+            "additional_args": "{max_num_results}"
         },
         {
             "input1": "../../../../data/uniform/bin/uniform_100000_polygon_file_0_set_0.bin",
             "input2": "../../../../data/uniform/bin/uniform_100000_polygon_file_1_set_0.bin",
             "description": "Uniform, 100K x 100K",
             "num_processing_units": [1, 2, 4, 8, 16],
-            "additional_args": "102400"
+            "additional_args": "{max_num_results}"
         },
     ]
 
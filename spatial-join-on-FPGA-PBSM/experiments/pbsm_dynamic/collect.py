@@ -6,6 +6,13 @@ import argparse
 import re
 import sys
 
+# exact join size: spatial-join-baseline/python/Index/Selectivity.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../spatial-join-baseline/python'))
+from Index.Selectivity import count_join_results
+
+# entries the hosts add to max_num_results, the kernels do not check the bounds of the buffer
+HOST_RESULT_SLACK = 1024
+
 
 def handle_error(error, output=None):
     print(f"Error: {error}")
@@ -87,6 +94,29 @@ def run_experiment(executable, xclbin, input1, input2, additional_args="", print
     return times, results
 
 
+def resolve_additional_args(additional_args, input1, input2, counts):
+    """
+    Replace {max_num_results} in the additional arguments with the exact number of results,
+    counted by a plane sweep on the CPU before the first run, instead of a hand-tuned value;
+    the counts are cached per input pair
+    """
+    if "{max_num_results}" not in additional_args:
+        return additional_args, None
+
+    key = (os.path.abspath(input1), os.path.abspath(input2))
+    if key not in counts:
+        print(f"Counting the number of results of {input1} and {input2}...")
+        counts[key] = count_join_results(input1, input2)
+        print(f"max_num_results: {counts[key]}")
+    return additional_args.format(max_num_results=counts[key]), counts[key]
+
+
+def check_results(results, max_num_results):
+    # past the slack of the host, the kernel wrote out of the result buffer and the run is not trusted
+    if max_num_results is not None and results > max_num_results + HOST_RESULT_SLACK:
+        handle_error(f"{results} results, more than the result buffer ({max_num_results} + {HOST_RESULT_SLACK}).")
+
+
 def perform_experiments(base_directory, experiments, output_file, args):
     P = args.P
     N = args.N
@@ -99,6 +129,7 @@ def perform_experiments(base_directory, experiments, output_file, args):
     print("Starting experiments...")
     print("=" * 50)
     all_results = {}
+    counts = {}
 
     # save the original working directory to return later
     original_cwd = os.getcwd()
@@ -128,6 +159,7 @@ def perform_experiments(base_directory, experiments, output_file, args):
             input1 = experiment["input1"]
             input2 = experiment["input2"]
             additional_args = experiment.get("additional_args_per_variant", {}).get(variant, experiment.get("additional_args", ""))
+            additional_args, max_num_results = resolve_additional_args(additional_args, input1, input2, counts)
 
             print("\n" + "-" * 50)
             print(f"Experiment: {description}")
@@ -147,13 +179,15 @@ def perform_experiments(base_directory, experiments, output_file, args):
             # discard initialization runs
             print(f"Initializing with {P} runs...")
             for i in range(P):
-                _ = run_experiment(executable, xclbin_file, input1, input2, additional_args, print_output=(print_first_init and i == 0))
+                _, results = run_experiment(executable, xclbin_file, input1, input2, additional_args, print_output=(print_first_init and i == 0))
+                check_results(results, max_num_results)
 
             # perform actual experiment runs and collect results
             print(f"Running {N} experiments...")
             for i in range(N):
                 print(f"    Run #{i}:")
-                times, _ = run_experiment(executable, xclbin_file, input1, input2, additional_args)
+                times, results = run_experiment(executable, xclbin_file, input1, input2, additional_args)
+                check_results(results, max_num_results)
 
                 for key, value in times.items():
                     if key not in times_collection:
@@ -165,6 +199,7 @@ def perform_experiments(base_directory, experiments, output_file, args):
                 "input1": input1,
                 "input2": input2,
                 "additional_args": additional_args,
+                "max_num_results": max_num_results,
                 "times": times_collection
             }
 
@@ -1,29 +1,19 @@
 import argparse
-import struct
-import math
+import os
+import sys
+import time
 
-PAGE_SIZE_BYTES = 64
-# 20 bytes (1 * id + 4 * boundary)
-OBJ_SIZE_BYTES = 20
-MAX_OBJS_PER_PAGE = 3
-
-
-def read_data_file(filepath):
-    with open(filepath, 'rb') as file:
-        # first 64 bytes -> the number of objects
-        header = file.read(64)
-        num_objects = struct.unpack('i', header[:4])[0]
-
-        # total size in bytes
-        total_size_bytes = math.ceil(num_objects / MAX_OBJS_PER_PAGE) * PAGE_SIZE_BYTES
+import numpy as np
 
-        # skip the first 64 bytes
-        file.seek(PAGE_SIZE_BYTES, 0)
+# shared FPGA page codec and tree readers: spatial-join-baseline/python/Index
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../spatial-join-baseline/python'))
+from Index import Page_codec
+from Index.Array_RTree import MappedRTree
+from Index.Bulk_loading import read_dataset
 
-        # read the rest
-        buffer = file.read(total_size_bytes)
-
-    return buffer, num_objects
+PAGE_SIZE_BYTES = 64
+MAX_OBJS_PER_PAGE = 3
+DEFAULT_BATCH_SIZE = 16384
 
 
 class ObjT:
@@ -35,158 +25,132 @@ class ObjT:
         self.high1 = high1
 
 
-def parse_data_pages(buffer, num_objects):
-    objs = []
-    num_pages = math.ceil(num_objects / MAX_OBJS_PER_PAGE)
-
-    for i in range(num_pages):
-        # page is 512 bits (64 bytes)
-        page_start = i * PAGE_SIZE_BYTES
-        page = buffer[page_start:page_start + PAGE_SIZE_BYTES]
-
-        # number of obj in this page
-        objs_in_current_page = MAX_OBJS_PER_PAGE
-        if i == num_pages - 1:
-            objs_in_current_page = num_objects - len(objs)
+def read_rtree_file(filepath, page_bytes, verbose=False):
+    pages = Page_codec.open_pages(filepath, page_bytes)
+    meta = pages['meta']
+    _, ids, low0, high0, low1, high1 = Page_codec.decode_entries(pages)
+    children = [ObjT(*child_data) for child_data in zip(
+        ids.tolist(), low0.tolist(), high0.tolist(), low1.tolist(), high1.tolist())]
 
-        # parse
-        for j in range(objs_in_current_page):
-            id_A = struct.unpack('i', page[j * OBJ_SIZE_BYTES:j * OBJ_SIZE_BYTES + 4])[0]
-            low0_A = struct.unpack('f', page[j * OBJ_SIZE_BYTES + 4:j * OBJ_SIZE_BYTES + 8])[0]
-            high0_A = struct.unpack('f', page[j * OBJ_SIZE_BYTES + 8:j * OBJ_SIZE_BYTES + 12])[0]
-            low1_A = struct.unpack('f', page[j * OBJ_SIZE_BYTES + 12:j * OBJ_SIZE_BYTES + 16])[0]
-            high1_A = struct.unpack('f', page[j * OBJ_SIZE_BYTES + 16:j * OBJ_SIZE_BYTES + 20])[0]
-
-            obj = ObjT(id_A, low0_A, high0_A, low1_A, high1_A)
-            objs.append(obj)
-
-    return objs
-
-
-def read_rtree_file(filepath, page_bytes):
     nodes = []
-    node_count = 0
-    total_leaf_objects = 0
-
-    with open(filepath, 'rb') as file:
-        while True:
-            node_data = file.read(page_bytes)
-            if not node_data:
-                break
-
-            # node meta (first 64 bytes)
-            is_leaf, count, obj_id, low0, high0, low1, high1 = struct.unpack('iii4f', node_data[:28])
-            node_meta = ObjT(obj_id, low0, high0, low1, high1)
-
-            node = {
-                "is_leaf": is_leaf,
-                "count": count,
-                "meta": node_meta,
-                "children": []
-            }
-
-            # node meta information
+    entry_start = 0
+    for node_count, node_meta in enumerate(zip(meta['is_leaf'].tolist(), meta['count'].tolist(), meta['id'].tolist(),
+            meta['low0'].tolist(), meta['high0'].tolist(), meta['low1'].tolist(), meta['high1'].tolist())):
+        is_leaf, count, obj_id, low0, high0, low1, high1 = node_meta
+        node = {
+            "is_leaf": is_leaf,
+            "count": count,
+            "meta": ObjT(obj_id, low0, high0, low1, high1),
+            "children": children[entry_start:entry_start + count]
+        }
+        entry_start += count
+
+        if verbose:
             print(f"Node {node_count}:")
             print(f"  is_leaf: {is_leaf}, count: {count}, id: {obj_id}")
             print(f"  Bounding Rectangle: [{low0}, {high0}], [{low1}, {high1}]")
+            for i, child in enumerate(node["children"]):
+                print(f"  {'Leaf Object' if is_leaf else 'Non-Leaf Child'} {i}: id: {child.id}")
+                print(f"    Bounding Rectangle: [{child.low0}, {child.high0}], [{child.low1}, {child.high1}]")
 
-            # a leaf node -> read the objects
-            if is_leaf:
-                total_leaf_objects += count
-                for i in range(count):
-                    # !!!consider padding!!!
-                    start = 64 + (i // 3) * 64 + (i % 3) * OBJ_SIZE_BYTES
-                    child_data = struct.unpack('i4f', node_data[start:start + OBJ_SIZE_BYTES])
-                    child_obj = ObjT(*child_data)
-                    node["children"].append(child_obj)
-
-                    print(f"  Leaf Object {i}: id: {child_obj.id}")
-                    print(f"    Bounding Rectangle: [{child_obj.low0}, {child_obj.high0}], [{child_obj.low1}, {child_obj.high1}]")
-            else:
-                # a non-leaf node -> read child node references
-                for i in range(count):
-                    # consider padding!!!
-                    start = 64 + (i // 3) * 64 + (i % 3) * OBJ_SIZE_BYTES
-                    child_data = struct.unpack('i4f', node_data[start:start + OBJ_SIZE_BYTES])
-                    child_node_ref = ObjT(*child_data)
-                    node["children"].append(child_node_ref)
-
-                    print(f"  Non-Leaf Child {i}: Node id: {child_node_ref.id}")
-                    print(f"    Bounding Rectangle: [{child_node_ref.low0}, {child_node_ref.high0}], [{child_node_ref.low1}, {child_node_ref.high1}]")
-
-            print(f"Node {node_count} processed")
-            print("------------------------------------------------")
-
-            nodes.append(node)
-            node_count += 1
-
-    print(f"Total nodes read: {node_count}")
-    print(f"Total objects in leaf nodes: {total_leaf_objects}")
-    return nodes
+        nodes.append(node)
 
+    print(f"Total nodes read: {len(nodes)}")
+    print(f"Total objects in leaf nodes: {int(meta['count'][meta['is_leaf'] == 1].sum())}")
+    return nodes
 
-def intersects(obj1, obj2):
-    return (obj1.low0 <= obj2.high0 and obj1.high0 >= obj2.low0) and \
-        (obj1.low1 <= obj2.high1 and obj1.high1 >= obj2.low1)
-
-
-def join_with_rtree(object_list, rtree_nodes):
-    matches = 0
-    # avoid duplicates
-    # matched_object_ids = set()
-    total_objects = len(object_list)
-    object_counter = 0
-
-    for obj in object_list:
-        object_counter += 1
-        print(f"Processing object {object_counter}/{total_objects} (ID: {obj.id})...")
-
-        stack = []
-        for node in rtree_nodes:
-            if node['meta'].id == 0:
-                stack.append(node)
-
-        node_counter = 0
-        while stack:
-            node = stack.pop()
-            node_counter += 1
-
-            if intersects(obj, node['meta']):
-                if node['is_leaf']:
-                    print(f"  Checking leaf node {node_counter} with {node['count']} objects...")
-                    for child_obj in node['children']:
-                        if intersects(obj, child_obj): # and child_obj.id not in matched_object_ids:
-                            matches += 1
-                            # matched_object_ids.add(child_obj.id)
-                            print(f"  Match found: Object {obj.id} intersects with leaf object {child_obj.id}")
-                else:
-                    print(f"  Checking non-leaf node {node_counter} with {node['count']} children...")
-                    for child_node_ref in node['children']:
-                        for child_node in rtree_nodes:
-                            if child_node['meta'].id == child_node_ref.id:
-                                stack.append(child_node)
-
-    print(f"Total objects processed: {object_counter}")
-    print(f"Total matches found: {matches}")
 
-    return matches
+def iter_join_chunks(objects, tree, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Probe the R-tree with the objects of A, batch_size objects at a time.
+
+    The (object, node) pairs of a batch are expanded level by level from the root: the entries of every
+    visited node are gathered once from its page (node id = page offset in the mapped file) and tested
+    against all the objects of the batch visiting that node. Leaf entries that intersect are results,
+    directory entries that intersect are the nodes of the next level. Same inclusive test as designs/index.
+
+    Output: a generator of int32 arrays of shape (num_results, 2), each row is (obj id A, obj id B)
+    """
+    ids, low0, high0, low1, high1 = [np.asarray(c) for c in objects]
+    slots = np.arange(tree.objs.shape[1] * tree.objs.shape[2])
+    root_hit = (low0 <= tree.node_high0[0]) & (high0 >= tree.node_low0[0]) & \
+               (low1 <= tree.node_high1[0]) & (high1 >= tree.node_low1[0])
+
+    for start in range(0, len(ids), batch_size):
+        obj = start + np.nonzero(root_hit[start:start + batch_size])[0]
+        node = np.zeros(len(obj), dtype=np.int64)
+        while len(obj) > 0:
+            # read each visited page once, then broadcast its entries to the objects visiting it
+            visited, inverse = np.unique(node, return_inverse=True)
+            entries = tree.objs[visited].reshape(len(visited), -1)
+            valid = (slots[None, :] < tree.count[visited][:, None])[inverse]
+            entry_id = entries['id'][inverse]
+            hit = valid & (low0[obj][:, None] <= entries['high0'][inverse]) & \
+                          (high0[obj][:, None] >= entries['low0'][inverse]) & \
+                          (low1[obj][:, None] <= entries['high1'][inverse]) & \
+                          (high1[obj][:, None] >= entries['low1'][inverse])
+            row, slot = np.nonzero(hit)
+
+            leaf = tree.is_leaf[visited][inverse][row] != 0
+            if np.any(leaf):
+                yield np.stack([ids[obj[row[leaf]]], entry_id[row[leaf], slot[leaf]]], axis=1).astype(np.int32)
+            obj = obj[row[~leaf]]
+            node = entry_id[row[~leaf], slot[~leaf]].astype(np.int64)
+
+
+def join_with_rtree(objects, tree, batch_size=DEFAULT_BATCH_SIZE, count_only=False, output=None):
+    """
+    Index nested-loop join of the objects of A against the R-tree of B.
+
+    Output: the number of results if count_only, else an int32 array of (obj id A, obj id B) rows;
+        with output, the results are streamed to a binary file as the FPGA pair_t {int id_A; int id_B;}
+        and the number of results is returned
+    """
+    num_results = 0
+    results = []
+    f = open(output, 'wb') if output is not None else None
+    try:
+        for chunk in iter_join_chunks(objects, tree, batch_size):
+            num_results += len(chunk)
+            if f is not None:
+                chunk.astype('<i4', copy=False).tofile(f)
+            elif not count_only:
+                results.append(chunk)
+    finally:
+        if f is not None:
+            f.close()
+
+    if count_only or output is not None:
+        return num_results
+    if len(results) == 0:
+        return np.zeros((0, 2), dtype=np.int32)
+    return np.concatenate(results)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Join objects with a spatial R-tree index.")
-    parser.add_argument('--filepathA', type=str, required=True, help="Path to the first binary file")
+    parser.add_argument('--filepathA', type=str, required=True, help="Path to the first file (.bin or .txt)")
     parser.add_argument('--filepathB', type=str, required=True, help="Path to the R-tree file")
+    parser.add_argument('--max_entry', type=int, default=16, help="Maximum number of entries per R-tree node")
+    parser.add_argument('--batch_size', type=int, default=DEFAULT_BATCH_SIZE, help="Objects of A probed together")
+    parser.add_argument('--output', type=str, default=None, help="Write the result pairs to a binary file")
+    parser.add_argument('--verbose', action='store_true', help="Print every node and entry of the R-tree")
 
     args = parser.parse_args()
 
-    # read A
-    bufferA, num_objects_A = read_data_file(args.filepathA)
-    objectsA = parse_data_pages(bufferA, num_objects_A)
+    # page_bytes for the tree
+    page_bytes = (1 + (args.max_entry + MAX_OBJS_PER_PAGE - 1) // MAX_OBJS_PER_PAGE) * PAGE_SIZE_BYTES
+    if args.verbose:
+        read_rtree_file(args.filepathB, page_bytes, verbose=True)
 
-    tree_max_node_entries_count = 16
+    # read A, map tree B
+    objectsA = read_dataset(args.filepathA)
+    treeB = MappedRTree(args.filepathB, page_bytes)
 
-    # page_bytes for the tree
-    page_bytes = (1 + (tree_max_node_entries_count + MAX_OBJS_PER_PAGE - 1) // MAX_OBJS_PER_PAGE) * PAGE_SIZE_BYTES
+    start = time.time()
+    matches = join_with_rtree(objectsA, treeB, args.batch_size, count_only=True, output=args.output)
+    end = time.time()
 
-    # read tree B
-    rtree_nodes = read_rtree_file(args.filepathB, page_bytes)
\ No newline at end of file
+    print(f"Total objects processed: {len(objectsA[0])}")
+    print(f"Total matches found: {matches}")
+    print(f"Join time: {(end - start) * 1000:.2f} ms")
@@ -1,58 +1,179 @@
 import argparse
-
-
-class ObjT:
-    def __init__(self, id, low0, high0, low1, high1):
-        self.id = id
-        self.low0 = low0
-        self.high0 = high0
-        self.low1 = low1
-        self.high1 = high1
-
-
-def read_file(filepath):
-    objects = []
-
-    with open(filepath, 'r') as file:
-        # skip first line (count)
-        next(file)
-
-        for line in file:
-            parts = line.split()
-
-            if len(parts) == 5:
-                id = int(parts[0])
-                low0 = float(parts[1])
-                high0 = float(parts[2])
-                low1 = float(parts[3])
-                high1 = float(parts[4])
-
-                obj = ObjT(id, low0, high0, low1, high1)
-
-                objects.append(obj)
-
-    return objects
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+# shared dataset readers: spatial-join-baseline/python/Index/Bulk_loading.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../spatial-join-baseline/python'))
+from Index.Bulk_loading import read_dataset
+
+# objects per tile, a (BLOCK_A x BLOCK_B) boolean tile stays in the L2 cache
+BLOCK_A = 256
+BLOCK_B = 2048
+
+# per worker process, set by init_worker
+worker_A = None
+worker_B = None
+worker_count_only = False
+worker_strict = False
+
+
+class Blocks:
+    """
+    Objects sorted by low0 and cut into blocks of block_size objects, with the MBR of every block.
+    The sort does not change the join result, it only makes the blocks narrow in x so that
+    block pairs that cannot hold a result are skipped.
+    """
+
+    def __init__(self, objects, block_size):
+        ids, low0, high0, low1, high1 = [np.asarray(c) for c in objects]
+        order = np.argsort(low0, kind='stable')
+        self.ids = ids[order]
+        self.low0 = low0[order]
+        self.high0 = high0[order]
+        self.low1 = low1[order]
+        self.high1 = high1[order]
+        self.block_size = block_size
+
+        starts = np.arange(0, len(self.ids), block_size)
+        self.num_blocks = len(starts)
+        self.block_low0 = self.low0[starts] if self.num_blocks > 0 else np.zeros(0, dtype=np.float32)
+        self.block_high0 = np.maximum.reduceat(self.high0, starts) if self.num_blocks > 0 else np.zeros(0, dtype=np.float32)
+        self.block_low1 = np.minimum.reduceat(self.low1, starts) if self.num_blocks > 0 else np.zeros(0, dtype=np.float32)
+        self.block_high1 = np.maximum.reduceat(self.high1, starts) if self.num_blocks > 0 else np.zeros(0, dtype=np.float32)
+
+    def block(self, i):
+        s = slice(i * self.block_size, (i + 1) * self.block_size)
+        return self.ids[s], self.low0[s], self.high0[s], self.low1[s], self.high1[s]
+
+
+def init_worker(blocks_A, blocks_B, count_only, strict):
+    global worker_A, worker_B, worker_count_only, worker_strict
+    worker_A = blocks_A
+    worker_B = blocks_B
+    worker_count_only = count_only
+    worker_strict = strict
+
+
+def join_block(block_A, blocks_B, count_only, strict=False):
+    """
+    Join one block of A with all the blocks of B, same inclusive intersection test as designs/nested/simple
+    (strict: touching MBRs do not intersect)
+
+    Output: (num_results, results), results is a (k, 2) int32 array of (obj id A, obj id B), empty if count_only
+    """
+    ids_A, low0_A, high0_A, low1_A, high1_A = block_A
+    low0_A, high0_A = low0_A[:, None], high0_A[:, None]
+    low1_A, high1_A = low1_A[:, None], high1_A[:, None]
+    mbr_low0, mbr_high0 = np.amin(low0_A), np.amax(high0_A)
+    mbr_low1, mbr_high1 = np.amin(low1_A), np.amax(high1_A)
+
+    # blocks of B whose MBR intersects the MBR of the block of A
+    candidates = np.nonzero((mbr_low0 <= blocks_B.block_high0) & (mbr_high0 >= blocks_B.block_low0) &
+                            (mbr_low1 <= blocks_B.block_high1) & (mbr_high1 >= blocks_B.block_low1))[0]
+    less, greater = (np.less, np.greater) if strict else (np.less_equal, np.greater_equal)
+
+    num_results = 0
+    results = []
+    tile = None
+    buffer = None
+    for i in candidates.tolist():
+        ids_B, low0_B, high0_B, low1_B, high1_B = blocks_B.block(i)
+        if tile is None or tile.shape[1] != len(ids_B):
+            tile = np.empty((len(ids_A), len(ids_B)), dtype=bool)
+            buffer = np.empty_like(tile)
+        less(low0_A, high0_B, out=tile)
+        tile &= greater(high0_A, low0_B, out=buffer)
+        tile &= less(low1_A, high1_B, out=buffer)
+        tile &= greater(high1_A, low1_B, out=buffer)
+
+        if count_only:
+            num_results += int(np.count_nonzero(tile))
+        else:
+            row, col = np.nonzero(tile)
+            num_results += len(row)
+            if len(row) > 0:
+                results.append(np.stack([ids_A[row], ids_B[col]], axis=1).astype(np.int32))
+
+    results = np.concatenate(results) if len(results) > 0 else np.zeros((0, 2), dtype=np.int32)
+    return num_results, results
+
+
+def join_task(block_id):
+    return join_block(worker_A.block(block_id), worker_B, worker_count_only, worker_strict)
+
+
+def iter_join_chunks(objects_A, objects_B, num_processes=1, count_only=False, strict=False,
+                     block_A=BLOCK_A, block_B=BLOCK_B):
+    """
+    Blocked nested-loop join, the blocks of A are spread over num_processes worker processes
+
+    Output: a generator of (num_results, results) per block of A, in no particular order,
+        results is empty if count_only
+    """
+    blocks_A = Blocks(objects_A, block_A)
+    blocks_B = Blocks(objects_B, block_B)
+
+    if num_processes <= 1:
+        for i in range(blocks_A.num_blocks):
+            yield join_block(blocks_A.block(i), blocks_B, count_only, strict)
+        return
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    with context.Pool(num_processes, initializer=init_worker, initargs=(blocks_A, blocks_B, count_only, strict)) as pool:
+        yield from pool.imap_unordered(join_task, range(blocks_A.num_blocks), chunksize=4)
+
+
+def nested_join(objects_A, objects_B, num_processes=1, count_only=False, strict=False, output=None):
+    """
+    Output: the number of results if count_only, else an int32 array of (obj id A, obj id B) rows;
+        with output, the results are streamed to a binary file as the FPGA pair_t {int id_A; int id_B;}
+        and the number of results is returned
+    """
+    num_results = 0
+    results = []
+    f = open(output, 'wb') if output is not None else None
+    try:
+        for chunk_num_results, chunk in iter_join_chunks(objects_A, objects_B, num_processes,
+                                                         count_only and f is None, strict):
+            num_results += chunk_num_results
+            if f is not None:
+                chunk.astype('<i4', copy=False).tofile(f)
+            elif not count_only:
+                results.append(chunk)
+    finally:
+        if f is not None:
+            f.close()
+
+    if count_only or output is not None:
+        return num_results
+    return np.concatenate(results) if len(results) > 0 else np.zeros((0, 2), dtype=np.int32)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Find intersections between objects in two files.")
-    parser.add_argument('--filepathA', type=str, required=True, help="Path to the first file")
-    parser.add_argument('--filepathB', type=str, required=True, help="Path to the second file")
+    parser.add_argument('--filepathA', type=str, required=True, help="Path to the first file (.txt or .bin)")
+    parser.add_argument('--filepathB', type=str, required=True, help="Path to the second file (.txt or .bin)")
+    parser.add_argument('--num_processes', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--strict', action='store_true', help="Touching MBRs do not intersect")
+    parser.add_argument('--output', type=str, default=None, help="Write the result pairs to a binary file")
 
     args = parser.parse_args()
 
     # read objs
-    objectsA = read_file(args.filepathA)
-    objectsB = read_file(args.filepathB)
-
-    count = 0
-
-    for objA in objectsA:
-        for objB in objectsB:
-            intersects = (objA.low0 < objB.high0 and objA.high0 > objB.low0) and (
-                    objA.low1 < objB.high1 and objA.high1 > objB.low1)
+    objectsA = read_dataset(args.filepathA)
+    objectsB = read_dataset(args.filepathB)
 
-            if intersects:
-                count += 1
+    start = time.time()
+    count = nested_join(objectsA, objectsB, args.num_processes, count_only=True, strict=args.strict,
+                        output=args.output)
+    end = time.time()
 
-    print('Intersections: ' + str(count))
\ No newline at end of file
+    print('Intersections: ' + str(count))
+    print(f"Join time: {(end - start) * 1000:.2f} ms")
@@ -0,0 +1,208 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# shared planner, engines and dataset readers: spatial-join-baseline/python/Index
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../spatial-join-baseline/python'))
+from Index import Join_planner, PBSM
+from Index.Array_RTree import ArrayRTree, MappedRTree, count_results, iter_result_chunks
+from Index.Bulk_loading import get_node_bytes, read_dataset
+from Index.Plane_sweep import sweep_join
+from Index.Tree_generation import index_serialization
+
+from index_join import join_with_rtree
+from nested_join import nested_join
+
+CALIBRATION_SIZES = (5000, 10000, 20000, 50000) # objects of A and B per calibration run
+
+
+def write_pairs(chunks, output):
+    num_results = 0
+    with open(output, 'wb') as f:
+        for chunk in chunks:
+            chunk.astype('<i4', copy=False).tofile(f)
+            num_results += len(chunk)
+    return num_results
+
+
+def save_tree(tree, tree_dir, name, max_entry):
+    # serialize a tree built by the planner, as tree_constructor.py
+    path = os.path.join(tree_dir, f'tree_{name}.bin')
+    index_serialization(tree, get_node_bytes(max_entry), path)
+    return path
+
+
+def mapped_tree(tree, tree_dir, name, max_entry):
+    # index_join reads the pages of the tree file
+    if isinstance(tree, ArrayRTree):
+        return MappedRTree(save_tree(tree, tree_dir, name, max_entry), get_node_bytes(max_entry))
+    return tree
+
+
+def run_plan(planner, plan, tree_dir, output=None, mapped_trees=None):
+    """
+    Run the Python engine of a CPU plan, reusing the trees and partitions of the planner
+
+    Input: mapped_trees: the trees of B already written for index_join, per max_entry
+    Output: the number of results
+    """
+    objects_A, objects_B = planner.objects_A, planner.objects_B
+    if plan['engine'] == 'nested':
+        return nested_join(objects_A, objects_B, num_processes=1, count_only=True, output=output)
+    elif plan['engine'] == 'index':
+        if mapped_trees is None:
+            mapped_trees = {}
+        if plan['max_entry'] not in mapped_trees:
+            mapped_trees[plan['max_entry']] = mapped_tree(planner.get_tree('B', plan['max_entry'])[0], tree_dir,
+                                                          'B', plan['max_entry'])
+        return join_with_rtree(objects_A, mapped_trees[plan['max_entry']], count_only=True, output=output)
+    elif plan['engine'] == 'pbsm':
+        partitions = planner.get_partitions(plan['num_partitions_1d'])[0]
+        if output is not None:
+            return write_pairs(PBSM.iter_join_chunks(objects_A, objects_B, partitions), output)
+        return PBSM.join_partitions(objects_A, objects_B, partitions, count_only=True)
+    tree_A = planner.get_tree('A', plan['max_entry'])[0]
+    tree_B = planner.get_tree('B', plan['max_entry'])[0]
+    if output is not None:
+        return write_pairs(iter_result_chunks(tree_A, tree_B), output)
+    return count_results(tree_A, tree_B)
+
+
+def calibrate_cpu(objects_A, objects_B, tree_dir, rng):
+    """
+    Time the Python engines on samples of A and B of CALIBRATION_SIZES objects, and fit the
+        CPU coefficients on the work of the planner
+
+    Output: the 'cpu' part of a cost model
+    """
+    samples = {engine: [] for engine in Join_planner.ENGINES}
+    for size in CALIBRATION_SIZES:
+        sample_A = PBSM.sample_objects(objects_A, min(size, len(objects_A[0])), rng)
+        sample_B = PBSM.sample_objects(objects_B, min(size, len(objects_B[0])), rng)
+        planner = Join_planner.JoinPlanner(sample_A, sample_B, target='cpu', rng=rng)
+        for engine in Join_planner.ENGINES:
+            plan = {'engine': engine, 'max_entry': 16, 'num_partitions_1d': 10}
+            # builds the trees and partitions before timing
+            work, _ = planner.workload(engine, plan['max_entry'], plan['num_partitions_1d'])
+            mapped_trees = {16: mapped_tree(planner.get_tree('B', 16)[0], tree_dir, 'B', 16)}
+            start = time.time()
+            run_plan(planner, plan, tree_dir, mapped_trees=mapped_trees)
+            time_ms = (time.time() - start) * 1000
+            samples[engine].append((work, time_ms))
+            print(f"{engine}, {len(sample_A[0])} x {len(sample_B[0])}: {time_ms:.2f} ms")
+
+    cost_model = {}
+    for engine, engine_samples in samples.items():
+        works, times_ms = zip(*engine_samples)
+        cost_model[engine] = {1: Join_planner.fit_coefficients(works, times_ms, Join_planner.FEATURES['cpu'][engine])}
+    return cost_model
+
+
+def print_stats(name, stats):
+    print(f"Dataset {name}: {stats['num_objects']} objects")
+    if stats['num_objects'] > 0:
+        print(f"    extent: x [{stats['extent'][0]:.6f}, {stats['extent'][1]:.6f}], "
+              f"y [{stats['extent'][2]:.6f}, {stats['extent'][3]:.6f}]")
+        print(f"    width (p{'/p'.join(str(q) for q in Join_planner.QUANTILES)}): "
+              f"{' / '.join(f'{w:.6f}' for w in stats['width'])}")
+        print(f"    height (p{'/p'.join(str(q) for q in Join_planner.QUANTILES)}): "
+              f"{' / '.join(f'{h:.6f}' for h in stats['height'])}")
+        print(f"    skew: {stats['skew']:.2f}, occupied cells: {100 * stats['occupancy']:.1f}%")
+
+
+def format_plan(plan):
+    params = [f"{name} {plan[name]}" for name in ('max_entry', 'num_partitions_1d', 'max_comparisons_per_partition')
+              if plan[name] is not None]
+    return f"{plan['design']}, {plan['num_PEs']} PE(s){''.join(', ' + p for p in params)}"
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Pick the join engine and its parameters from a calibrated cost model, '
+                                                 'then run it (cpu) or print the FPGA host command (fpga).')
+    parser.add_argument('data_file_A', type=str, help='Dataset A (.txt or .bin).')
+    parser.add_argument('data_file_B', type=str, help='Dataset B (.txt or .bin).')
+    parser.add_argument('--target', type=str, default='fpga', choices=Join_planner.TARGETS, help='Plan for the FPGA designs or the Python engines.')
+    parser.add_argument('--engines', type=str, nargs='+', default=list(Join_planner.ENGINES), choices=Join_planner.ENGINES,
+                        help='Engines to choose from.')
+    parser.add_argument('--tree_A', type=str, default=None, help='Existing R-tree of A (sync_traversal).')
+    parser.add_argument('--tree_B', type=str, default=None, help='Existing R-tree of B (index, sync_traversal).')
+    parser.add_argument('--tree_max_entry', type=int, default=16, help='Max entries per node of --tree_A and --tree_B.')
+    parser.add_argument('--tree_dir', type=str, default='.', help='Folder of the trees built for the chosen plan (tree_A.bin, tree_B.bin).')
+    parser.add_argument('--costs', type=str, default=None, help='Cost model (JSON), default: Join_planner.DEFAULT_COST_MODEL.')
+    parser.add_argument('--calibrate', type=str, default=None,
+                        help='Fit the cost model (FPGA: measured experiments, CPU: timed on samples of A and B), save it to this file and exit.')
+    parser.add_argument('--top', type=int, default=10, help='Number of candidate plans to print.')
+    parser.add_argument('--output', type=str, default=None, help='cpu: write the result pairs as pair_t to this file.')
+    parser.add_argument('--skip_join', action='store_true', help='cpu: only plan.')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the samples.')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    rng = np.random.default_rng(args.seed)
+
+    print("Reading files...")
+    objects_A = read_dataset(args.data_file_A)
+    objects_B = read_dataset(args.data_file_B)
+
+    if args.calibrate is not None:
+        cost_model = {'fpga': Join_planner.calibrate_fpga(verbose=True),
+                      'cpu': calibrate_cpu(PBSM.filter_invalid_objects(objects_A),
+                                           PBSM.filter_invalid_objects(objects_B), args.tree_dir, rng)}
+        Join_planner.save_cost_model(cost_model, args.calibrate)
+        print(f"Cost model saved to {args.calibrate}")
+        sys.exit(0)
+
+    cost_model = Join_planner.load_cost_model(args.costs) if args.costs is not None else None
+    node_bytes = get_node_bytes(args.tree_max_entry)
+    tree_A = MappedRTree(args.tree_A, node_bytes) if args.tree_A is not None else None
+    tree_B = MappedRTree(args.tree_B, node_bytes) if args.tree_B is not None else None
+
+    start = time.time()
+    planner = Join_planner.JoinPlanner(objects_A, objects_B, args.target, cost_model, tree_A, tree_B,
+                                       args.tree_max_entry, rng=rng)
+    plans = planner.candidates(args.engines)
+    plan_ms = (time.time() - start) * 1000
+
+    print_stats('A', planner.stats_A)
+    print_stats('B', planner.stats_B)
+    print(f"Estimated results: {planner.estimate['estimate']:.0f} (standard error {planner.estimate['std_error']:.0f})")
+    print(f"Candidate plans ({len(plans)}):")
+    for plan in plans[:args.top]:
+        print(f"    {plan['time_ms']:12.2f} ms (prepare {plan['prepare_ms']:.2f} ms): {format_plan(plan)}")
+    if len(plans) == 0:
+        print(f"No {args.target} design of {args.engines} in the cost model")
+        sys.exit(1)
+    plan = plans[0]
+    print(f"Chosen plan: {format_plan(plan)}, predicted {plan['time_ms']:.2f} ms")
+    print(f"TIME[plan_time]: {plan_ms:.2f} ms.")
+
+    if args.target == 'fpga':
+        tree_files = {'A': args.tree_A, 'B': args.tree_B}
+        needed = {'index': ['B'], 'sync_traversal': ['A', 'B']}.get(plan['engine'], [])
+        for name in needed:
+            if tree_files[name] is None:
+                os.makedirs(args.tree_dir, exist_ok=True)
+                tree_files[name] = save_tree(planner.get_tree(name, plan['max_entry'])[0], args.tree_dir,
+                                             name, plan['max_entry'])
+                print(f"Tree {name} written to {tree_files[name]}")
+        # the kernels do not check the bounds of the result buffer: size it exactly, not by the estimate
+        plan = dict(plan, max_num_results=sweep_join(objects_A, objects_B, count_only=True))
+        print(f"Number of results: {plan['max_num_results']}")
+        design_dir, command, swapped = Join_planner.host_command(
+            plan, os.path.abspath(args.data_file_A), os.path.abspath(args.data_file_B),
+            *[os.path.abspath(tree_files[name]) if tree_files[name] is not None else None for name in ('A', 'B')])
+        print(f"Host folder: {os.path.normpath(design_dir)}")
+        print(f"Command: {command}")
+        if swapped:
+            print("Note: tree A is deeper than tree B and is passed second, the results are (obj id B, obj id A) pairs")
+    elif not args.skip_join:
+        os.makedirs(args.tree_dir, exist_ok=True)
+        start = time.time()
+        num_results = run_plan(planner, plan, args.tree_dir, args.output)
+        print(f"TIME[cpu_join_time]: {(time.time() - start) * 1000:.2f} ms.")
+        print(f"RESULTS: {num_results}")
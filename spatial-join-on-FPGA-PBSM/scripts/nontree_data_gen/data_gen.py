@@ -1,10 +1,18 @@
 import os
+import sys
 import numpy as np
 import argparse
 
 from shapely.geometry import Polygon, box
 from typing import Optional
 
+# shared dataset writers: spatial-join-baseline/python/Index/Dataset_writer.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../spatial-join-baseline/python'))
+from Index import Dataset_writer
+
+# folder (in <out_file_dir>/<distribution>) and extension of each output format
+OUTPUT_FILES = {'txt': ('txt', '.txt'), 'bin': ('bin', '.bin'), 'columnar': ('col', '.col')}
+
 
 class RandomPointGenerator:
     def __init__(self, distribution: str, map_edge_len: float, obj_edge_len: float, mean: float, stddev: float,
@@ -40,7 +48,23 @@ class RandomPointGenerator:
         bounds = clipped_polygon.bounds
         return [bounds[0], bounds[2], bounds[1], bounds[3]]
 
-    def generate_polygons(self, num_obj: int, out_file_dir: str, seed: Optional[int] = 123, file_id: Optional[int] = 0, set: Optional[int] = 0):
+    def write_objects(self, num_obj, ids, coords, out_file_dir, file_suffix, formats=('txt', 'bin')):
+        # ids and [x_low, x_high, y_low, y_high] of the objects left after clipping
+        ids = np.asarray(ids, dtype=np.int64)
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 4)
+        for file_format in formats:
+            folder, extension = OUTPUT_FILES[file_format]
+            os.makedirs(os.path.join(out_file_dir, self.distribution, folder), exist_ok=True)
+            file_path = os.path.join(out_file_dir, self.distribution, folder, file_suffix + extension)
+            if file_format == 'txt':
+                columns = {'obj_id': ids, 'x_low': coords[:, 0], 'x_high': coords[:, 1], 'y_low': coords[:, 2], 'y_high': coords[:, 3]}
+                Dataset_writer.write_text_file(file_path, Dataset_writer.TEXT_FORMATS['C']['polygon'], columns, f"{num_obj}\n")
+            else:
+                # same float32 as txt_to_bin.py on the txt file
+                Dataset_writer.write_binary_file(file_path, file_format, ids, coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+
+    def generate_polygons(self, num_obj: int, out_file_dir: str, seed: Optional[int] = 123, file_id: Optional[int] = 0, set: Optional[int] = 0,
+                          formats=('txt', 'bin')):
         np.random.seed(seed)
 
         if self.distribution == "uniform":
@@ -96,16 +120,8 @@ class RandomPointGenerator:
                 polygons.append(None)
 
         file_suffix = f"{self.distribution}_{num_obj}_polygon_file_{file_id}_set_{set}"
-        file_path = os.path.join(out_file_dir, self.distribution, "txt", file_suffix + ".txt")
-        with open(file_path, "w+") as f_C:
-            f_C.write(f"{num_obj}\n")
-
-            for obj_id, coords in enumerate(polygons):
-                if coords is None:
-                    continue
-
-                f_C.write("{obj_id} {x_low:.2f} {x_high:.2f} {y_low:.2f} {y_high:.2f}\n".format(
-                    obj_id=obj_id, x_low=coords[0], x_high=coords[1], y_low=coords[2], y_high=coords[3]))
+        ids = [obj_id for obj_id, coords in enumerate(polygons) if coords is not None]
+        self.write_objects(num_obj, ids, [polygons[obj_id] for obj_id in ids], out_file_dir, file_suffix, formats)
 
 
 if __name__ == "__main__":
@@ -127,6 +143,8 @@ if __name__ == "__main__":
     parser.add_argument('--rotation_angle', type=float, default=0.0, help="rotation angle in degrees")
     parser.add_argument('--rotation_center_x', type=float, default=0.0, help="x-coord of the rotation center")
     parser.add_argument('--rotation_center_y', type=float, default=0.0, help="y-coord of the rotation center")
+    parser.add_argument('--formats', type=str, nargs='+', default=['txt', 'bin'], choices=list(OUTPUT_FILES.keys()),
+                        help="output formats, written to <out_file_dir>/<distribution>/{txt,bin,col}")
 
     args = parser.parse_args()
 
@@ -142,6 +160,6 @@ if __name__ == "__main__":
         rotation_center_x=args.rotation_center_x,
         rotation_center_y=args.rotation_center_y
     )
-    rpg.generate_polygons(args.num_obj, args.out_file_dir, args.seed, args.file_id, args.set)
+    rpg.generate_polygons(args.num_obj, args.out_file_dir, args.seed, args.file_id, args.set, args.formats)
 
     print("Data generation done!")
@@ -1,72 +1,34 @@
 import argparse
-import struct
+import multiprocessing
+import os
+import sys
 
+# shared text parser and FPGA page codec: spatial-join-baseline/python/Index
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../spatial-join-baseline/python'))
+from Index import Page_codec
+from Index.Bulk_loading import DEFAULT_CHUNK_BYTES, iter_C_file_chunks
 
-class ObjT:
-    def __init__(self, id, low0, high0, low1, high1):
-        self.id = id
-        self.low0 = low0
-        self.high0 = high0
-        self.low1 = low1
-        self.high1 = high1
 
+def convert_txt_to_bin(txt_filepath, bin_filepath, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    # stream the txt file chunk by chunk into 64-byte pages, the header count is written last
+    with Page_codec.DataFileWriter(bin_filepath) as writer:
+        for ids, low0, high0, low1, high1 in iter_C_file_chunks(txt_filepath, chunk_bytes):
+            writer.write(ids, low0, high0, low1, high1)
+    return writer.num_objects
 
-def pad_to_64_bytes(data):
-    padding_length = 64 - (len(data) % 64)
 
-    # no padding needed (not really used but just in case)
-    if padding_length == 64:
-        return data
+def convert_task(task):
+    txt_filepath, bin_filepath, chunk_bytes = task
+    return txt_filepath, bin_filepath, convert_txt_to_bin(txt_filepath, bin_filepath, chunk_bytes)
 
-    # pad with zeros
-    return data + b'\x00' * padding_length
 
-
-def read_txt(txt_file_path):
-    objects = []
-
-    with open(txt_file_path, 'r') as file:
-        next(file)
-
-        for line in file:
-            parts = line.split()
-
-            # read only rows that
-            if len(parts) == 5:
-                obj = ObjT(int(parts[0]), float(parts[1]), float(parts[2]), float(parts[3]), float(parts[4]))
-                objects.append(obj)
-
-    return objects
-
-
-def write_binary_file(objects, binary_file_path):
-    with open(binary_file_path, 'wb') as file:
-        num_objects_data = struct.pack('i', len(objects))
-        padded_num_objects_data = pad_to_64_bytes(num_objects_data)
-        # write number of objects (padded)
-        file.write(padded_num_objects_data)
-
-        # write pages of objects, each 'page' is a group of 3 objects
-        data = b''
-        for i, obj in enumerate(objects):
-            # pack: int, float, float, float, float
-            obj_data = struct.pack('iffff', obj.id, obj.low0, obj.high0, obj.low1, obj.high1)
-
-            # collect binary data
-            data += obj_data
-
-            # add padding and write (after every 3rd obj)
-            if (i + 1) % 3 == 0 or i == len(objects) - 1:
-                padded_data = pad_to_64_bytes(data)
-                file.write(padded_data)
-
-                # reset the collector
-                data = b''
-
-
-def convert_txt_to_bin(txt_filepath, bin_filepath):
-    objects = read_txt(txt_filepath)
-    write_binary_file(objects, bin_filepath)
+def convert_files(tasks, num_processes):
+    # one file per worker process, the results in the order of the files
+    if num_processes <= 1:
+        yield from map(convert_task, tasks)
+        return
+    with multiprocessing.Pool(num_processes) as pool:
+        yield from pool.imap(convert_task, tasks)
 
 
 # Example usage
@@ -74,12 +36,18 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Convert TXT files to BIN format.")
     parser.add_argument('--txt_files', nargs='+', help="List of TXT file paths", required=True)
     parser.add_argument('--bin_files', nargs='+', help="List of corresponding BIN file paths", required=True)
+    parser.add_argument('--num_processes', type=int, default=None, help="Files converted in parallel, min(number of files, CPUs) by default")
+    parser.add_argument('--chunk_mb', type=int, default=DEFAULT_CHUNK_BYTES >> 20, help="MB of text parsed at once")
 
     args = parser.parse_args()
 
     if len(args.txt_files) != len(args.bin_files):
         raise ValueError("The number of txt files and bin files must match.")
+    if args.chunk_mb <= 0:
+        parser.error('--chunk_mb must be positive')
+
+    tasks = [(txt_filepath, bin_filepath, args.chunk_mb << 20) for txt_filepath, bin_filepath in zip(args.txt_files, args.bin_files)]
+    num_processes = args.num_processes if args.num_processes is not None else min(len(tasks), multiprocessing.cpu_count())
 
-    for txt_filepath, bin_filepath in zip(args.txt_files, args.bin_files):
-        convert_txt_to_bin(txt_filepath, bin_filepath)
-        print(f"Converted {txt_filepath} to {bin_filepath}")
\ No newline at end of file
+    for txt_filepath, bin_filepath, num_objects in convert_files(tasks, num_processes):
+        print(f"Converted {txt_filepath} to {bin_filepath} ({num_objects} objects)")
@@ -0,0 +1,153 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# shared PBSM engine and dataset readers: spatial-join-baseline/python/Index
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../spatial-join-baseline/python'))
+from Index import PBSM, Result_pairs
+from Index.Bulk_loading import read_dataset
+from Index.Plane_sweep import PAIR_KERNELS
+
+
+class StageTimer:
+    # elapsed ms of the steps of host_partition, named after the TIME[...] keys of the host
+    def __init__(self):
+        self.last = time.time()
+        self.times = {}
+
+    def __call__(self, name):
+        now = time.time()
+        self.times[name] = (now - self.last) * 1000
+        self.last = now
+
+
+def print_partition_stats(partitions, map_stats, buffers):
+    count_A, count_B = partitions.count_A, partitions.count_B
+    print(f"Minimum cell size (X): {map_stats[0]:.20f}")
+    print(f"Minimum cell size (Y): {map_stats[1]:.20f}")
+    print(f"Num final partitions: {partitions.num_partitions}")
+    if partitions.num_partitions > 0:
+        print(f"Average count of A: {np.mean(count_A):.2f}")
+        print(f"Average count of B: {np.mean(count_B):.2f}")
+    print(f"Total pages of A: {len(buffers['partitions_A'])}")
+    print(f"Total pages of B: {len(buffers['partitions_B'])}")
+    print(f"Total count of A: {int(np.sum(count_A))}")
+    print(f"Total count of B: {int(np.sum(count_B))}")
+    if partitions.num_partitions > 0:
+        comparisons = count_A.astype(np.int64) * count_B
+        print(f"Max count of A: {int(np.amax(count_A))}")
+        print(f"Max count of B: {int(np.amax(count_B))}")
+        print(f"Total comparisons: {int(np.sum(comparisons))}")
+        print(f"Max comparisons of a partition: {int(np.amax(comparisons))}")
+
+
+def write_chunks(chunks, f):
+    for chunk in chunks:
+        chunk.astype('<i4', copy=False).tofile(f)
+        yield chunk
+
+
+def stream_join(objects_A, objects_B, partitions, pair_kernel, dedup, output=None):
+    """
+    Join chunk by chunk, the pairs are written to output (pair_t) and hashed, never kept
+
+    Output: the fingerprint of the results, (num_results, checksum)
+    """
+    f = open(output, 'wb') if output is not None else None
+    try:
+        chunks = PBSM.iter_join_chunks(objects_A, objects_B, partitions, pair_kernel, dedup)
+        if f is not None:
+            chunks = write_chunks(chunks, f)
+        return Result_pairs.fingerprint(chunks)
+    finally:
+        if f is not None:
+            f.close()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='PBSM join on the CPU, same partitioning as designs/pbsm/host_code.')
+    parser.add_argument('data_file_A', type=str, help='Dataset A (.txt or .bin).')
+    parser.add_argument('data_file_B', type=str, help='Dataset B (.txt or .bin).')
+    parser.add_argument('num_partitions_1d', type=int, nargs='?', default=10, help='Initial grid cells per dimension.')
+    parser.add_argument('max_comparisons_per_partition', type=int, nargs='?', default=1000, help='|A| x |B| budget of a partition.')
+    parser.add_argument('--kernel', type=str, default=None, choices=list(PAIR_KERNELS.keys()), help='Per-partition join kernel, default: nested loop over all partitions at once.')
+    parser.add_argument('--dedup', type=str, default='reference_point', choices=PBSM.DEDUP_MODES,
+                        help='Cells reporting a pair: reference_point (each result once), join_unit (same count as '
+                             'the FPGA, pairs on a shared cell border twice) or none.')
+    parser.add_argument('--output', type=str, default=None, help='Write the result pairs as pair_t to this file.')
+    parser.add_argument('--verify', type=str, default=None, help='Compare the results with this result file.')
+    parser.add_argument('--kernel_output', action='store_true',
+                        help='The --verify file is a dump of the kernel output buffer (count, then the pairs).')
+    parser.add_argument('--plan', action='store_true', help='Plan the refinement from a sample (PBSM.plan_partitions).')
+    parser.add_argument('--sample_fraction', type=float, default=0.1, help='Sampled share of each dataset for --plan.')
+    parser.add_argument('--layout', type=str, default=None, help='Apply a saved partition layout instead of planning.')
+    parser.add_argument('--save_layout', type=str, default=None, help='Save the planned partition layout (.npz).')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the sample for the minimum cell size.')
+    parser.add_argument('--pages_dir', type=str, default=None, help='Write the FPGA input buffers (partitions_A/B.bin, meta_A/B.bin) to this folder.')
+    parser.add_argument('--skip_join', action='store_true', help='Only partition (and write the pages).')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    print("Reading files...")
+    objects_A = PBSM.filter_invalid_objects(read_dataset(args.data_file_A))
+    objects_B = PBSM.filter_invalid_objects(read_dataset(args.data_file_B))
+    print(f"Size A: {len(objects_A[0])}")
+    print(f"Size B: {len(objects_B[0])}")
+
+    timer = StageTimer()
+    rng = np.random.default_rng(args.seed)
+    if args.plan or args.layout is not None:
+        if args.layout is not None:
+            layout = PBSM.PartitionLayout.load(args.layout)
+        else:
+            layout = PBSM.plan_partitions(objects_A, objects_B, args.num_partitions_1d,
+                                          args.max_comparisons_per_partition, args.sample_fraction, rng=rng)
+        # the plan includes the grid init
+        timer('init')
+        print(f"Planned cells: {layout.num_cells} ({len(layout.splits)} rounds of splits)")
+        if args.save_layout is not None:
+            layout.save(args.save_layout)
+        partitions = PBSM.apply_layout(objects_A, objects_B, layout, args.max_comparisons_per_partition, timer)
+        map_stats = layout.map_stats
+    else:
+        partitions, map_stats = PBSM.host_partition(objects_A, objects_B, args.num_partitions_1d,
+                                                    args.max_comparisons_per_partition, rng, timer)
+    buffers = PBSM.prepare_partitions(objects_A, objects_B, partitions)
+    timer('prepare')
+    print_partition_stats(partitions, map_stats, buffers)
+
+    if args.pages_dir is not None:
+        PBSM.write_partition_pages(args.pages_dir, buffers)
+        print(f"Kernel arguments: num_partitions {partitions.num_partitions}, "
+              f"num_meta_pages {len(buffers['meta_A'])}, pages A {len(buffers['partitions_A'])}, "
+              f"pages B {len(buffers['partitions_B'])}")
+
+    print(f"TIME[cpu_init_time]: {timer.times['init']:.2f} ms.")
+    print(f"TIME[cpu_partition_time]: {timer.times['partition']:.2f} ms.")
+    print(f"TIME[cpu_refine_time]: {timer.times['refine']:.2f} ms.")
+    print(f"TIME[cpu_prepare_time]: {timer.times['prepare']:.2f} ms.")
+    print(f"TIME[cpu_time]: {sum(timer.times[s] for s in ['init', 'partition', 'refine', 'prepare']):.2f} ms.")
+
+    if not args.skip_join:
+        pair_kernel = PAIR_KERNELS[args.kernel] if args.kernel is not None else None
+        timer.last = time.time()
+        if args.output is None and args.verify is None:
+            num_results = PBSM.join_partitions(objects_A, objects_B, partitions, count_only=True,
+                                               pair_kernel=pair_kernel, dedup=args.dedup)
+        else:
+            num_results, checksum = stream_join(objects_A, objects_B, partitions, pair_kernel, args.dedup, args.output)
+        timer('join')
+        print(f"TIME[cpu_join_time]: {timer.times['join']:.2f} ms.")
+        print(f"RESULTS: {num_results}")
+
+        if args.verify is not None:
+            expected = (num_results, checksum)
+            found = Result_pairs.fingerprint(Result_pairs.iter_pair_file(args.verify, args.kernel_output))
+            print(f"Verify {args.verify}: {found[0]} results, "
+                  f"{'MATCH' if found == expected else 'MISMATCH'} (checksum {found[1]:016x}, expected {expected[1]:016x})")
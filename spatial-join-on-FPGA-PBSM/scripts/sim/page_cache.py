@@ -0,0 +1,183 @@
+import argparse
+from collections import OrderedDict
+import heapq
+import json
+import os
+import sys
+
+import numpy as np
+
+# shared tree and dataset readers: spatial-join-baseline/python/Index
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../spatial-join-baseline/python'))
+from Index.Array_RTree import MappedRTree
+from Index.Bulk_loading import get_node_bytes, read_dataset
+from Index.Tree_statistics import node_levels
+
+POLICIES = ['lru', 'lfu', 'pin']
+
+DEFAULT_CACHE_SIZES = [16, 32, 64, 128, 256, 512, 1024, 2048, 4096]
+
+
+def probe_sequence(objects, tree, num_PEs=1):
+    """
+    Node ids requested from the tree memory controller by the join units of designs/index.
+
+    Per probe object, a join unit starts from the root and keeps a FIFO of nodes to fetch: every fetched
+    node whose MBR intersects the object enqueues its intersecting children (join_unit in PEs.hpp).
+    The sequence is built level by level for all the objects at once, then sorted per object.
+
+    With several PEs, the objects are handed out page by page (3 objects) round-robin and the requests of
+    the PEs are interleaved one node at a time.
+    """
+    _, low0, high0, low1, high1 = objects
+    low0, high0, low1, high1 = [np.asarray(c, dtype=np.float32) for c in (low0, high0, low1, high1)]
+
+    levels_obj = []
+    levels_node = []
+    obj = np.arange(len(low0))
+    node = np.zeros(len(low0), dtype=np.int64)  # root
+    while len(obj) > 0:
+        levels_obj.append(obj)
+        levels_node.append(node)
+
+        # fetched nodes whose MBR intersects the object, only directory nodes enqueue children
+        hit = (low0[obj] <= tree.node_high0[node]) & (high0[obj] >= tree.node_low0[node]) & \
+              (low1[obj] <= tree.node_high1[node]) & (high1[obj] >= tree.node_low1[node]) & \
+              (tree.is_leaf[node] == 0)
+        obj, node = obj[hit], node[hit]
+
+        # expand (object, node) to (object, entry), in FIFO order
+        count = tree.count[node].astype(np.int64)
+        entry_obj = np.repeat(obj, count)
+        entry = np.repeat(tree.entry_offset[node] - np.cumsum(count) + count, count) + np.arange(np.sum(count))
+        hit = (low0[entry_obj] <= tree.high0[entry]) & (high0[entry_obj] >= tree.low0[entry]) & \
+              (low1[entry_obj] <= tree.high1[entry]) & (high1[entry_obj] >= tree.low1[entry])
+        obj, node = entry_obj[hit], tree.ids[entry[hit]].astype(np.int64)
+
+    obj = np.concatenate(levels_obj)
+    node = np.concatenate(levels_node)
+    # level-major -> object-major, the stable sort keeps the FIFO order of each object
+    order = np.argsort(obj, kind='stable')
+    obj, node = obj[order], node[order]
+
+    if num_PEs > 1:
+        PE = (obj // 3) % num_PEs
+        # position of each request in the stream of its PE
+        order = np.argsort(PE, kind='stable')
+        position = np.empty(len(PE), dtype=np.int64)
+        PE_sorted = PE[order]
+        PE_start = np.searchsorted(PE_sorted, PE_sorted)
+        position[order] = np.arange(len(PE)) - PE_start
+        node = node[np.lexsort((PE, position))]
+
+    return node
+
+
+def simulate_lru(sequence, cache_size):
+    cache = OrderedDict()
+    hits = 0
+    for node in sequence.tolist():
+        if node in cache:
+            hits += 1
+            cache.move_to_end(node)
+        else:
+            if len(cache) >= cache_size:
+                cache.popitem(last=False)
+            cache[node] = True
+    return hits
+
+
+def simulate_lfu(sequence, cache_size):
+    # evict the cached node with the fewest accesses since it was cached, the least recently used on ties
+    frequency = {}
+    last_access = {}
+    heap = []  # (frequency, last access, node), outdated entries are skipped when popped
+    hits = 0
+    for time, node in enumerate(sequence.tolist()):
+        if node in frequency:
+            hits += 1
+            frequency[node] += 1
+        else:
+            while len(frequency) >= cache_size:
+                f, t, victim = heapq.heappop(heap)
+                if frequency.get(victim) == f and last_access[victim] == t:
+                    del frequency[victim]
+            frequency[node] = 1
+        last_access[node] = time
+        heapq.heappush(heap, (frequency[node], time, node))
+    return hits
+
+
+def simulate_pin(sequence, cache_size, level_sizes):
+    # pin all the nodes of the top levels that fit in the cache (node ids are in BFS order), no replacement
+    pinned = 0
+    for level_size in level_sizes:
+        if pinned + level_size > cache_size:
+            break
+        pinned += level_size
+    return int(np.count_nonzero(sequence < pinned)), pinned
+
+
+def simulate(sequence, policy, cache_size, level_sizes):
+    if cache_size <= 0:
+        raise ValueError(f"Cache size must be positive, got {cache_size}")
+    if policy == 'lru':
+        return simulate_lru(sequence, cache_size)
+    elif policy == 'lfu':
+        return simulate_lfu(sequence, cache_size)
+    elif policy == 'pin':
+        return simulate_pin(sequence, cache_size, level_sizes)[0]
+    else:
+        raise ValueError(f"Unknown policy {policy}, must be one of {POLICIES}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Simulate the node cache of the index nested-loop join designs.')
+    parser.add_argument('--filepathA', type=str, required=True, help='Probe dataset A (.bin or .txt).')
+    parser.add_argument('--filepathB', type=str, required=True, help='R-tree file of dataset B.')
+    parser.add_argument('--max_entry', type=int, default=16, help='Maximum number of entries per R-tree node.')
+    parser.add_argument('--num_PEs', type=int, default=1, help='Number of join units sharing the cache.')
+    parser.add_argument('--cache_sizes', type=int, nargs='+', default=DEFAULT_CACHE_SIZES, help='Cache sizes in nodes.')
+    parser.add_argument('--policies', type=str, nargs='+', default=POLICIES, choices=POLICIES, help='Cache policies.')
+    parser.add_argument('--output', type=str, default=None, help='Save the results as JSON.')
+    args = parser.parse_args()
+    if any(cache_size <= 0 for cache_size in args.cache_sizes):
+        parser.error('--cache_sizes must be positive')
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    page_bytes = get_node_bytes(args.max_entry)
+    tree = MappedRTree(args.filepathB, page_bytes).to_array_tree()
+    level_sizes = [len(level) for level in node_levels(tree)]
+    sequence = probe_sequence(read_dataset(args.filepathA), tree, args.num_PEs)
+
+    num_requests = len(sequence)
+    print(f"Tree: {tree.num_nodes} nodes, {page_bytes} bytes per node, nodes per level: {level_sizes}")
+    print(f"Node requests: {num_requests}, distinct nodes: {len(np.unique(sequence))}")
+    print(f"DRAM reads without cache: {num_requests} nodes, {num_requests * page_bytes} bytes")
+
+    results = []
+    for policy in args.policies:
+        for cache_size in args.cache_sizes:
+            hits = simulate(sequence, policy, cache_size, level_sizes)
+            result = {
+                'policy': policy,
+                'cache_size_nodes': cache_size,
+                'cache_size_bytes': cache_size * page_bytes,
+                'requests': num_requests,
+                'hits': hits,
+                'hit_rate': hits / num_requests if num_requests > 0 else 0.0,
+                'dram_node_reads': num_requests - hits,
+                'dram_bytes_saved': hits * page_bytes,
+            }
+            print(f"{policy:4s} {cache_size:6d} nodes ({result['cache_size_bytes'] / 1024:.1f} KB): "
+                  f"hit rate {result['hit_rate']:.4f}, DRAM node reads {result['dram_node_reads']}, "
+                  f"saved {result['dram_bytes_saved'] / 1024 / 1024:.2f} MB")
+            results.append(result)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
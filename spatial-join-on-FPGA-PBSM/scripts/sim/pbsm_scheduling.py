@@ -0,0 +1,233 @@
+import argparse
+from collections import deque
+import json
+import os
+import sys
+
+import numpy as np
+
+# shared dataset readers: spatial-join-baseline/python/Index/Bulk_loading.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../spatial-join-baseline/python'))
+from Index.Bulk_loading import read_dataset
+
+MICRO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../experiments/micro')
+
+FPGA_FREQ_MHZ = 200
+MAX_OBJS_PER_PAGE = 3
+DATA_FIFO_PAGES = 512  # depth of scheduled_data_stream_raw_A/B
+
+POLICIES = ['static', 'lpt', 'dynamic']
+
+DEFAULT_COSTS = {
+    'cycles_per_pair': 1.0,      # join unit, per object pair of a partition
+    'cycles_per_page': 1.0,      # scheduler, per 64-byte data page forwarded to a PE
+    'partition_latency': 10,     # join unit, per partition (meta read, pipeline fill)
+}
+
+
+def load_micro_costs(micro_dir=MICRO_DIR):
+    # per-unit costs of the PBSM (meta) read and join units measured by experiments/micro
+    costs = dict(DEFAULT_COSTS)
+    with open(os.path.join(micro_dir, 'micro_read.json')) as f:
+        costs['cycles_per_page'] = float(np.mean([r['cycles_per_page'] for r in json.load(f)['meta']]))
+    with open(os.path.join(micro_dir, 'micro_join.json')) as f:
+        costs['cycles_per_pair'] = float(np.mean([r['cycles_per_pair'] for r in json.load(f)['meta']]))
+    return costs
+
+
+def read_workload(filepath):
+    # one partition per line: "count_A count_B"
+    counts = np.loadtxt(filepath, dtype=np.int64, ndmin=2)
+    return counts[:, 0], counts[:, 1]
+
+
+def grid_workload(dataset_A, dataset_B, num_partitions_1d):
+    """
+    Per-cell object counts of a uniform num_partitions_1d x num_partitions_1d grid over the map,
+    an object is counted in every cell its MBR overlaps (same cell indexing as partition_objects),
+    cells without objects on both sides are dropped as the host does
+    """
+    _, low0_A, high0_A, low1_A, high1_A = dataset_A
+    _, low0_B, high0_B, low1_B, high1_B = dataset_B
+    min_x = min(np.amin(low0_A), np.amin(low0_B))
+    max_x = max(np.amax(high0_A), np.amax(high0_B))
+    min_y = min(np.amin(low1_A), np.amin(low1_B))
+    max_y = max(np.amax(high1_A), np.amax(high1_B))
+    cell_width = (max_x - min_x) / num_partitions_1d
+    cell_height = (max_y - min_y) / num_partitions_1d
+
+    def count_cells(low0, high0, low1, high1):
+        x_min = np.maximum(0, ((low0 - min_x) / cell_width).astype(np.int64))
+        x_max = np.minimum(num_partitions_1d - 1, ((high0 - min_x) / cell_width).astype(np.int64))
+        y_min = np.maximum(0, ((low1 - min_y) / cell_height).astype(np.int64))
+        y_max = np.minimum(num_partitions_1d - 1, ((high1 - min_y) / cell_height).astype(np.int64))
+        # 2D difference array: +1 at the lower corner of the covered cell range, -1 past it
+        diff = np.zeros((num_partitions_1d + 1, num_partitions_1d + 1), dtype=np.int64)
+        np.add.at(diff, (y_min, x_min), 1)
+        np.add.at(diff, (y_min, x_max + 1), -1)
+        np.add.at(diff, (y_max + 1, x_min), -1)
+        np.add.at(diff, (y_max + 1, x_max + 1), 1)
+        return np.cumsum(np.cumsum(diff, axis=0), axis=1)[:num_partitions_1d, :num_partitions_1d].reshape(-1)
+
+    count_A = count_cells(low0_A, high0_A, low1_A, high1_A)
+    count_B = count_cells(low0_B, high0_B, low1_B, high1_B)
+    valid = (count_A > 0) & (count_B > 0)
+    return count_A[valid], count_B[valid]
+
+
+def task_cycles(count_A, count_B, costs):
+    # join unit: cache partition B (II=1), then count_A x count_B comparisons
+    return count_B + count_A * count_B * costs['cycles_per_pair'] + costs['partition_latency']
+
+
+def dispatch_cycles(count_A, count_B, costs):
+    # scheduler: forwards the pages of A and B in parallel, II=1 per page
+    pages_A = (count_A + MAX_OBJS_PER_PAGE - 1) // MAX_OBJS_PER_PAGE
+    pages_B = (count_B + MAX_OBJS_PER_PAGE - 1) // MAX_OBJS_PER_PAGE
+    return np.maximum(pages_A, pages_B) * costs['cycles_per_page']
+
+
+def assign_tasks(join_cycles, num_PEs, policy):
+    """
+    Returns (order, PE): the order the scheduler sends the partitions in and the PE of each of them
+    (-1 for the dynamic policy, where the PE is picked at dispatch time)
+      static: partition order, round-robin PEs (designs/pbsm/static)
+      lpt: longest partition first, each to the least loaded PE so far, i.e., a host-side
+          task_t {PE, count} list sent to a static scheduler
+      dynamic: partition order, first idle PE (designs/pbsm/dynamic)
+    """
+    num_tasks = len(join_cycles)
+    if policy == 'static':
+        return np.arange(num_tasks), np.arange(num_tasks) % num_PEs
+    elif policy == 'lpt':
+        order = np.argsort(-join_cycles, kind='stable')
+        PE = np.zeros(num_tasks, dtype=np.int64)
+        load = np.zeros(num_PEs)
+        for i, task in enumerate(order.tolist()):
+            PE[i] = np.argmin(load)
+            load[PE[i]] += join_cycles[task]
+        return order, PE
+    elif policy == 'dynamic':
+        return np.arange(num_tasks), np.full(num_tasks, -1)
+    else:
+        raise ValueError(f"Unknown policy {policy}, must be one of {POLICIES}")
+
+
+def simulate(count_A, count_B, num_PEs, policy, costs=None, fifo_pages=DATA_FIFO_PAGES):
+    """
+    Discrete-event simulation of the scheduler and the join PEs.
+
+    The scheduler dispatches one partition at a time, in order. With a static assignment (static, lpt),
+    it blocks while the data FIFO of the target PE has no room for the pages of the partition; pages
+    leave the FIFO when the PE starts the partition. With the dynamic policy, a PE gets a new partition
+    only after it signals that the previous one is joined, the scheduler picks the first idle PE.
+    """
+    if costs is None:
+        costs = DEFAULT_COSTS
+    count_A = np.asarray(count_A, dtype=np.int64)
+    count_B = np.asarray(count_B, dtype=np.int64)
+    join_cycles = task_cycles(count_A, count_B, costs)
+    send_cycles = dispatch_cycles(count_A, count_B, costs)
+    pages = np.maximum((count_A + MAX_OBJS_PER_PAGE - 1) // MAX_OBJS_PER_PAGE,
+                       (count_B + MAX_OBJS_PER_PAGE - 1) // MAX_OBJS_PER_PAGE)
+    order, assigned_PE = assign_tasks(join_cycles, num_PEs, policy)
+
+    scheduler_time = 0.0
+    scheduler_stall = 0.0
+    PE_free = np.zeros(num_PEs)  # time each PE finishes its last partition
+    PE_busy = np.zeros(num_PEs)
+    PE_tasks = np.zeros(num_PEs, dtype=np.int64)
+    # per PE: start times and pages of the partitions waiting in its FIFO
+    queued = [deque() for _ in range(num_PEs)]
+    queued_pages = np.zeros(num_PEs, dtype=np.int64)
+
+    for i, task in enumerate(order.tolist()):
+        if policy == 'dynamic':
+            ready = np.nonzero(PE_free <= scheduler_time)[0]
+            if len(ready) > 0:
+                PE = ready[0]
+                dispatch_start = scheduler_time
+            else:
+                dispatch_start = np.amin(PE_free)
+                PE = np.nonzero(PE_free <= dispatch_start)[0][0]
+        else:
+            PE = assigned_PE[i]
+            dispatch_start = scheduler_time
+            # drop the partitions that started by now, then wait for room in the FIFO
+            while len(queued[PE]) > 0 and (queued[PE][0][0] <= dispatch_start or
+                                           queued_pages[PE] + pages[task] > fifo_pages):
+                start, task_pages = queued[PE].popleft()
+                dispatch_start = max(dispatch_start, start)
+                queued_pages[PE] -= task_pages
+
+        scheduler_stall += dispatch_start - scheduler_time
+        dispatch_end = dispatch_start + send_cycles[task]
+        start = max(dispatch_end, PE_free[PE])
+        PE_free[PE] = start + join_cycles[task]
+        PE_busy[PE] += join_cycles[task]
+        PE_tasks[PE] += 1
+        if policy != 'dynamic':
+            queued[PE].append((start, pages[task]))
+            queued_pages[PE] += pages[task]
+        scheduler_time = dispatch_end
+
+    makespan = max(scheduler_time, float(np.amax(PE_free))) if len(order) > 0 else 0.0
+    return {
+        'policy': policy,
+        'num_PEs': num_PEs,
+        'num_partitions': len(order),
+        'makespan_cycles': makespan,
+        'makespan_ms': makespan / (FPGA_FREQ_MHZ * 1e3),
+        'scheduler_stall_cycles': scheduler_stall,
+        'PE_busy_cycles': PE_busy.tolist(),
+        'PE_tasks': PE_tasks.tolist(),
+        'PE_utilization': (PE_busy / makespan).tolist() if makespan > 0 else [0.0] * num_PEs,
+        # max over mean PE load, 1.0 = perfectly balanced
+        'imbalance': float(np.amax(PE_busy) / np.mean(PE_busy)) if np.sum(PE_busy) > 0 else 1.0,
+    }
+
+
+def print_result(result):
+    print(f"{result['policy']:8s} {result['num_PEs']:3d} PEs: makespan {result['makespan_ms']:.3f} ms "
+          f"({result['makespan_cycles']:.0f} cycles), mean utilization {np.mean(result['PE_utilization']):.3f}, "
+          f"imbalance {result['imbalance']:.3f}, scheduler stall {result['scheduler_stall_cycles']:.0f} cycles")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Simulate the static and dynamic PBSM join PE scheduling.')
+    parser.add_argument('--workload', type=str, default=None, help='Per-partition counts, one "count_A count_B" line per partition.')
+    parser.add_argument('--filepathA', type=str, default=None, help='Dataset A (.txt or .bin), partitioned with a uniform grid.')
+    parser.add_argument('--filepathB', type=str, default=None, help='Dataset B (.txt or .bin), partitioned with a uniform grid.')
+    parser.add_argument('--num_partitions_1d', type=int, default=10, help='Grid cells per dimension.')
+    parser.add_argument('--num_PEs', type=int, nargs='+', default=[1, 2, 4, 8, 16], help='Join PE counts to simulate.')
+    parser.add_argument('--policies', type=str, nargs='+', default=POLICIES, choices=POLICIES, help='Scheduling policies to simulate.')
+    parser.add_argument('--micro_dir', type=str, default=MICRO_DIR, help='Folder of micro_read.json and micro_join.json, empty = default costs.')
+    parser.add_argument('--output', type=str, default=None, help='Save the results as JSON.')
+    parser.add_argument('--verbose', action='store_true', help='Print the per-PE utilization.')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if args.workload is not None:
+        count_A, count_B = read_workload(args.workload)
+    else:
+        count_A, count_B = grid_workload(read_dataset(args.filepathA), read_dataset(args.filepathB), args.num_partitions_1d)
+
+    costs = load_micro_costs(args.micro_dir) if args.micro_dir else DEFAULT_COSTS
+    print(f"Partitions: {len(count_A)}, comparisons: {int(np.sum(count_A * count_B))}, "
+          f"max partition comparisons: {int(np.amax(count_A * count_B)) if len(count_A) > 0 else 0}")
+
+    results = []
+    for num_PEs in args.num_PEs:
+        for policy in args.policies:
+            result = simulate(count_A, count_B, num_PEs, policy, costs)
+            print_result(result)
+            if args.verbose:
+                print("  PE utilization: " + " ".join(f"{u:.3f}" for u in result['PE_utilization']))
+            results.append(result)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
@@ -1,9 +1,13 @@
 import argparse
-import struct
-import math
+import os
+import sys
 
 import pydot
 
+# shared FPGA page codec: spatial-join-baseline/python/Index/Page_codec.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../spatial-join-baseline/python'))
+from Index import Page_codec
+
 
 class MBR:
     def __init__(self, low0, high0, low1, high1):
@@ -39,65 +43,32 @@ class Node:
             return f"Internal node(ID: {self.node_id}, MBR: {self.mbr}, Count: {self.count})"
 
 
-def read_node(buffer, start_offset, meta_size, obj_block_size, max_objs_per_block):
-    offset = start_offset
-
-    # meta
-    meta_format = 'iiiffff'
-    node_meta = struct.unpack_from(meta_format, buffer, offset)
-    offset += meta_size
-
-    is_leaf, count, node_id, low0, high0, low1, high1 = node_meta
-    mbr = MBR(low0, high0, low1, high1)
-    node = Node(node_id, is_leaf, mbr, count)
-
-    # children
-    obj_format = 'iffff'
-    obj_size = struct.calcsize(obj_format)
-
-    for i in range(count):
-        if i > 0 and i % max_objs_per_block == 0:
-            # padding
-            block_padding_size = obj_block_size - (offset % obj_block_size)
-            if block_padding_size > 0 and block_padding_size < obj_block_size:
-                offset += block_padding_size
-
-        obj_data = struct.unpack_from(obj_format, buffer, offset)
-        offset += obj_size
-
-        obj_id, low0, high0, low1, high1 = obj_data
-
-        if is_leaf:
-            node.add_object(obj_id)
-        else:
-            child_mbr = MBR(low0, high0, low1, high1)
-            # temp node
-            child_node = Node(obj_id, True, child_mbr)
-            node.add_child(child_node)
-
-    return node
-
-
 def read_rtree(file_name, max_entries):
-    with open(file_name, 'rb') as f:
-        buffer = f.read()
-
-    nodes = {}
-    meta_size = 64
-    obj_block_size = 64
-    max_objs_per_block = 3
-
     # total node size = (1 meta + data blocks) * 64 bytes
-    total_blocks = 1 + math.ceil(max_entries / max_objs_per_block)
-    total_node_size = total_blocks * obj_block_size
+    total_blocks = 1 + (max_entries + Page_codec.OBJS_PER_BLOCK - 1) // Page_codec.OBJS_PER_BLOCK
+    total_node_size = total_blocks * Page_codec.AXI_BYTES
 
-    offset = 0
-    root = None
+    pages = Page_codec.open_pages(file_name, total_node_size)
+    meta = pages['meta']
+    _, ids, low0, high0, low1, high1 = Page_codec.decode_entries(pages)
+    ids = ids.tolist()
+    entry_mbrs = [MBR(*coords) for coords in zip(low0.tolist(), high0.tolist(), low1.tolist(), high1.tolist())]
 
-    while offset < len(buffer):
-        node = read_node(buffer, offset, meta_size, obj_block_size, max_objs_per_block)
+    nodes = {}
+    root = None
+    entry_start = 0
+    for node_meta in zip(meta['is_leaf'].tolist(), meta['count'].tolist(), meta['id'].tolist(),
+            meta['low0'].tolist(), meta['high0'].tolist(), meta['low1'].tolist(), meta['high1'].tolist()):
+        is_leaf, count, node_id, low0, high0, low1, high1 = node_meta
+        node = Node(node_id, is_leaf, MBR(low0, high0, low1, high1), count)
+        for i in range(entry_start, entry_start + count):
+            if is_leaf:
+                node.add_object(ids[i])
+            else:
+                # temp node
+                node.add_child(Node(ids[i], True, entry_mbrs[i]))
+        entry_start += count
         nodes[node.node_id] = node
-        offset += total_node_size
 
         if not root:
             root = node
@@ -15,10 +15,24 @@ python perf_test.py \
 --C_file_A /mnt/scratch/wenqi/spatial-join-baseline/generated_data/C_uniform_100000_polygon_file_0_set_0.txt \
 --C_file_B /mnt/scratch/wenqi/spatial-join-baseline/generated_data/C_uniform_100000_polygon_file_1_set_0.txt \
 --max_entry_size 16 --num_runs 3
+
+To build the trees without the C++ constructor, use the Python STR bulk loader:
+
+python perf_test.py \
+--tree_builder python --bulk_loader str \
+--tree_constructor_py_dir /mnt/scratch/wenqi/spatial-join-baseline/python/tree_constructor.py \
+--C_file_A ... --C_file_B ... --max_entry_size 16 --num_runs 3
+
+To skip the CPU sync traversal, add --num_results_source count (Python tree builder only): the
+	FPGA result buffer is sized by the exact number of results of a plane sweep on the CPU
+	(Index/Selectivity.py count_join_results), before the first FPGA run. The host only adds
+	1024 bytes to the buffer and the kernel does not check its bounds, so a sampled estimate
+	is not used here.
 """
 
 import os
 import re
+import sys
 import numpy as np
 import argparse 
 
@@ -29,11 +43,15 @@ parser.add_argument('--FPGA_project_dir', type=str, default='/mnt/scratch/wenqi/
 parser.add_argument('--FPGA_host_name', type=str, default='host', help="the name of the exe of the FPGA host")
 parser.add_argument('--FPGA_bin_name', type=str, default='xclbin/vadd.hw.xclbin', help="the name (as well as the subdir) of the FPGA bitstream")
 parser.add_argument('--FPGA_log_name', type=str, default='summary.csv', help="the name of the FPGA perf summary file")
+parser.add_argument('--tree_builder', type=str, default='cpp', help="cpp: FPGA_index_constructor; python: tree_constructor.py (STR bulk loader)")
+parser.add_argument('--tree_constructor_py_dir', type=str, default='/mnt/scratch/wenqi/spatial-join-baseline/python/tree_constructor.py', help="the Python tree constructor file")
+parser.add_argument('--bulk_loader', type=str, default='str', help="python tree builder only: str or hilbert")
 parser.add_argument('--cpp_exe_dir', type=str, default='/mnt/scratch/wenqi/spatial-join-baseline/cpp/FPGA_index_constructor', help="the CPP exe file")
 parser.add_argument('--C_file_A', type=str, default='/mnt/scratch/wenqi/spatial-join-baseline/generated_data/C_uniform_100000_polygon_file_0_set_0.txt', help="the CPP input file")
 parser.add_argument('--C_file_B', type=str, default='/mnt/scratch/wenqi/spatial-join-baseline/generated_data/C_uniform_100000_polygon_file_1_set_0.txt', help="the CPP input file")
 parser.add_argument('--get_tree_depth_py_dir', type=str, default='/mnt/scratch/wenqi/spatial-join-baseline/python/get_tree_depth.py', help="the get tree depth file dir")
 parser.add_argument('--max_entry_size', type=int, default=32, help="the max entry numbers in an R tree node")
+parser.add_argument('--num_results_source', type=str, default='join', help="join: the number of results of the tree constructor; count: plane sweep count of Index.Selectivity, no sync traversal on the CPU (python tree builder only)")
 parser.add_argument('--num_runs', type=int, default=1, help="number of FPGA runs")
 
 args = parser.parse_args()
@@ -41,12 +59,16 @@ FPGA_project_dir = args.FPGA_project_dir
 FPGA_host_name = args.FPGA_host_name
 FPGA_bin_name = args.FPGA_bin_name
 FPGA_log_name = args.FPGA_log_name
+tree_builder = args.tree_builder
+tree_constructor_py_dir = args.tree_constructor_py_dir
+bulk_loader = args.bulk_loader
 cpp_exe_dir = args.cpp_exe_dir
 C_file_A = args.C_file_A
 C_file_B = args.C_file_B
 max_entry_size = args.max_entry_size
 get_tree_depth_py_dir = args.get_tree_depth_py_dir
 num_runs = args.num_runs
+num_results_source = args.num_results_source
 
 
 def get_tree_depth_procedure(tree="A", node_bytes=4096):
@@ -113,16 +135,33 @@ if __name__ == '__main__':
 	os.system(f"rm {tree_A_dir}")
 	os.system(f"rm {tree_B_dir}")
 
-	# First execute the CPP
+	# First execute the CPP (or the Python STR bulk loader, which prints the same keys)
+	assert tree_builder == 'cpp' or tree_builder == 'python'
+	assert num_results_source == 'join' or num_results_source == 'count'
+	# the C++ constructor always runs the join
+	assert num_results_source == 'join' or tree_builder == 'python'
 	log_cpp = 'log_cpp'
-	cmd_cpp = f'{cpp_exe_dir} {C_file_A} {C_file_B} {max_entry_size} > {log_cpp}'
-	print("Executing cpp command:\n", cmd_cpp)
+	if tree_builder == 'cpp':
+		cmd_cpp = f'{cpp_exe_dir} {C_file_A} {C_file_B} {max_entry_size} > {log_cpp}'
+	else:
+		skip_join = 1 if num_results_source == 'count' else 0
+		cmd_cpp = f'python {tree_constructor_py_dir} --file_A {C_file_A} --file_B {C_file_B} ' + \
+			f'--tree_A_dir {tree_A_dir} --tree_B_dir {tree_B_dir} --max_entry_size {max_entry_size} --bulk_loader {bulk_loader} ' + \
+			f'--skip_join {skip_join} > {log_cpp}'
+	print("Executing {} command:\n".format(tree_builder), cmd_cpp)
 	os.system(cmd_cpp)
-	num_results = get_number_file_with_keywords(log_cpp, "Number of results:", "int")
 	node_bytes = get_number_file_with_keywords(log_cpp, "Bytes per node", "int")
-	time_ms_CPU = get_number_file_with_keywords(log_cpp, "Sync traversal duration:", "float")
-	print("Number of results: ", num_results)
-	print("CPU sync traversal time: {} ms".format(time_ms_CPU))
+	if num_results_source == 'join':
+		num_results = get_number_file_with_keywords(log_cpp, "Number of results:", "int")
+		time_ms_CPU = get_number_file_with_keywords(log_cpp, "Sync traversal duration:", "float")
+		print("Number of results: ", num_results)
+		print("CPU sync traversal time: {} ms".format(time_ms_CPU))
+	else:
+		# exact result buffer size from the plane sweep next to the Python tree constructor
+		sys.path.append(os.path.dirname(os.path.abspath(tree_constructor_py_dir)))
+		from Index.Selectivity import count_join_results
+		num_results = count_join_results(C_file_A, C_file_B)
+		print("Number of results: ", num_results)
 
 	# Second, get tree depth
 	level_A = get_tree_depth_procedure("A", node_bytes)